@@ -0,0 +1,115 @@
+"""Fingerprint cache of the controller on a broadcast with reruns
+
+Builds a program of the `Synthetic Radio Examples` trimmed to whole 6 s
+hops, so that it repeats on the window grid of mk_preds_fa, and a broadcast
+of --repeats reruns of it. Runs the controller without a cache, then twice
+with one (the second run stands for the next day's rerun) and reports:
+
+    hit rate    windows answered from the cache, per run
+    inference   inference time with and without the cache
+    agreement   whether oa_preds are identical to the run without a cache
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/bench_cache.py --repeats 5
+    PYTHONPATH=. python benchmarks/bench_cache.py \
+        --client models.musicspeech_class:MusicSpeechClass
+"""
+
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+import librosa
+import numpy as np
+
+from models.detection_service import load_client
+from models.fingerprint_cache import FingerprintCache
+from models.instrumentation import Metrics
+from models.musicspeech_controller import MusicSpeechController
+from models.musicspeech_params import MusicSpeech_Params
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "Synthetic Radio Examples")
+
+
+def broadcast(repeats, rate, hops):
+    """`repeats` reruns of a program `hops` window hops long"""
+    files = sorted(glob.glob(os.path.join(EXAMPLES, "example-*.wav")))
+    program = np.concatenate([librosa.load(f, sr=rate, mono=True)[0] for f in files])
+    length = hops * (220 * 602 - 1)
+    program = np.resize(program, length)  # repeats the examples as needed
+    return np.tile(program, repeats)
+
+
+def run(client, params, audio, cache=None):
+    metrics = Metrics()
+    controller = MusicSpeechController(
+        client, params, instrumentation=metrics, cache=cache
+    )
+    tic = time.perf_counter()
+    oa_preds = controller.mk_preds_fa(audio)
+    seconds = time.perf_counter() - tic
+    return oa_preds, seconds, metrics.snapshot()
+
+
+def report(name, seconds, snapshot):
+    counters, spans = snapshot["counters"], snapshot["spans"]
+    hits = counters.get("cache_hits", 0)
+    lookups = hits + counters.get("cache_misses", 0)
+    inference = spans["inference"]["seconds"] if "inference" in spans else 0.0
+    lookup = spans["cache"]["seconds"] if "cache" in spans else 0.0
+    print(
+        "  {:10s} {:6.2f} s, inference {:6.2f} s, lookups {:5.3f} s, "
+        "hit rate {:.1%} of {} windows".format(
+            name,
+            seconds,
+            inference,
+            lookup,
+            hits / lookups if lookups else 0.0,
+            counters["windows"],
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--client",
+        default="models.fake_client:FakeClient",
+        help="module:Class of the inference client",
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--hops", type=int, default=20, help="program length")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    params = MusicSpeech_Params(batch_size=args.batch_size)
+    client = load_client(args.client, params)
+    audio = broadcast(args.repeats, params.sample_rate, args.hops)
+    run(client, params, audio[: int(8 * params.sample_rate)])  # warm up
+
+    print("{} reruns of {} s".format(args.repeats, args.hops * 6))
+    reference, seconds, snapshot = run(client, params, audio)
+    report("no cache", seconds, snapshot)
+
+    cache = FingerprintCache()
+    first, seconds, snapshot = run(client, params, audio, cache)
+    report("cold", seconds, snapshot)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.npz")
+        cache.save(path)
+        cache = FingerprintCache.load(path)
+    second, seconds, snapshot = run(client, params, audio, cache)
+    report("reloaded", seconds, snapshot)
+
+    same = np.array_equal(reference, first) and np.array_equal(reference, second)
+    print("  agreement  {}".format("identical" if same else "DIFFERENT"))
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
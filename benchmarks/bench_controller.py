@@ -0,0 +1,258 @@
+"""Stage timings of MusicSpeechController on long synthetic broadcasts
+
+The `Synthetic Radio Examples` are tiled into broadcasts of each requested
+duration (written once, as wav files at --rate, and reused), then every
+broadcast goes through MusicSpeechController.predict, timed by its
+instrumentation spans (see models/instrumentation.py):
+
+    decode      librosa.load of the file at its own rate
+    resample    librosa.resample to params.sample_rate (0 when it matches)
+    feature     get_log_melspectrogram of every window
+    inference   client.predict round trips
+    postprocess smooth_output and preds_to_se
+    windows     the rest of predict (padding, peak normalization, crops)
+
+The client is models.fake_client.FakeClient: its posteriors are a cheap
+function of the mel input (not a model), so post-processing sees runs of
+realistic length. --latency adds a fixed delay per batch to stand in for a
+server.
+
+Throughput is reported as realtime factor (seconds of audio per second of
+processing, higher is better), per stage and end to end. Each broadcast
+runs in a fresh process so that its peak RSS is its own.
+
+Results are written as json with the commit they were measured on;
+--compare prints the speedup of every stage over an earlier result.
+
+Usage (from the repository root, with the controller's dependencies):
+    PYTHONPATH=. python benchmarks/bench_controller.py --durations 1m 1h \
+        --output bench-controller.json
+    PYTHONPATH=. python benchmarks/bench_controller.py --durations 1m 1h 24h \
+        --compare bench-controller.json
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "Synthetic Radio Examples")
+STAGES = ["decode", "resample", "windows", "feature", "inference", "postprocess"]
+UNITS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(text):
+    """Seconds of "90", "90s", "1m", "1h", ..."""
+    if text[-1] in UNITS:
+        return float(text[:-1]) * UNITS[text[-1]]
+    return float(text)
+
+
+def build_broadcast(path, seconds, rate, block_seconds=600):
+    """Tile the synthetic examples into `seconds` of audio at `rate`
+
+    The file is written block by block, a 24 h broadcast never is in memory.
+    """
+    files = sorted(glob.glob(os.path.join(EXAMPLES, "example-*.wav")))
+    if not files:
+        raise FileNotFoundError("no examples in {}".format(EXAMPLES))
+
+    tile = np.concatenate([librosa.load(f, sr=rate, mono=True)[0] for f in files])
+    total = int(seconds * rate)
+    block = len(tile) * max(1, int(block_seconds * rate) // len(tile))
+    repeated = np.tile(tile, block // len(tile))
+
+    tmp = "{}.{}.tmp.wav".format(path, os.getpid())
+    with sf.SoundFile(tmp, "w", samplerate=rate, channels=1, subtype="PCM_16") as f:
+        for start in range(0, total, block):
+            f.write(repeated[: min(block, total - start)])
+    os.replace(tmp, path)
+
+
+def peak_rss_mb():
+    """High-water mark of this process (ru_maxrss is in kB on Linux)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+
+
+def run_case(path, duration, batch_size, latency):
+    """Stage timings of one broadcast (runs in its own process)"""
+    from models.fake_client import FakeClient
+    from models.instrumentation import Metrics
+    from models.musicspeech_controller import MusicSpeechController
+    from models.musicspeech_params import MusicSpeech_Params
+
+    params = MusicSpeech_Params(batch_size=batch_size)
+    metrics = Metrics()
+    controller = MusicSpeechController(
+        FakeClient(latency=latency), params, instrumentation=metrics
+    )
+
+    # first calls import and compile lazily (librosa, numba), keep it out
+    example = sorted(glob.glob(os.path.join(EXAMPLES, "example-*.wav")))[0]
+    controller.predict(example)
+    metrics.reset()
+
+    start_rss = peak_rss_mb()
+    events = controller.predict(path)
+    snapshot = metrics.snapshot()
+
+    spans = snapshot["spans"]
+    seconds = {
+        stage: spans[stage]["seconds"] if stage in spans else 0.0
+        for stage in STAGES
+        if stage != "windows"
+    }
+    total = spans["predict"]["seconds"]
+    seconds["windows"] = total - sum(seconds.values())
+
+    counters = snapshot["counters"]
+    return {
+        "duration": duration,
+        "windows": counters["windows"],
+        "padded_windows": counters["padded_windows"],
+        "batches": counters["batches"],
+        "events": len(events),
+        "seconds": total,
+        "realtime_factor": duration / total,
+        "start_rss_mb": start_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": {
+            stage: {
+                "seconds": seconds[stage],
+                "realtime_factor": (
+                    duration / seconds[stage] if seconds[stage] else None
+                ),
+                "share": seconds[stage] / total,
+            }
+            for stage in STAGES
+        },
+    }
+
+
+def _git(*args):
+    try:
+        return subprocess.run(
+            ["git", *args],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "librosa": librosa.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def print_results(results, baseline=None):
+    previous = {}
+    if baseline is not None:
+        previous = {r["duration"]: r for r in baseline["results"]}
+        print("compared with {}".format(baseline["environment"]["commit"]))
+
+    for result in results:
+        before = previous.get(result["duration"])
+        print(
+            "{:8.0f} s  {} windows  {:9.1f}x realtime  peak RSS {:8.1f} MB".format(
+                result["duration"],
+                result["windows"],
+                result["realtime_factor"],
+                result["peak_rss_mb"],
+            )
+        )
+        for stage in STAGES + [None]:
+            now = result["stages"][stage] if stage else result
+            line = "    {:11s} {:9.3f} s {:6.1%}".format(
+                stage or "total", now["seconds"], now["seconds"] / result["seconds"]
+            )
+            if before is not None:
+                # stages of older results may differ
+                then = before["stages"].get(stage) if stage else before
+                if then and now["seconds"] and then["seconds"]:
+                    line += "  {:6.2f}x".format(then["seconds"] / now["seconds"])
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--durations", nargs="+", default=["1m", "1h"], help="e.g. 1m 1h 24h"
+    )
+    parser.add_argument(
+        "--rate", type=int, default=44100, help="sample rate of the broadcasts"
+    )
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="fake client delay per batch (s)"
+    )
+    parser.add_argument("--dir", default=None, help="folder of the broadcasts")
+    parser.add_argument("--output", default=None, help="results file (json)")
+    parser.add_argument("--compare", default=None, help="earlier results (json)")
+    args = parser.parse_args()
+
+    root = args.dir or os.path.join(tempfile.gettempdir(), "bench-controller")
+    os.makedirs(root, exist_ok=True)
+
+    results = []
+    for text in args.durations:
+        duration = parse_duration(text)
+        name = "broadcast-{:.0f}s-{}.wav".format(duration, args.rate)
+        path = os.path.join(root, name)
+        if not os.path.exists(path):
+            build_broadcast(path, duration, args.rate)
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results.append(
+                executor.submit(
+                    run_case, path, duration, args.batch_size, args.latency
+                ).result()
+            )
+
+    report = {
+        "environment": environment(),
+        "config": {
+            "rate": args.rate,
+            "batch_size": args.batch_size,
+            "latency": args.latency,
+        },
+        "results": results,
+    }
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Silence gating of mk_preds_fa: windows skipped, time saved, accuracy
+
+Builds a broadcast alternating the `Synthetic Radio Examples` with dead
+air (digital silence, then white noise at --noise-db), runs the controller
+with and without params.silence_gating and reports:
+
+    skipped     windows gated out, and the feature + inference time saved
+    agreement   frames of oa_preds identical in both runs
+    missed      frames of skipped windows full inference labels speech or
+                music (what gating loses)
+
+The accuracy numbers only mean something with the real model (the
+default, needs TensorFlow and 'model d-DS.h5'); models.fake_client does
+not tell dead air apart once mk_preds_fa has peak normalized it.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/bench_gating.py --minutes 10
+    PYTHONPATH=. python benchmarks/bench_gating.py \
+        --client models.fake_client:FakeClient
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import librosa
+import numpy as np
+
+from models.detection_service import load_client
+from models.gating import dead_air_windows
+from models.instrumentation import Metrics
+from models.musicspeech_controller import MusicSpeechController
+from models.musicspeech_params import MusicSpeech_Params
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "Synthetic Radio Examples")
+
+
+def broadcast(seconds, rate, dead_seconds, noise_db, seed=0):
+    """Examples, silence, examples, noise, ... up to `seconds`"""
+    files = sorted(glob.glob(os.path.join(EXAMPLES, "example-*.wav")))
+    program = np.concatenate([librosa.load(f, sr=rate, mono=True)[0] for f in files])
+    program = np.tile(program, 3)
+
+    rng = np.random.default_rng(seed)
+    n_dead = int(dead_seconds * rate)
+    noise_rms = 10 ** (noise_db / 20)
+    parts, total, k = [], 0, 0
+    while total < seconds * rate:
+        if k % 2 == 0:
+            part = program
+        elif k % 4 == 1:
+            part = np.zeros(n_dead, dtype=np.float32)
+        else:
+            part = (rng.normal(0, noise_rms, n_dead)).astype(np.float32)
+        parts.append(part)
+        total += len(part)
+        k += 1
+    return np.concatenate(parts)[: int(seconds * rate)]
+
+
+def run(client, params, audio):
+    metrics = Metrics()
+    controller = MusicSpeechController(client, params, instrumentation=metrics)
+    tic = time.perf_counter()
+    oa_preds = controller.mk_preds_fa(audio)
+    seconds = time.perf_counter() - tic
+    return oa_preds, seconds, metrics.snapshot()
+
+
+def skipped_windows(audio, params):
+    """Dead air mask of the windows of mk_preds_fa (same padding)"""
+    hop, win = 220 * 602 - 1, 220 * 802 - 1
+    n = max(len(audio), int(8.0 * params.sample_rate))
+    n_windows = int(np.ceil((n - win) / hop)) + 1
+    padded = np.zeros(n_windows * hop + 200 * 220)
+    padded[: len(audio)] = audio
+    return dead_air_windows(padded, n_windows, hop, win, params)
+
+
+def window_frames(n_frames, dead):
+    """Mask of the oa_preds frames taken from the `dead` windows"""
+    # window 0 gives frames 0:702, window k frames 100 + 602k : 702 + 602k,
+    # the last one every frame from 100 + 602k on
+    owner = np.clip((np.arange(n_frames) - 100) // 602, 0, len(dead) - 1)
+    return dead[owner]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--client",
+        default="models.musicspeech_class:MusicSpeechClass",
+        help="module:Class of the inference client",
+    )
+    parser.add_argument("--minutes", type=float, default=10.0)
+    parser.add_argument("--dead-seconds", type=float, default=60.0)
+    parser.add_argument("--noise-db", type=float, default=-55.0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    full = MusicSpeech_Params(batch_size=args.batch_size)
+    gated = MusicSpeech_Params(batch_size=args.batch_size, silence_gating=True)
+    client = load_client(args.client, full)
+
+    audio = broadcast(
+        args.minutes * 60, full.sample_rate, args.dead_seconds, args.noise_db
+    )
+    run(client, full, audio[: int(8 * full.sample_rate)])  # warm up
+
+    reference, full_seconds, _ = run(client, full, audio)
+    hypothesis, gated_seconds, gated_metrics = run(client, gated, audio)
+
+    windows = gated_metrics["counters"]["windows"]
+    skipped = gated_metrics["counters"].get("skipped_windows", 0)
+    spans = gated_metrics["spans"]
+    gating = spans["gating"]["seconds"] if "gating" in spans else 0.0
+
+    print("{:.0f} min, {} windows".format(args.minutes, windows))
+    print(
+        "  skipped     {} windows ({:.1%}), gating pass {:.3f} s".format(
+            skipped, skipped / windows, gating
+        )
+    )
+    print(
+        "  mk_preds_fa {:.2f} s -> {:.2f} s ({:.1%} saved)".format(
+            full_seconds, gated_seconds, 1 - gated_seconds / full_seconds
+        )
+    )
+
+    same = (reference == hypothesis).all(axis=1)
+    print("  agreement   {:.2%} of {} frames".format(same.mean(), len(same)))
+
+    frames = window_frames(len(same), skipped_windows(audio, gated))
+    missed = reference[frames].any(axis=1).sum()
+    print(
+        "  missed      {} of {} frames of skipped windows labelled by full "
+        "inference".format(missed, frames.sum())
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Batches/sec of the notebook DataGenerator vs. PrefetchLoader
+
+Writes N random examples both as block-id-*/mel-id-N.npy files and as
+shards, then times one epoch of each loader.
+
+Files are in the page cache after being written, so these are warm-cache
+numbers for both loaders.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/bench_loader.py --examples 4096 --workers 4
+"""
+
+import argparse
+import glob
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+
+from synthesis.features import NpyDirectoryWriter
+from synthesis.shards import ShardedDataset, ShardWriter
+from training.loader import PrefetchLoader
+
+
+class DataGenerator:
+    """The loading logic of train-CRNN.ipynb, without the keras base class"""
+
+    def __init__(self, list_examples, batch_size=128, shuffle=True):
+        self.batch_size = batch_size
+        self.list_examples = list_examples
+        self.shuffle = shuffle
+        self.on_epoch_end()
+
+    def __len__(self):
+        return int(np.floor(len(self.list_examples) / self.batch_size))
+
+    def __getitem__(self, index):
+        indexes = self.indexes[index * self.batch_size : (index + 1) * self.batch_size]
+        X = np.empty([self.batch_size, 802, 80], dtype=np.float32)
+        y = np.empty([self.batch_size, 802, 2], dtype=np.int16)
+        for i, k in enumerate(indexes):
+            X[i, :, :] = np.load(self.list_examples[k][0])
+            y[i, :, :] = np.load(self.list_examples[k][1])
+        return X, y
+
+    def on_epoch_end(self):
+        self.indexes = np.arange(len(self.list_examples))
+        if self.shuffle:
+            np.random.shuffle(self.indexes)
+
+
+def sort_nicely(l):
+    l.sort(
+        key=lambda s: [int(c) if c.isdigit() else c for c in re.split("([0-9]+)", s)]
+    )
+
+
+def time_epoch(batches):
+    tic = time.perf_counter()
+    count = sum(1 for _ in batches)
+    return count / (time.perf_counter() - tic)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--examples", type=int, default=4096)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--dir", default=None, help="scratch folder")
+    args = parser.parse_args()
+
+    root = args.dir or tempfile.mkdtemp()
+    mel_dir, shard_dir = os.path.join(root, "Mel Files"), os.path.join(root, "dataset")
+
+    rng = np.random.default_rng(0)
+    npy_writer = NpyDirectoryWriter(mel_dir)
+    shard_writer = ShardWriter(shard_dir)
+    for number in range(1, args.examples + 1):
+        mel = rng.normal(-30, 20, size=(802, 80)).astype(np.float32)
+        labels = (rng.random((802, 2)) < 0.5).astype(np.int16)
+        npy_writer.write(number, mel, labels)
+        shard_writer.write(number, mel, labels)
+    shard_writer.close()
+
+    data = glob.glob(os.path.join(mel_dir, "**", "mel-id-[0-9]*.npy"), recursive=True)
+    labels = glob.glob(
+        os.path.join(mel_dir, "**", "mel-id-label-[0-9]*.npy"), recursive=True
+    )
+    sort_nicely(data)
+    sort_nicely(labels)
+
+    print("{} examples, batch size {}".format(args.examples, args.batch_size))
+
+    generator = DataGenerator(list(zip(data, labels)), batch_size=args.batch_size)
+    rate = time_epoch(generator[i] for i in range(len(generator)))
+    print("  DataGenerator                      {:8.1f} batches/s".format(rate))
+
+    dataset = ShardedDataset(shard_dir)
+    for workers in sorted({1, args.workers}):
+        for name, x_dtype in [("float32", np.float32), ("float16", None)]:
+            loader = PrefetchLoader(
+                dataset, batch_size=args.batch_size, workers=workers, x_dtype=x_dtype
+            )
+            print(
+                "  PrefetchLoader {} {} workers {:8.1f} batches/s".format(
+                    name, workers, time_epoch(loader)
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""PooledClient against local stub model servers
+
+Starts --servers stub servers (the last one --slow times slower), each
+answering like a model server with models.fake_client.FakeClient posteriors,
+and sends --requests predicts from --concurrency threads through one
+PooledClient, in three phases:
+
+    balance     all servers up: the slow one should get fewer requests
+    failover    one fast server stopped: no request may fail, its circuit
+                opens
+    recovery    the server restarted: the health check half opens the
+                circuit and traffic returns to it
+
+Every phase prints the requests per endpoint and the latency percentiles,
+and the script exits with an error when a phase does not behave as above.
+
+Usage (from the repository root, with hermes installed):
+    PYTHONPATH=. python benchmarks/bench_pooled_client.py --servers 3
+"""
+
+import argparse
+import io
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from models.fake_client import FakeClient
+from models.pooled_client import OPEN, PooledClient
+
+
+class StubServer:
+    """Model server stand-in: POST /predict (npy in, npy out), GET /health"""
+
+    def __init__(self, port=0, delay=0.005):
+        fake = FakeClient()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200 if self.path == "/health" else 404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                mel = np.load(io.BytesIO(body))
+                time.sleep(delay)
+                out = io.BytesIO()
+                np.save(out, fake.predict(mel)["time_distributed"])
+                self.send_response(200)
+                self.send_header("Content-Length", str(out.tell()))
+                self.end_headers()
+                self.wfile.write(out.getvalue())
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StubClient:
+    """hermes-style client of a StubServer: StubClient(model, connection)"""
+
+    def __init__(self, model, connection):
+        self.url = "http://{}:{}/predict".format(
+            connection["ip"], connection["rest_port"]
+        )
+
+    def predict(self, *inputs, timeout=None):
+        body = io.BytesIO()
+        np.save(body, inputs[0])
+        request = urllib.request.Request(self.url, data=body.getvalue())
+        with urllib.request.urlopen(request, timeout=timeout or 10) as response:
+            return {"time_distributed": np.load(io.BytesIO(response.read()))}
+
+
+def healthy(connection):
+    url = "http://{}:{}/health".format(connection["ip"], connection["rest_port"])
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def run_phase(client, batch, requests, concurrency):
+    """(latencies, failed requests, requests per endpoint) of one phase"""
+    before = [s["requests"] - s["failures"] for s in client.status()]
+    latencies, failed = [], []
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            tic = time.perf_counter()
+            try:
+                client.predict(batch, timeout=10)
+            except Exception as e:
+                with lock:
+                    failed.append(e)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - tic)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    after = [s["requests"] - s["failures"] for s in client.status()]
+    return np.array(latencies), failed, [a - b for a, b in zip(after, before)]
+
+
+def report(name, client, latencies, failed, served):
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e3 if len(latencies) else (0, 0)
+    print(
+        "{:9s} {} ok, {} failed, p50 {:.1f} ms, p99 {:.1f} ms".format(
+            name, len(latencies), len(failed), p50, p99
+        )
+    )
+    for status, count in zip(client.status(), served):
+        print(
+            "    {:22s} {:10s} {:5d} served".format(
+                status["endpoint"], status["state"], count
+            )
+        )
+
+
+def check(condition, message):
+    if not condition:
+        print("FAILED: " + message)
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--servers", type=int, default=3)
+    parser.add_argument(
+        "--delay", type=float, default=0.005, help="seconds per batch"
+    )
+    parser.add_argument(
+        "--slow", type=float, default=10.0, help="slowdown of the last server"
+    )
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=4)
+    args = parser.parse_args()
+
+    check(args.servers >= 3, "needs 3 servers or more")
+    delays = [args.delay] * (args.servers - 1) + [args.delay * args.slow]
+    servers = [StubServer(delay=d) for d in delays]
+    connections = [
+        {"ip": "127.0.0.1", "grpc_port": s.port, "rest_port": s.port}
+        for s in servers
+    ]
+
+    client = PooledClient(
+        StubClient,
+        "model",
+        connections,
+        reset_timeout=60.0,  # only the health check brings an endpoint back
+        health_check=healthy,
+        health_interval=0.2,
+    )
+    batch = np.random.default_rng(0).normal(-30, 10, (args.batch_size, 802, 80))
+    batch = batch.astype(np.float32)
+
+    phase = (client, batch, args.requests, args.concurrency)
+    latencies, failed, served = run_phase(*phase)
+    report("balance", client, latencies, failed, served)
+    check(not failed, "requests failed with every server up")
+    check(served[-1] < min(served[:-1]), "the slow server was not avoided")
+
+    port = servers[0].port
+    servers[0].close()
+    latencies, failed, served = run_phase(*phase)
+    report("failover", client, latencies, failed, served)
+    check(not failed, "requests failed with a server down")
+    check(client.status()[0]["state"] == OPEN, "the stopped server is not open")
+
+    servers[0] = StubServer(port=port, delay=args.delay)
+    time.sleep(0.5)
+    latencies, failed, served = run_phase(*phase)
+    report("recovery", client, latencies, failed, served)
+    check(not failed, "requests failed after the restart")
+    check(served[0] > 0, "no traffic went back to the restarted server")
+
+    client.close()
+    for server in servers:
+        server.close()
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Split-and-merge of one long recording against a single pass
+
+Builds a broadcast of --minutes of the `Synthetic Radio Examples` (a length
+off the hop grid, so that the last shard is a partial one), runs
+MusicSpeechController.predict once, then models.sharding.ShardedDetector
+with every --shard-windows on --workers processes, and checks that
+oa_preds and the events are identical to the single pass. Prints the time
+of each run.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/bench_sharding.py --minutes 60 --workers 4
+    PYTHONPATH=. python benchmarks/bench_sharding.py \
+        --client models.musicspeech_class:MusicSpeechClass
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import librosa
+import numpy as np
+
+from models.detection_service import load_client
+from models.musicspeech_controller import MusicSpeechController
+from models.musicspeech_params import MusicSpeech_Params
+from models.sharding import ShardedDetector, count_windows
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "Synthetic Radio Examples")
+
+
+def broadcast(seconds, rate):
+    files = sorted(glob.glob(os.path.join(EXAMPLES, "example-*.wav")))
+    program = np.concatenate([librosa.load(f, sr=rate, mono=True)[0] for f in files])
+    return np.resize(program, int(seconds * rate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--client",
+        default="models.fake_client:FakeClient",
+        help="module:Class of the inference client",
+    )
+    parser.add_argument("--minutes", type=float, default=10.3)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--shard-windows", type=int, nargs="+", default=[1, 7, 25, 150]
+    )
+    args = parser.parse_args()
+
+    params = MusicSpeech_Params()
+    rate = params.sample_rate
+    audio = broadcast(args.minutes * 60, rate)
+    print(
+        "{:.1f} min, {} windows, {} workers".format(
+            args.minutes, count_windows(len(audio)), args.workers
+        )
+    )
+
+    controller = MusicSpeechController(load_client(args.client, params), params)
+    controller.predict(audio[: int(8 * rate)], rate)  # warm up
+    tic = time.perf_counter()
+    reference = controller.mk_preds_fa(audio)
+    events = controller.predict(audio, rate)
+    single = time.perf_counter() - tic
+    print("  single pass       {:7.2f} s, {} events".format(single, len(events)))
+
+    failed = False
+    for shard_windows in args.shard_windows:
+        with ShardedDetector(
+            args.client, params, workers=args.workers, shard_windows=shard_windows
+        ) as detector:
+            detector.predict(audio[: int(8 * rate)], rate)  # starts the workers
+            tic = time.perf_counter()
+            oa_preds = detector.overall_preds(audio)
+            sharded_events = detector.predict(audio, rate)
+            seconds = time.perf_counter() - tic
+
+        same_preds = np.array_equal(reference, oa_preds)
+        same_events = events == sharded_events
+        failed |= not (same_preds and same_events)
+        print(
+            "  {:4d} windows/shard {:7.2f} s, oa_preds {}, events {}".format(
+                shard_windows,
+                seconds,
+                "identical" if same_preds else "DIFFERENT",
+                "identical" if same_events else "DIFFERENT",
+            )
+        )
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Memory of every added worker, with and without shared weights and buffers
+
+Starts models.shared_pool.SharedPool with 1 to --workers processes, first
+with private copies of the weights and mel batches, then sharing them,
+has each pool predict two `Synthetic Radio Examples` broadcasts per worker
+and reads the memory of the workers from /proc/<pid>/smaps_rollup (Linux):
+
+    rss       resident memory, shared pages counted in every worker
+    pss       shared pages divided among the processes mapping them
+    private   pages only this worker maps (USS)
+
+It prints the sums over the workers, the shared blocks, and the growth per
+added worker (the slope from 1 to --workers). Without --weights the layers
+are random: the memory does not depend on their values.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/bench_shared_pool.py --workers 4
+    PYTHONPATH=. python benchmarks/bench_shared_pool.py --weights "model d-DS.h5"
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+
+import librosa
+import numpy as np
+
+from models.musicspeech_numpy import load_weights
+from models.musicspeech_params import MusicSpeech_Params
+from models.shared_pool import SharedPool
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "Synthetic Radio Examples")
+FIELDS = {"Rss": "rss", "Pss": "pss", "Private_Clean": "private"}
+MB = 2.0**20
+
+
+def random_layers(seed=0):
+    """Layers with the shapes of MusicSpeechClass.build_model"""
+    rng = np.random.default_rng(seed)
+
+    def normal(*shape):
+        return rng.normal(0, 0.1, shape).astype(np.float32)
+
+    def bn(channels):
+        gamma, variance = normal(channels) + 1, np.ones(channels, np.float32)
+        return [gamma, normal(channels), normal(channels), variance]
+
+    def bigru(inputs, units=80):
+        gru = [normal(inputs, 3 * units), normal(units, 3 * units)]
+        return 2 * (gru + [normal(2, 3 * units)])
+
+    return [
+        [normal(7, 7, 1, 16), normal(16)],
+        bn(16),
+        [normal(7, 7, 16, 64), normal(64)],
+        bn(64),
+        bigru(1280),
+        bn(160),
+        bigru(160),
+        bn(160),
+        [normal(160, 2), normal(2)],
+    ]
+
+
+def memory(pid):
+    """{rss, pss, private} bytes of a process"""
+    usage = {name: 0 for name in FIELDS.values()}
+    with open("/proc/{}/smaps_rollup".format(pid)) as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in FIELDS or key == "Private_Dirty":
+                name = FIELDS.get(key, "private")
+                usage[name] += int(value.split()[0]) * 1024
+    return usage
+
+
+def measure(params, layers, workers, shared, audio):
+    with SharedPool(params, workers, shared=shared, layers=layers) as pool:
+        futures = [pool.submit(audio, params.sample_rate) for _ in range(2 * workers)]
+        for future in futures:
+            future.result()
+        usages = [memory(p.pid) for p in multiprocessing.active_children()]
+        total = {name: sum(u[name] for u in usages) for name in FIELDS.values()}
+        return total, pool.shared_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--weights", help="Keras HDF5 weights, random otherwise")
+    parser.add_argument("--minutes", type=float, default=2.0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    params = MusicSpeech_Params(batch_size=args.batch_size)
+    layers = load_weights(args.weights) if args.weights else random_layers()
+    files = sorted(glob.glob(os.path.join(EXAMPLES, "example-*.wav")))
+    program = np.concatenate(
+        [librosa.load(f, sr=params.sample_rate, mono=True)[0] for f in files]
+    )
+    audio = np.resize(program, int(args.minutes * 60 * params.sample_rate))
+
+    print("workers  mode      rss MB   pss MB  private MB  shared MB")
+    growth = {}
+    for shared in (False, True):
+        mode = "shared" if shared else "private"
+        totals = []
+        for workers in range(1, args.workers + 1):
+            total, shared_bytes = measure(params, layers, workers, shared, audio)
+            totals.append(total)
+            print(
+                "{:7d}  {:7s} {:8.1f} {:8.1f} {:11.1f} {:10.1f}".format(
+                    workers,
+                    mode,
+                    total["rss"] / MB,
+                    total["pss"] / MB,
+                    total["private"] / MB,
+                    shared_bytes / MB,
+                )
+            )
+        if args.workers > 1:
+            growth[mode] = {
+                name: (totals[-1][name] - totals[0][name]) / (args.workers - 1)
+                for name in FIELDS.values()
+            }
+
+    for mode, per_worker in growth.items():
+        print(
+            "per added worker, {:7s}: pss {:.1f} MB, private {:.1f} MB".format(
+                mode, per_worker["pss"] / MB, per_worker["private"] / MB
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""NumPy CRNN engine against the Keras model of MusicSpeechClass
+
+Runs both on the log-mel windows of the `Synthetic Radio Examples` (and
+--random windows of noise) with the weights of --weights, and reports the
+largest posterior difference, the frames whose thresholded label differs,
+and the time per batch. Exits with an error when the posteriors differ by
+more than --tolerance. Needs TensorFlow, h5py and the weights file.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/check_numpy_engine.py \
+        --weights "model d-DS.h5" --numba
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import librosa
+import numpy as np
+
+from models.musicspeech_controller import MusicSpeechController
+from models.musicspeech_numpy import MusicSpeechNumpy
+from models.musicspeech_params import MusicSpeech_Params
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "Synthetic Radio Examples")
+
+
+def windows(params, n_random, seed=0):
+    """(n, 802, 80) log-mels of the examples and of noise, as mk_preds_fa"""
+    features = MusicSpeechController(None, params)  # feature extraction only
+    signals = [
+        librosa.load(f, sr=params.sample_rate, mono=True)[0]
+        for f in sorted(glob.glob(os.path.join(EXAMPLES, "example-*.wav")))
+    ]
+    rng = np.random.default_rng(seed)
+    signals += [rng.normal(0, 0.1, 220 * 802 - 1) for _ in range(n_random)]
+
+    mels = []
+    for signal in signals:
+        seg = np.zeros(220 * 802 - 1)
+        seg[: min(len(signal), len(seg))] = signal[: len(seg)]
+        mels.append(features.get_log_melspectrogram(librosa.util.normalize(seg)).T)
+    return np.stack(mels).astype(np.float32)
+
+
+def timed(client, batch, repeats=3):
+    client.predict(batch[:1])  # warm up
+    tic = time.perf_counter()
+    for _ in range(repeats):
+        posteriors = client.predict(batch)["time_distributed"]
+    return np.asarray(posteriors), (time.perf_counter() - tic) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weights", default=MusicSpeech_Params.model_weights_file)
+    parser.add_argument("--random", type=int, default=16)
+    parser.add_argument("--numba", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    params = MusicSpeech_Params(model_weights_file=args.weights)
+    batch = windows(params, args.random)
+
+    tic = time.perf_counter()
+    from models.musicspeech_class import MusicSpeechClass
+
+    keras_import = time.perf_counter() - tic
+    reference, keras_seconds = timed(MusicSpeechClass(params), batch)
+    posteriors, numpy_seconds = timed(
+        MusicSpeechNumpy(params, use_numba=args.numba), batch
+    )
+
+    difference = np.abs(posteriors - reference).max()
+    threshold = np.asarray(params.threshold)
+    flipped = ((posteriors >= threshold) != (reference >= threshold)).any(axis=-1)
+    print("{} windows".format(len(batch)))
+    print("  max |numpy - keras|   {:.2e}".format(difference))
+    print("  label differences     {} of {} frames".format(flipped.sum(), flipped.size))
+    print(
+        "  batch time            keras {:.2f} s, numpy {:.2f} s".format(
+            keras_seconds, numpy_seconds
+        )
+    )
+    print("  tensorflow import     {:.1f} s".format(keras_import))
+    if difference > args.tolerance:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Latency percentiles of the detection service under concurrent load
+
+Sends --requests jobs from --concurrency threads, alternating uploads and
+path jobs of the `Synthetic Radio Examples`, to --url, or to a service
+started in-process with --client when no url is given. 503 answers
+(queue full) are counted and retried after their Retry-After.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/load_service.py --client \
+        models.fake_client:FakeClient --workers 2 --requests 200 --concurrency 8
+    PYTHONPATH=. python benchmarks/load_service.py --url http://127.0.0.1:8080
+"""
+
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "Synthetic Radio Examples")
+
+
+def _post(url, body, content_type):
+    request = urllib.request.Request(
+        url + "/detect", data=body, headers={"Content-Type": content_type}
+    )
+    with urllib.request.urlopen(request, timeout=600) as response:
+        return json.loads(response.read())
+
+
+def run_load(url, jobs, concurrency):
+    """(latencies of the successful jobs, rejected answers, errors)"""
+    latencies, counts = [], {"rejected": 0, "errors": 0}
+    lock = threading.Lock()
+    next_job = iter(jobs)
+
+    def client():
+        while True:
+            with lock:
+                job = next(next_job, None)
+            if job is None:
+                return
+
+            tic = time.perf_counter()
+            while True:
+                try:
+                    _post(url, *job)
+                    break
+                except urllib.error.HTTPError as e:
+                    if e.code != 503:
+                        with lock:
+                            counts["errors"] += 1
+                        tic = None
+                        break
+                    with lock:
+                        counts["rejected"] += 1
+                    time.sleep(float(e.headers.get("Retry-After", 1)))
+
+            if tic is not None:
+                with lock:
+                    latencies.append(time.perf_counter() - tic)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return np.array(latencies), counts["rejected"], counts["errors"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=None, help="running service")
+    parser.add_argument(
+        "--client",
+        default="models.fake_client:FakeClient",
+        help="module:Class of an in-process service, without --url",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--queue", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(EXAMPLES, "example-*.wav")))
+    jobs = []
+    for i in range(args.requests):
+        filename = os.path.abspath(files[i % len(files)])
+        if i % 2:
+            body = json.dumps({"path": filename}).encode()
+            jobs.append((body, "application/json"))
+        else:
+            with open(filename, "rb") as f:
+                jobs.append((f.read(), "audio/wav"))
+
+    service = server = None
+    url = args.url
+    if url is None:
+        from models.detection_service import DetectionServer, DetectionService
+
+        service = DetectionService(
+            args.client, workers=args.workers, max_queue=args.queue
+        )
+        server = DetectionServer(service, port=0).start()
+        url = server.url
+
+    try:
+        tic = time.perf_counter()
+        latencies, rejected, errors = run_load(url, jobs, args.concurrency)
+        elapsed = time.perf_counter() - tic
+    finally:
+        if server is not None:
+            server.close()
+            service.close()
+
+    print(
+        "{} requests, concurrency {}: {:.1f} requests/s, {} rejected (retried), "
+        "{} errors".format(
+            len(latencies), args.concurrency, len(latencies) / elapsed, rejected, errors
+        )
+    )
+    if len(latencies):
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1e3
+        print(
+            "  latency p50 {:.1f} ms  p90 {:.1f} ms  p99 {:.1f} ms  "
+            "max {:.1f} ms".format(p50, p90, p99, latencies.max() * 1e3)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Throughput of the frame-domain evaluator on synthetic detector output
+
+Usage (from models/cia-ev-metrics, with the package installed):
+    python benchmarks/bench_framewise.py --hours 100
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from cia.ev.metrics.framewise import FRAME_DURATION, FrameEvaluator, PackedFrames
+
+
+def synthetic_frames(n_frames, mean_run, rng):
+    """Alternating active/inactive runs, one column per class"""
+    columns = []
+    for _ in range(2):
+        lengths = rng.geometric(1.0 / mean_run, size=2 * n_frames // mean_run + 2)
+        values = np.arange(len(lengths)) % 2 == 1
+        columns.append(np.repeat(values, lengths)[:n_frames])
+    return np.stack(columns, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=100.0)
+    parser.add_argument("--mean-run", type=int, default=3000, help="frames per run")
+    parser.add_argument("--flip", type=float, default=0.01, help="hypothesis noise")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    n_frames = int(args.hours * 3600 / FRAME_DURATION)
+
+    reference = synthetic_frames(n_frames, args.mean_run, rng)
+    hypothesis = reference ^ (rng.random(reference.shape) < args.flip)
+
+    tic = time.perf_counter()
+    reference = PackedFrames.pack(reference)
+    hypothesis = PackedFrames.pack(hypothesis)
+    pack_time = time.perf_counter() - tic
+
+    evaluator = FrameEvaluator()
+    tic = time.perf_counter()
+    metrics = evaluator.accumulate(reference, hypothesis)
+    eval_time = time.perf_counter() - tic
+
+    print("{:.0f} h, {} frames".format(args.hours, n_frames))
+    print("  packed size     {:9.1f} MB".format(reference.nbytes() / 1e6))
+    print("  pack            {:9.3f} s".format(pack_time))
+    print("  evaluate        {:9.3f} s".format(eval_time))
+    print("  hours / second  {:9.1f}".format(args.hours / eval_time))
+    for key in ["frame", "segment", "event"]:
+        print("  {:<8} F = {:.4f}".format(key, metrics[key]["overall"]["F"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Benchmark the bulk label loaders against line-by-line parsing
+
+Usage (from models/cia-ev-metrics, with the package installed):
+    python benchmarks/bench_loaders.py --size-mb 8 --repeat 3
+"""
+
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from pyannote.core import Segment
+
+from cia.ev.metrics.loaders import load_edicao_csv, load_label_list, load_txt
+from cia.ev.metrics.musicannotation import MusicAnnotation
+
+LABELS = ["music", "speech", "noise", "singing", "instrumental"]
+EDICAO_LABELS = ["Identificação usuário", "Pré execução", "Identificação automática"]
+
+
+def legacy_from_txt(filename, start=None, end=None, map_labels=None):
+    """Former MusicAnnotation.from_txt implementation"""
+    annotation = MusicAnnotation()
+    with open(filename, "r") as file:
+        for line in file:
+            star_f, end_f, label_f = line.strip().split()
+            star_f, end_f = float(star_f), float(end_f)
+
+            if start is not None and end is not None:
+                if end_f <= start or star_f >= end:
+                    continue
+                star_f = max(star_f, start)
+                end_f = min(end_f, end)
+
+            if map_labels:
+                label_f = map_labels(label_f)
+
+            annotation[Segment(star_f, end_f)] = label_f
+
+    return annotation
+
+
+def legacy_edicao_csv(filename):
+    """csv.DictReader + datetime.strptime per row"""
+    annotation = MusicAnnotation()
+    origin = None
+    with open(filename, "r", newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            begin = datetime.strptime(row["DATA_INICIO"], "%d/%m/%Y %H:%M:%S")
+            finish = datetime.strptime(row["DATA_FIM"], "%d/%m/%Y %H:%M:%S")
+            if origin is None:
+                origin = begin
+            segment = Segment(
+                (begin - origin).total_seconds(), (finish - origin).total_seconds()
+            )
+            annotation[segment] = row["DSC_CLASSIFICACAO"]
+
+    return annotation
+
+
+def write_txt(filename, size_bytes):
+    t = 0.0
+    with open(filename, "w") as file:
+        while file.tell() < size_bytes:
+            duration = random.uniform(0.5, 300.0)
+            file.write(
+                "{:.5f}\t{:.5f}\t{}\n".format(t, t + duration, random.choice(LABELS))
+            )
+            t += random.uniform(0.1, duration)
+
+
+def write_edicao_csv(filename, size_bytes):
+    t = datetime(2022, 5, 5)
+    with open(filename, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["COD_SGTM", "DATA_INICIO", "DATA_FIM", "DSC_CLASSIFICACAO"])
+        while file.tell() < size_bytes:
+            finish = t + timedelta(seconds=random.randint(1, 600))
+            writer.writerow(
+                [
+                    "139850",
+                    t.strftime("%d/%m/%Y %H:%M:%S"),
+                    finish.strftime("%d/%m/%Y %H:%M:%S"),
+                    random.choice(EDICAO_LABELS),
+                ]
+            )
+            t = finish
+
+
+def write_label_list(filename, size_bytes):
+    records = []
+    t, written = 0.0, 0
+    while written < size_bytes:
+        duration = random.uniform(0.5, 8.0)
+        records.append([t, t + duration, random.choice(LABELS[:2])])
+        written += 40
+        t += duration
+    with open(filename, "w") as file:
+        file.write(repr(records))
+
+
+def best_of(function, repeat):
+    times = []
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - tic)
+    return min(times), result
+
+
+def report(name, filename, baseline, repeat):
+    size_mb = os.path.getsize(filename) / 1024**2
+    print("{} ({:.1f} MB)".format(name, size_mb))
+    for label, function in baseline:
+        elapsed, annotation = best_of(function, repeat)
+        print(
+            "  {:<12} {:8.3f} s  {:8.1f} MB/s  {:>9} segments".format(
+                label, elapsed, size_mb / elapsed, len(annotation)
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=8.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    size_bytes = int(args.size_mb * 1024**2)
+    music = lambda x: "music" if x in ["singing", "instrumental", "music"] else x
+
+    with tempfile.TemporaryDirectory() as tmp:
+        txt = os.path.join(tmp, "labels.txt")
+        edicao = os.path.join(tmp, "000000_EDICAO.csv")
+        literal = os.path.join(tmp, "example-label.txt")
+        write_txt(txt, size_bytes)
+        write_edicao_csv(edicao, size_bytes)
+        write_label_list(literal, size_bytes)
+
+        report(
+            "label txt",
+            txt,
+            [
+                ("line-by-line", lambda: legacy_from_txt(txt, map_labels=music)),
+                ("bulk", lambda: load_txt(txt, map_labels=music)),
+            ],
+            args.repeat,
+        )
+        report(
+            "EDICAO csv",
+            edicao,
+            [
+                ("line-by-line", lambda: legacy_edicao_csv(edicao)),
+                ("bulk", lambda: load_edicao_csv(edicao)),
+            ],
+            args.repeat,
+        )
+        report(
+            "label list",
+            literal,
+            [("bulk", lambda: load_label_list(literal))],
+            args.repeat,
+        )
+
+
+if __name__ == "__main__":
+    main()
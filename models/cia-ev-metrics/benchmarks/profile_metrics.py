@@ -0,0 +1,123 @@
+"""Per-stage timing of the compute_metrics_api evaluation path
+
+Usage (from models/cia-ev-metrics, with the package installed):
+    python benchmarks/profile_metrics.py --segments 2000 --labels 50
+    python benchmarks/profile_metrics.py --segments 5000 --cprofile
+"""
+
+import argparse
+import cProfile
+import pstats
+import random
+import time
+import warnings
+
+from cia.ev.metrics.metrics_controller import (
+    compute_identification_metrics,
+    compute_segmentation_metrics,
+    create_context,
+    parse_Dic2Segs,
+)
+from cia.ev.metrics.musicannotation import last_segment
+
+
+def synthetic_marks(n_segments, n_labels, seed):
+    """Song-like marks: mostly contiguous segments with occasional gaps"""
+    rng = random.Random(seed)
+    marks, t = [], 0.0
+    for _ in range(n_segments):
+        t += rng.choice([0.0, 0.0, rng.uniform(1.0, 30.0)])
+        duration = rng.uniform(20.0, 300.0)
+        marks.append(
+            {
+                "obra": "work_{}".format(rng.randrange(n_labels)),
+                "inicio": t,
+                "fim": t + duration,
+            }
+        )
+        t += duration
+    return marks
+
+
+class Stages:
+    def __init__(self):
+        self.times = []
+
+    def run(self, name, function, *args, **kwargs):
+        tic = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.times.append((name, time.perf_counter() - tic))
+        return result
+
+    def print(self):
+        total = sum(t for _, t in self.times)
+        for name, t in self.times:
+            print("  {:<28} {:9.4f} s  {:5.1f} %".format(name, t, 100 * t / total))
+        print("  {:<28} {:9.4f} s".format("total", total))
+
+
+def profile(reference_json, hypothesis_json, valid_labels, onlysongs):
+    stages = Stages()
+
+    Ref = stages.run(
+        "parse reference", parse_Dic2Segs, reference_json, onlysongs=onlysongs
+    )
+    Ref = stages.run("reference seq_support", Ref.seq_support)
+    Hyp = stages.run(
+        "parse hypothesis", parse_Dic2Segs, hypothesis_json, onlysongs=onlysongs
+    )
+    Hyp = stages.run("hypothesis seq_support", Hyp.seq_support)
+
+    end = stages.run("extent", last_segment, Ref).end
+    Ref = stages.run(
+        "create_context", create_context, Ref, validLabels=valid_labels, endfile=end
+    )
+    stages.run(
+        "identification",
+        compute_identification_metrics,
+        ref=Ref,
+        hyp=Hyp,
+        collar=1.0,
+        tolerance=0.0,
+        bounds=(0.0, -1),
+    )
+    stages.run(
+        "segmentation", compute_segmentation_metrics, ref=Ref, hyp=Hyp, tolerance=0.5
+    )
+
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--segments", type=int, default=2000)
+    parser.add_argument("--labels", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--gaps", action="store_true", help="fill gaps with '0' (onlysongs=False)"
+    )
+    parser.add_argument("--cprofile", action="store_true")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    reference = synthetic_marks(args.segments, args.labels, args.seed)
+    hypothesis = synthetic_marks(args.segments, args.labels, args.seed + 1)
+    all_labels = ["work_{}".format(i) for i in range(args.labels)]
+
+    for name, valid in [
+        ("all labels valid", all_labels),
+        ("half labels valid", all_labels[: args.labels // 2]),
+    ]:
+        print("{} ({} segments)".format(name, args.segments))
+        if args.cprofile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        stages = profile(reference, hypothesis, valid, onlysongs=not args.gaps)
+        if args.cprofile:
+            profiler.disable()
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+        stages.print()
+
+
+if __name__ == "__main__":
+    main()
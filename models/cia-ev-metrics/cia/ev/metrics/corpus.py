@@ -0,0 +1,285 @@
+"""Corpus-level evaluation
+
+Discover reference/hypothesis pairs (one sub-directory per task, as in
+`Cortes_music_nmusic/*`), evaluate them across a process pool and
+accumulate the segmentation components with pyannote `BaseMetric`
+semantics, so aggregate DLP/purity/F are proper micro-averages.
+
+Usage:
+    python -m cia.ev.metrics.corpus Cortes_music_nmusic --output reports
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Tuple
+
+from pyannote.metrics.matcher import MATCH_TOTAL
+
+from .identification import MATCH_CORRECT_DAP
+from .loaders import load_annotation
+from .metrics_controller import compute_metrics
+from .segmentation import SegmentationPurityCoverageFMeasureMusic
+
+MUSIC_LABELS = ["singing", "instrumental", "music"]
+
+Pair = Tuple[str, str, str]  # (name, reference path, hypothesis path)
+
+
+def music_speech_label(label):
+    """Map the audit labels to the two detector classes"""
+    return "music" if label in MUSIC_LABELS else "speech"
+
+
+@dataclass
+class CorpusOptions:
+
+    reference_pattern: str = "{name}_corte_m_nm.txt"
+    hypothesis_pattern: str = "{name}-local.txt"
+
+    # reference/hypothesis preprocessing (see metrics.ipynb)
+    map_reference_labels: bool = True
+    crop_to_reference: bool = True
+    # seconds: hypothesis segments of a label closer than this are merged,
+    # then split into a segmentation, as metrics.ipynb does before scoring.
+    # None scores the raw hypotheses, whose overlapping segments inflate
+    # purity and coverage (above 1).
+    hypothesis_collar: Optional[float] = 30.0
+
+    # compute_metrics
+    withcontext: bool = False
+    validLabels: List[str] = field(default_factory=lambda: ["music"])
+    tolerance: float = 0.0
+
+    keep_details: bool = False
+
+
+def discover_pairs(root: str, options: CorpusOptions = None) -> List[Pair]:
+    """List (name, reference, hypothesis) for every task directory in `root`
+
+    Directories missing either file are skipped.
+    """
+    options = options or CorpusOptions()
+    pairs = []
+
+    for directory in sorted(glob.glob(os.path.join(root, "*"))):
+        if not os.path.isdir(directory):
+            continue
+
+        name = os.path.basename(directory)
+        reference = os.path.join(directory, options.reference_pattern.format(name=name))
+        hypothesis = os.path.join(
+            directory, options.hypothesis_pattern.format(name=name)
+        )
+
+        if os.path.isfile(reference) and os.path.isfile(hypothesis):
+            pairs.append((name, reference, hypothesis))
+
+    return pairs
+
+
+def evaluate_pair(pair: Pair, options: CorpusOptions) -> dict:
+    """Evaluate one pair; runs in a worker process"""
+    name, reference_path, hypothesis_path = pair
+    result = {"name": name, "reference": reference_path, "hypothesis": hypothesis_path}
+
+    try:
+        map_labels = music_speech_label if options.map_reference_labels else None
+        reference = load_annotation(reference_path, map_labels=map_labels, uri=name)
+
+        start = end = None
+        if options.crop_to_reference:
+            # as metrics.ipynb: from the first segment to the end of the last
+            # one (not the extent, which may end later)
+            timeline = reference.get_timeline()
+            start, end = timeline[0].start, timeline[-1].end
+
+        hypothesis = load_annotation(hypothesis_path, start=start, end=end, uri=name)
+        if options.hypothesis_collar is not None:
+            hypothesis = hypothesis.seq_support(collar=options.hypothesis_collar)
+            hypothesis = hypothesis.segmentation()
+
+        error_analysis = compute_metrics(
+            Ref=reference,
+            Hyp=hypothesis,
+            withcontext=options.withcontext,
+            validLabels=options.validLabels,
+            tolerance=options.tolerance,
+        )
+    except Exception as error:
+        result["error"] = repr(error)
+        return result
+
+    if not options.keep_details:
+        error_analysis.pop("errors", None)
+        error_analysis.pop("detail_segmentation", None)
+
+    result.update(error_analysis)
+    return result
+
+
+def _evaluate_star(arguments):
+    return evaluate_pair(*arguments)
+
+
+def evaluate_corpus(pairs: List[Pair], options: CorpusOptions = None, workers=None):
+    """Evaluate every pair and aggregate the results
+
+    return:
+    results: list of dict
+            per-file results, in the order of `pairs`
+    aggregate: dict
+            summed counts and micro/macro averaged DAP, DLP, purity and F
+    """
+    options = options or CorpusOptions()
+    tic = time.perf_counter()
+
+    jobs = [(pair, options) for pair in pairs]
+    if workers == 1 or len(jobs) <= 1:
+        used = 1
+        results = [_evaluate_star(job) for job in jobs]
+    else:
+        # the pool starts no more processes than there are jobs
+        used = min(workers or os.cpu_count(), len(jobs))
+        with ProcessPoolExecutor(max_workers=used) as executor:
+            results = list(executor.map(_evaluate_star, jobs))
+
+    aggregate = aggregate_results(results)
+    aggregate["workers"] = used
+    aggregate["wall_clock"] = time.perf_counter() - tic
+
+    return results, aggregate
+
+
+def aggregate_results(results: List[dict]) -> dict:
+    """Sum identification counts and accumulate segmentation components"""
+    segmentation = SegmentationPurityCoverageFMeasureMusic()
+    counts = {}
+    evaluated = [r for r in results if "error" not in r and "counts" in r]
+
+    for result in evaluated:
+        segmentation.accumulate(result["components_segmentation"], uri=result["name"])
+        for key, value in result["counts"].items():
+            counts[key] = counts.get(key, 0) + value
+
+    purity, coverage, F = segmentation.compute_metrics()
+    total = counts.get(MATCH_TOTAL, 0)
+
+    def macro(key):
+        values = [r[key] for r in evaluated]
+        return sum(values) / len(values) if values else 0.0
+
+    return {
+        "files": len(results),
+        "evaluated": len(evaluated),
+        "failed": [r["name"] for r in results if "error" in r],
+        "counts": counts,
+        "components_segmentation": dict(segmentation.accumulated_),
+        "micro": {
+            "dap": counts.get(MATCH_CORRECT_DAP, 0) / total if total else 0.0,
+            "dlp": coverage,
+            "purity": purity,
+            "F": F,
+        },
+        "macro": {key: macro(key) for key in ["dap", "dlp", "purity", "F"]},
+    }
+
+
+def measure_scaling(pairs: List[Pair], options: CorpusOptions, workers_list):
+    """Wall-clock of `evaluate_corpus` for each worker count"""
+    scaling = []
+    for workers in workers_list:
+        _, aggregate = evaluate_corpus(pairs, options, workers=workers)
+        scaling.append({"workers": workers, "wall_clock": aggregate["wall_clock"]})
+
+    base = scaling[0]["wall_clock"] if scaling else 0.0
+    for entry in scaling:
+        entry["speedup"] = base / entry["wall_clock"] if entry["wall_clock"] else 0.0
+
+    return scaling
+
+
+def write_reports(results: List[dict], aggregate: dict, output_dir: str, scaling=None):
+    """Write per_file.json, per_file.csv, aggregate.json (and scaling.json)"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(os.path.join(output_dir, "per_file.json"), "w") as file:
+        json.dump(results, file, indent=2, ensure_ascii=False)
+
+    with open(os.path.join(output_dir, "aggregate.json"), "w") as file:
+        json.dump(aggregate, file, indent=2, ensure_ascii=False)
+
+    if scaling is not None:
+        with open(os.path.join(output_dir, "scaling.json"), "w") as file:
+            json.dump(scaling, file, indent=2)
+
+    rows = []
+    for result in results:
+        row = {"name": result["name"], "error": result.get("error", "")}
+        row.update(result.get("counts", {}))
+        row.update(result.get("components_segmentation", {}))
+        for key in ["dap", "dlp", "purity", "F"]:
+            row[key] = result.get(key, "")
+        rows.append(row)
+
+    fieldnames = []
+    for row in rows:
+        fieldnames += [key for key in row if key not in fieldnames]
+
+    with open(os.path.join(output_dir, "per_file.csv"), "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Corpus-level CIA-EV evaluation")
+    parser.add_argument("root", help="directory with one sub-directory per task")
+    parser.add_argument("--output", default="reports", help="report directory")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--reference-pattern", default="{name}_corte_m_nm.txt")
+    parser.add_argument("--hypothesis-pattern", default="{name}-local.txt")
+    parser.add_argument(
+        "--hypothesis-collar",
+        type=float,
+        default=30.0,
+        help="seconds, merge the hypothesis segments as metrics.ipynb does",
+    )
+    parser.add_argument(
+        "--raw-hypothesis",
+        action="store_true",
+        help="score the hypotheses without the collar merge",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.0)
+    parser.add_argument(
+        "--scaling", default=None, help="comma-separated worker counts, e.g. 1,2,4"
+    )
+    args = parser.parse_args()
+
+    options = CorpusOptions(
+        reference_pattern=args.reference_pattern,
+        hypothesis_pattern=args.hypothesis_pattern,
+        hypothesis_collar=None if args.raw_hypothesis else args.hypothesis_collar,
+        tolerance=args.tolerance,
+    )
+
+    pairs = discover_pairs(args.root, options)
+    results, aggregate = evaluate_corpus(pairs, options, workers=args.workers)
+    aggregate["options"] = asdict(options)
+
+    scaling = None
+    if args.scaling:
+        workers_list = [int(w) for w in args.scaling.split(",")]
+        scaling = measure_scaling(pairs, options, workers_list)
+
+    write_reports(results, aggregate, args.output, scaling=scaling)
+    print(json.dumps(aggregate["micro"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
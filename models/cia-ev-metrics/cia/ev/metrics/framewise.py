@@ -0,0 +1,357 @@
+"""Frame-domain evaluation of speech/music detection outputs
+
+Works directly on the frame matrices produced by `MusicSpeechController`
+(`oa_preds`: one row per 220-sample hop, columns speech and music) instead
+of converting them to events and pyannote annotations. Event lists are
+rasterized once and every frame matrix is bit-packed (one bit per frame and
+class), so frame counts are popcounts of packed bytes and long corpora are
+processed chunk by chunk with bounded memory.
+
+Three families of scores are computed per class (sed_eval definitions):
+
+- frame: every frame is a decision
+- segment: fixed-length segments (default 1 s), a class is active in a
+  segment if it is active in any of its frames
+- event: onset within `t_collar` and, optionally, offset within
+  max(`t_collar`, `percentage_of_length` * reference length). Events are
+  matched one-to-one in chronological order.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+FRAME_DURATION = 220 / 22050.0
+CLASSES = ("speech", "music")  # column order of oa_preds
+
+if hasattr(np, "bitwise_count"):
+
+    def _popcount(packed):
+        return int(np.bitwise_count(packed).sum(dtype=np.int64))
+
+else:
+    _POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(packed):
+        return int(_POPCOUNT[packed].sum(dtype=np.int64))
+
+
+@dataclass
+class PackedFrames:
+    """Bit-packed (n_frames, n_classes) boolean matrix, packed along time"""
+
+    bits: np.ndarray  # (ceil(n_frames / 8), n_classes) uint8
+    n_frames: int
+
+    @classmethod
+    def pack(cls, frames, n_frames=None):
+        frames = np.asarray(frames)
+        if frames.dtype != bool:
+            frames = frames >= 0.5
+        if frames.ndim == 1:
+            frames = frames[:, None]
+
+        if n_frames is not None and n_frames != frames.shape[0]:
+            resized = np.zeros((n_frames, frames.shape[1]), dtype=bool)
+            n = min(n_frames, frames.shape[0])
+            resized[:n] = frames[:n]
+            frames = resized
+
+        return cls(bits=np.packbits(frames, axis=0), n_frames=frames.shape[0])
+
+    @property
+    def n_classes(self):
+        return self.bits.shape[1]
+
+    def resize(self, n_frames):
+        """Zero-pad or truncate to `n_frames` (stays packed)"""
+        n_bytes = (n_frames + 7) // 8
+        bits = np.zeros((n_bytes, self.n_classes), dtype=np.uint8)
+        n = min(n_bytes, self.bits.shape[0])
+        bits[:n] = self.bits[:n]
+        if n_frames % 8:
+            # clear the padding bits of the last byte
+            bits[-1] &= np.uint8((0xFF << (8 - n_frames % 8)) & 0xFF)
+        return PackedFrames(bits=bits, n_frames=n_frames)
+
+    def unpack(self, start=0, stop=None):
+        """Boolean frames [start, stop); `start` must be a multiple of 8"""
+        stop = self.n_frames if stop is None else min(stop, self.n_frames)
+        chunk = self.bits[start // 8 : (stop + 7) // 8]
+        frames = np.unpackbits(chunk, axis=0, count=stop - start)
+        return frames.astype(bool)
+
+    def nbytes(self):
+        return self.bits.nbytes
+
+
+def rasterize(
+    events, n_frames=None, classes=CLASSES, frame_duration=FRAME_DURATION
+) -> np.ndarray:
+    """Convert (start, end, label) events to a boolean (n_frames, n_classes) matrix
+
+    Frame i is active when i * frame_duration lies in [start, end).
+    Events whose label is not in `classes` are ignored.
+    """
+    index = {label: c for c, label in enumerate(classes)}
+    events = [e for e in events if e[2] in index]
+
+    starts = np.array([e[0] for e in events], dtype=np.float64)
+    ends = np.array([e[1] for e in events], dtype=np.float64)
+    columns = np.array([index[e[2]] for e in events], dtype=np.intp)
+
+    onsets = np.ceil(starts / frame_duration - 1e-9).astype(np.int64)
+    offsets = np.ceil(ends / frame_duration - 1e-9).astype(np.int64)
+
+    if n_frames is None:
+        n_frames = int(offsets.max()) if len(offsets) else 0
+
+    onsets = np.clip(onsets, 0, n_frames)
+    offsets = np.clip(offsets, 0, n_frames)
+    valid = offsets > onsets
+
+    # difference array: +1 at onset, -1 at offset, active where cumsum > 0
+    delta = np.zeros((n_frames + 1, len(classes)), dtype=np.int32)
+    np.add.at(delta, (onsets[valid], columns[valid]), 1)
+    np.add.at(delta, (offsets[valid], columns[valid]), -1)
+
+    return np.cumsum(delta[:-1], axis=0) > 0
+
+
+def _as_packed(data, n_frames, classes, frame_duration):
+    if isinstance(data, PackedFrames):
+        return data if n_frames is None else data.resize(n_frames)
+
+    if isinstance(data, np.ndarray):
+        return PackedFrames.pack(data, n_frames=n_frames)
+
+    frames = rasterize(data, n_frames, classes=classes, frame_duration=frame_duration)
+    return PackedFrames.pack(frames)
+
+
+def _n_frames(data, frame_duration):
+    if isinstance(data, PackedFrames):
+        return data.n_frames
+    if isinstance(data, np.ndarray):
+        return data.shape[0]
+    ends = [e[1] for e in data]
+    return int(np.ceil(max(ends) / frame_duration - 1e-9)) if ends else 0
+
+
+def _edges(column, previous=False):
+    """Onset and offset frame indices of a boolean column chunk"""
+    padded = np.empty(len(column) + 1, dtype=np.int8)
+    padded[0] = previous
+    padded[1:] = column
+    change = np.diff(padded)
+    return np.flatnonzero(change == 1), np.flatnonzero(change == -1)
+
+
+def _match_events(ref_on, ref_off, hyp_on, hyp_off, collar, percentage, offset):
+    """Number of one-to-one matches (chronological greedy)"""
+    if len(ref_on) == 0 or len(hyp_on) == 0:
+        return 0
+
+    eps = 1e-9
+    lo = np.searchsorted(hyp_on, ref_on - collar - eps, side="left")
+    hi = np.searchsorted(hyp_on, ref_on + collar + eps, side="right")
+    if offset:
+        offset_collar = np.maximum(collar, percentage * (ref_off - ref_on))
+
+    used = np.zeros(len(hyp_on), dtype=bool)
+    matches = 0
+    for i in np.flatnonzero(hi > lo):
+        for k in range(lo[i], hi[i]):
+            if used[k]:
+                continue
+            if offset and abs(hyp_off[k] - ref_off[i]) > offset_collar[i] + eps:
+                continue
+            used[k] = True
+            matches += 1
+            break
+
+    return matches
+
+
+def _prf(tp, fp, fn):
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    F = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "precision": precision,
+        "recall": recall,
+        "F": F,
+        "tp": tp,
+        "fp": fp,
+        "fn": fn,
+    }
+
+
+class FrameEvaluator:
+    """Accumulate frame, segment and event based scores over many files
+
+    Parameters
+    ----------
+    classes : tuple of str
+        Column names of the frame matrices
+    frame_duration : float
+        Hop duration in seconds (220 / 22050 for the CRNN)
+    segment_duration : float
+        Length of the segments used by segment-based scores
+    t_collar : float
+        Onset (and offset) collar of event-based scores, in seconds
+    percentage_of_length : float
+        Offset collar relative to the reference event length
+    evaluate_offset : bool
+        Set to False to match events on onsets only
+    chunk_frames : int
+        Frames unpacked at once for segment and event scores
+    """
+
+    def __init__(
+        self,
+        classes=CLASSES,
+        frame_duration=FRAME_DURATION,
+        segment_duration=1.0,
+        t_collar=0.2,
+        percentage_of_length=0.5,
+        evaluate_offset=True,
+        chunk_frames=1 << 20,
+    ):
+        self.classes = tuple(classes)
+        self.frame_duration = frame_duration
+        self.segment_frames = max(1, int(round(segment_duration / frame_duration)))
+        self.t_collar = t_collar
+        self.percentage_of_length = percentage_of_length
+        self.evaluate_offset = evaluate_offset
+
+        # chunks hold whole segments and whole bytes
+        step = self.segment_frames * 8
+        self.chunk_frames = max(step, chunk_frames // step * step)
+
+        self.reset()
+
+    def reset(self):
+        zeros = lambda: np.zeros((len(self.classes), 3), dtype=np.int64)
+        self.accumulated_ = {"frame": zeros(), "segment": zeros(), "event": zeros()}
+        self.results_ = []
+
+    def accumulate(self, reference, hypothesis, uri=None):
+        """Score one file and add its counts to the accumulated ones
+
+        `reference` and `hypothesis` can be boolean/0-1 frame matrices,
+        `PackedFrames` or lists of (start, end, label) events. Both are padded
+        with inactive frames to the longer of the two.
+        """
+        n_frames = max(
+            _n_frames(reference, self.frame_duration),
+            _n_frames(hypothesis, self.frame_duration),
+        )
+        ref = _as_packed(reference, n_frames, self.classes, self.frame_duration)
+        hyp = _as_packed(hypothesis, n_frames, self.classes, self.frame_duration)
+
+        counts = {
+            "frame": self._frame_counts(ref, hyp),
+            "segment": np.zeros((len(self.classes), 3), dtype=np.int64),
+            "event": np.zeros((len(self.classes), 3), dtype=np.int64),
+        }
+        self._chunked_counts(ref, hyp, counts)
+
+        for key, value in counts.items():
+            self.accumulated_[key] += value
+        self.results_.append((uri, counts))
+
+        return self.compute_metrics(counts)
+
+    def _frame_counts(self, ref, hyp):
+        counts = np.zeros((len(self.classes), 3), dtype=np.int64)
+        for c in range(len(self.classes)):
+            r, h = ref.bits[:, c], hyp.bits[:, c]
+            counts[c] = (_popcount(r & h), _popcount(~r & h), _popcount(r & ~h))
+        return counts
+
+    def _chunked_counts(self, ref, hyp, counts):
+        n_classes = len(self.classes)
+        collar = self.t_collar / self.frame_duration
+        carry_ref = np.zeros(n_classes, dtype=bool)
+        carry_hyp = np.zeros(n_classes, dtype=bool)
+        open_ref = [None] * n_classes  # onset of an event crossing chunks
+        open_hyp = [None] * n_classes
+        events_ref = [([], []) for _ in range(n_classes)]
+        events_hyp = [([], []) for _ in range(n_classes)]
+
+        for start in range(0, ref.n_frames, self.chunk_frames):
+            r = ref.unpack(start, start + self.chunk_frames)
+            h = hyp.unpack(start, start + self.chunk_frames)
+
+            # segment based: pad the last chunk to whole segments
+            n_seg = -(-len(r) // self.segment_frames)
+            pad = n_seg * self.segment_frames - len(r)
+            if pad:
+                r_seg = np.concatenate([r, np.zeros((pad, n_classes), dtype=bool)])
+                h_seg = np.concatenate([h, np.zeros((pad, n_classes), dtype=bool)])
+            else:
+                r_seg, h_seg = r, h
+            r_seg = r_seg.reshape(n_seg, self.segment_frames, n_classes).any(axis=1)
+            h_seg = h_seg.reshape(n_seg, self.segment_frames, n_classes).any(axis=1)
+            counts["segment"] += np.stack(
+                [
+                    (r_seg & h_seg).sum(axis=0),
+                    (~r_seg & h_seg).sum(axis=0),
+                    (r_seg & ~h_seg).sum(axis=0),
+                ],
+                axis=1,
+            )
+
+            # event boundaries, carrying events that cross chunk edges
+            for c in range(n_classes):
+                for column, carry, opened, events in (
+                    (r[:, c], carry_ref, open_ref, events_ref[c]),
+                    (h[:, c], carry_hyp, open_hyp, events_hyp[c]),
+                ):
+                    onsets, offsets = _edges(column, carry[c])
+                    onsets, offsets = list(onsets + start), list(offsets + start)
+                    if opened[c] is not None:
+                        onsets.insert(0, opened[c])
+                        opened[c] = None
+                    if len(onsets) > len(offsets):
+                        opened[c] = onsets.pop()
+                    events[0].extend(onsets)
+                    events[1].extend(offsets)
+                    carry[c] = column[-1] if len(column) else carry[c]
+
+        for c in range(n_classes):
+            for opened, events in (
+                (open_ref, events_ref[c]),
+                (open_hyp, events_hyp[c]),
+            ):
+                if opened[c] is not None:
+                    events[0].append(opened[c])
+                    events[1].append(ref.n_frames)
+
+            ref_on, ref_off = (np.asarray(e, dtype=np.float64) for e in events_ref[c])
+            hyp_on, hyp_off = (np.asarray(e, dtype=np.float64) for e in events_hyp[c])
+            tp = _match_events(
+                ref_on,
+                ref_off,
+                hyp_on,
+                hyp_off,
+                collar,
+                self.percentage_of_length,
+                self.evaluate_offset,
+            )
+            counts["event"][c] += (tp, len(hyp_on) - tp, len(ref_on) - tp)
+
+    def compute_metrics(self, counts=None):
+        """Precision, recall and F per class and overall (micro)"""
+        counts = self.accumulated_ if counts is None else counts
+
+        metrics = {}
+        for key, table in counts.items():
+            metrics[key] = {
+                label: _prf(*(int(v) for v in table[c]))
+                for c, label in enumerate(self.classes)
+            }
+            metrics[key]["overall"] = _prf(*(int(v) for v in table.sum(axis=0)))
+
+        return metrics
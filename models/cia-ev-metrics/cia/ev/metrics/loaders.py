@@ -0,0 +1,256 @@
+import ast
+import csv
+import json
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from .musicannotation import MusicAnnotation
+
+
+# Columns of the *_EDICAO.csv audit exports
+EDICAO_URI = "COD_SGTM"
+EDICAO_START = "DATA_INICIO"
+EDICAO_END = "DATA_FIM"
+EDICAO_LABEL = "DSC_CLASSIFICACAO"
+
+# "dd/mm/yyyy HH:MM:SS" -> "yyyy/mm/dd HH:MM:SS" (character positions)
+_EDICAO_DATE_WIDTH = 19
+_EDICAO_DATE_ORDER = [6, 7, 8, 9, 2, 3, 4, 5, 0, 1] + list(range(10, 19))
+
+Columns = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _label_array(labels) -> np.ndarray:
+    """Object array of labels (keeps python str / tuples untouched)"""
+    array = np.empty(len(labels), dtype=object)
+    array[:] = list(labels)
+    return array
+
+
+def crop_columns(starts, ends, labels, start=None, end=None) -> Columns:
+    """Keep segments intersecting [start, end] and clip them to it
+
+    Same rule as `MusicAnnotation.from_txt`: cropping is only applied
+    when both `start` and `end` are given.
+    """
+    if start is None or end is None:
+        return starts, ends, labels
+
+    keep = (ends > start) & (starts < end)
+
+    return (
+        np.maximum(starts[keep], start),
+        np.minimum(ends[keep], end),
+        labels[keep],
+    )
+
+
+def map_columns(labels, map_labels: Callable) -> np.ndarray:
+    """Apply `map_labels` once per distinct label"""
+    if len(labels) == 0:
+        return labels
+
+    unique, inverse = np.unique(labels, return_inverse=True)
+    mapped = np.empty(len(unique), dtype=object)
+    for i, label in enumerate(unique):
+        mapped[i] = map_labels(label)
+
+    return mapped[inverse]
+
+
+def read_txt(filename: str) -> Columns:
+    """Parse a "start end label" label file (tab or space separated)
+
+    Returns
+    -------
+    starts, ends : np.ndarray
+        Segment boundaries in seconds (float64)
+    labels : np.ndarray
+        Segment labels (object array of str)
+    """
+    with open(filename, "r") as file:
+        tokens = file.read().split()
+
+    if len(tokens) % 3 != 0:
+        raise ValueError(
+            "{}: expected 3 columns (start, end, label) per line".format(filename)
+        )
+
+    starts = np.array(tokens[0::3], dtype=np.float64)
+    ends = np.array(tokens[1::3], dtype=np.float64)
+    labels = _label_array(tokens[2::3])
+
+    return starts, ends, labels
+
+
+def parse_edicao_dates(values) -> np.ndarray:
+    """Convert "dd/mm/yyyy HH:MM:SS" strings to datetime64[s] in one pass"""
+    values = np.asarray(values, dtype="U{}".format(_EDICAO_DATE_WIDTH))
+    if len(values) == 0:
+        return values.astype("datetime64[s]")
+
+    if np.any(np.char.str_len(values) != _EDICAO_DATE_WIDTH):
+        raise ValueError("dates must be formatted as dd/mm/yyyy HH:MM:SS")
+
+    chars = values.view("U1").reshape(-1, _EDICAO_DATE_WIDTH)
+    chars = chars[:, _EDICAO_DATE_ORDER]
+    chars[chars == "/"] = "-"
+    iso = np.ascontiguousarray(chars).view("U{}".format(_EDICAO_DATE_WIDTH))
+
+    return iso.ravel().astype("datetime64[s]")
+
+
+def read_edicao_csv(filename: str, origin=None, encoding: str = "utf-8"):
+    """Parse a *_EDICAO.csv audit export
+
+    Parameters
+    ----------
+    filename: str
+            path of the csv file
+    origin: str or np.datetime64, optional
+            time reference of the audio file. Defaults to the earliest
+            DATA_INICIO, i.e. the start of the recording.
+    encoding: str
+            file encoding
+
+    return:
+    starts, ends, labels: np.ndarray
+            segment boundaries in seconds relative to `origin` and labels
+            (DSC_CLASSIFICACAO)
+    uri: str
+            COD_SGTM of the first record (None for an empty file)
+    """
+    with open(filename, "r", newline="", encoding=encoding) as file:
+        rows = list(csv.reader(file))
+
+    header, rows = rows[0], [row for row in rows[1:] if row]
+    columns = dict(zip(header, zip(*rows))) if rows else {h: () for h in header}
+
+    begin = parse_edicao_dates(columns[EDICAO_START])
+    finish = parse_edicao_dates(columns[EDICAO_END])
+
+    if origin is None:
+        origin = begin.min() if len(begin) else np.datetime64(0, "s")
+    origin = np.datetime64(origin, "s")
+
+    one_second = np.timedelta64(1, "s")
+    starts = (begin - origin) / one_second
+    ends = (finish - origin) / one_second
+    labels = _label_array(columns[EDICAO_LABEL])
+
+    uri = columns[EDICAO_URI][0] if len(columns.get(EDICAO_URI, ())) else None
+
+    return starts, ends, labels, uri
+
+
+def read_label_list(filename: str) -> Columns:
+    """Parse a python-literal label list like `Synthetic Radio Examples/*-label.txt`
+
+    [[0.0, 3.12, 'music'], [1.84, 8.0, 'speech']]
+    """
+    with open(filename, "r") as file:
+        text = file.read().strip() or "[]"
+
+    # repr() of plain str labels is valid JSON once quotes are swapped,
+    # which parses an order of magnitude faster than literal_eval
+    try:
+        if '"' in text:
+            raise ValueError
+        records = json.loads(text.replace("'", '"'))
+    except ValueError:
+        records = ast.literal_eval(text)
+
+    if not records:
+        return np.empty(0), np.empty(0), _label_array([])
+
+    starts, ends, labels = zip(*records)
+
+    return (
+        np.array(starts, dtype=np.float64),
+        np.array(ends, dtype=np.float64),
+        _label_array(labels),
+    )
+
+
+def build_annotation(
+    starts,
+    ends,
+    labels,
+    start=None,
+    end=None,
+    map_labels=None,
+    uri: Optional[str] = None,
+) -> MusicAnnotation:
+    """Crop, map and convert parsed columns to a MusicAnnotation"""
+    starts, ends, labels = crop_columns(starts, ends, labels, start=start, end=end)
+
+    if map_labels:
+        labels = map_columns(labels, map_labels)
+
+    return MusicAnnotation.from_arrays(starts, ends, labels, uri=uri)
+
+
+def load_txt(
+    filename: str, start=None, end=None, map_labels=None, uri: Optional[str] = None
+) -> MusicAnnotation:
+    """Bulk version of `MusicAnnotation.from_txt`"""
+    starts, ends, labels = read_txt(filename)
+
+    return build_annotation(
+        starts, ends, labels, start=start, end=end, map_labels=map_labels, uri=uri
+    )
+
+
+def load_edicao_csv(
+    filename: str,
+    start=None,
+    end=None,
+    map_labels=None,
+    origin=None,
+    uri: Optional[str] = None,
+    encoding: str = "utf-8",
+) -> MusicAnnotation:
+    """Load a *_EDICAO.csv audit export (times in seconds from `origin`)"""
+    starts, ends, labels, cod = read_edicao_csv(
+        filename, origin=origin, encoding=encoding
+    )
+
+    return build_annotation(
+        starts,
+        ends,
+        labels,
+        start=start,
+        end=end,
+        map_labels=map_labels,
+        uri=cod if uri is None else uri,
+    )
+
+
+def load_label_list(
+    filename: str, start=None, end=None, map_labels=None, uri: Optional[str] = None
+) -> MusicAnnotation:
+    """Load a python-literal label list (Synthetic Radio Examples)"""
+    starts, ends, labels = read_label_list(filename)
+
+    return build_annotation(
+        starts, ends, labels, start=start, end=end, map_labels=map_labels, uri=uri
+    )
+
+
+def load_annotation(filename: str, **kwargs) -> MusicAnnotation:
+    """Load any of the supported label formats
+
+    *.csv files are read as EDICAO exports, files starting with "[" as
+    python-literal lists and everything else as "start end label" text.
+    """
+    if filename.lower().endswith(".csv"):
+        return load_edicao_csv(filename, **kwargs)
+
+    with open(filename, "r") as file:
+        head = file.read(64).lstrip()
+
+    if head.startswith("["):
+        return load_label_list(filename, **kwargs)
+
+    return load_txt(filename, **kwargs)
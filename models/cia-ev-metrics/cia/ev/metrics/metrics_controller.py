@@ -1,22 +1,15 @@
 from pyannote.core import Annotation, Segment, Timeline
 
 from .identification import IdentificationErrorAnalysisMusicECAD
-from .musicannotation import MusicAnnotation
+from .musicannotation import MusicAnnotation, fill_gaps, last_segment
 from .segmentation import SegmentationPurityCoverageFMeasureMusic
 
 
 def create_context(
     segments: MusicAnnotation, validLabels=None, endfile=None, onlysongs=True
 ):
-    start = 0.0
-    s = list(segments.itertracks(yield_label=True))[-1]
-    end = s[0].end
-    validSegs = None
     new_ref = None
 
-    if endfile is not None:
-        end = endfile
-
     if validLabels is not None:
         valid = validLabels.copy()
 
@@ -25,27 +18,33 @@ def create_context(
             valid.append("0")
 
         dif_labels = list(set(refLabels) - set(valid))  # compute set difference
+
+        if not dif_labels:
+            # every label is valid: nothing to delete
+            return segments if len(segments) > 0 else None
+
         dif_segs = segments.subset(
             labels=dif_labels
         )  # get segments and labels with labels of diff
-        segsList_to_del = [
-            seg[0] for seg in dif_segs.itertracks(yield_label=True)
-        ]  # get segments only
-        segs_to_del = Timeline(segments=segsList_to_del)  # create a new timeline
+        segs_to_del = dif_segs.get_timeline(copy=False)  # segments only
         new_ref = segments.extrude(
             removed=segs_to_del, mode="intersection"
         )  # delete segments not valid
-        if len(new_ref) > 0:
-            validSegs = new_ref.get_timeline()  # get new timeline -- valid timeline
-            validSegs = validSegs.support()
-        else:
+        if len(new_ref) == 0:
             new_ref = None
 
     else:
-        validSegs = [Segment(start, end)]
         new_ref = segments
 
-    return new_ref  # , Timeline(segments=validSegs)
+    return new_ref
+
+
+def _label_zero(label):
+    """Same mapping as rename_labels({0: "0"})"""
+    try:
+        return "0" if label == 0 else label
+    except (TypeError, ValueError):
+        return label
 
 
 def parse_Dic2Segs(listdic, name=None, onlysongs=True, filesize=None):
@@ -66,27 +65,20 @@ def parse_Dic2Segs(listdic, name=None, onlysongs=True, filesize=None):
             List of the Segments
     """
 
-    segs = MusicAnnotation(uri=name)
-
-    for d in listdic:
-        segs[Segment(d["inicio"], d["fim"])] = d["obra"]
-
-    segs = segs.rename_labels({0: "0"})
+    segs = MusicAnnotation.from_arrays(
+        [d["inicio"] for d in listdic],
+        [d["fim"] for d in listdic],
+        [_label_zero(d["obra"]) for d in listdic],
+        uri=name,
+    )
 
     if not onlysongs:
-        s = list(segs.itertracks(yield_label=True))[-1]
-        end = s[0].end
+        end = last_segment(segs).end
 
         if filesize is not None:
             end = filesize
 
-        all_timeline = Timeline(segments=[Segment(0.0, end)])
-        all_marks = [seg[0] for seg in segs.itertracks(yield_label=True)]
-        new_segs = all_timeline.extrude(
-            removed=Timeline(segments=all_marks), mode="intersection"
-        )
-        for nseg in new_segs:
-            segs[nseg] = "0"
+        fill_gaps(segs, end, label="0")
 
     return segs
 
@@ -115,25 +107,15 @@ def parse_Lists2Segs(
             List of the Segments
     """
 
-    segs = MusicAnnotation(uri=name)
-
-    for b, e, label in zip(beginlist, endlist, labels):
-        segs[Segment(b, e)] = label
+    segs = MusicAnnotation.from_arrays(beginlist, endlist, labels, uri=name)
 
     if not onlysongs:
-        s = list(segs.itertracks(yield_label=True))[-1]
-        end = s[0].end
+        end = last_segment(segs).end
 
         if filesize is not None:
             end = filesize
 
-        all_timeline = Timeline(segments=[Segment(0.0, end)])
-        all_marks = [seg[0] for seg in segs.itertracks(yield_label=True)]
-        new_segs = all_timeline.extrude(
-            removed=Timeline(segments=all_marks), mode="intersection"
-        )
-        for nseg in new_segs:
-            segs[nseg] = "0"
+        fill_gaps(segs, end, label="0")
 
     return segs
 
@@ -177,7 +159,12 @@ def preprocess_results(manualMarks, autoMarks, name=None, endfile=None):
 
 
 def compute_segmentation_metrics(
-    marks_dictionary=None, ref=None, hyp=None, tolerance=0.5, context=None
+    marks_dictionary=None,
+    ref=None,
+    hyp=None,
+    tolerance=0.5,
+    context=None,
+    returns_components=False,
 ):
     cvg_pty = SegmentationPurityCoverageFMeasureMusic(tolerance=tolerance)
 
@@ -192,6 +179,11 @@ def compute_segmentation_metrics(
     F = result["segmentation F[purity|coverage]"]
     detail = cvg_pty.get_intersect_detail()
 
+    if returns_components:
+        # raw durations, used to accumulate micro-averages over a corpus
+        components = {name: result[name] for name in cvg_pty.components_}
+        return coverage, purity, F, detail, components
+
     return coverage, purity, F, detail
 
 
@@ -233,17 +225,15 @@ def compute_metrics(
 
     if marks_dict is not None:
         marksRef = marks_dict["ref"]
-        s = list(marksRef.itertracks())[-1]
-        endTime = s[0].end
     else:
         marksRef = Ref
-        s = list(marksRef.itertracks())[-1]
-        endTime = s[0].end
+
+    endTime = last_segment(marksRef).end
 
     if endfile is not None:
         endTime = endfile
 
-    ref_original = Ref.copy()
+    total_audit = len(Ref)
     if withcontext:
         Ref = create_context(
             Ref, validLabels=validLabels, endfile=endTime, onlysongs=True
@@ -259,15 +249,20 @@ def compute_metrics(
             bounds=(0.0, -1),
         )
 
-        coverage, purity, F, detail = compute_segmentation_metrics(
-            marks_dictionary=marks_dict, ref=Ref, hyp=Hyp, tolerance=0.5
+        coverage, purity, F, detail, components = compute_segmentation_metrics(
+            marks_dictionary=marks_dict,
+            ref=Ref,
+            hyp=Hyp,
+            tolerance=0.5,
+            returns_components=True,
         )
 
-        error_analysis["counts"]["total musics audit"] = len(ref_original)
+        error_analysis["counts"]["total musics audit"] = total_audit
         error_analysis["dlp"] = coverage
         error_analysis["purity"] = purity
         error_analysis["F"] = F
         error_analysis["detail_segmentation"] = detail
+        error_analysis["components_segmentation"] = components
 
     return error_analysis
 
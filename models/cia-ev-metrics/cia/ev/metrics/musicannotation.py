@@ -1,3 +1,4 @@
+import numpy as np
 from pyannote.core import Annotation, Segment, Timeline
 from typing import Optional
 
@@ -45,6 +46,43 @@ def extend(segment, tolerance=0.0, bounds=(-1, -1)) -> Segment:
     return segment
 
 
+def last_segment(annotation: Annotation) -> Segment:
+    """Last segment of an annotation in chronological order
+
+    Same as `list(annotation.itertracks())[-1][0]`: segments are ordered
+    by (start, end), so the last one is the largest. One pass over the
+    segments, without materializing every track or sorting a timeline.
+    """
+    return max(annotation.itersegments())
+
+
+def fill_gaps(annotation: Annotation, end: float, label="0", start: float = 0.0):
+    """Label every part of [start, end] not covered by `annotation`
+
+    Single chronological sweep, equivalent to extruding the annotated
+    timeline from Timeline([Segment(start, end)]) and labelling the result.
+    The annotation is modified in place and returned.
+    """
+    gaps = []
+    cursor = start
+
+    for segment in annotation.get_timeline(copy=False):
+        if cursor >= end:
+            break
+        if segment.start > cursor:
+            gaps.append(Segment(cursor, min(segment.start, end)))
+        cursor = max(cursor, segment.end)
+
+    if cursor < end:
+        gaps.append(Segment(cursor, end))
+
+    for gap in gaps:
+        if gap:
+            annotation[gap] = label
+
+    return annotation
+
+
 class MusicAnnotation(Annotation):
 
     def __init__(self, uri: Optional[str] = None, modality: Optional[str] = None):
@@ -184,27 +222,43 @@ class MusicAnnotation(Annotation):
         return support
 
     @classmethod
-    def from_txt(cls, filename: str, start=None, end=None, map_labels=None):
-        annotation = MusicAnnotation()
-        with open(filename, "r") as file:
-            for line in file:
-                star_f, end_f, label_f = line.strip().split()
-                star_f, end_f = float(star_f), float(end_f)
-
-                if start is not None and end is not None:
-                    if end_f <= start or star_f >= end:
-                        continue
-                    star_f = max(star_f, start)
-                    end_f = min(end_f, end)
-
-                if map_labels:
-                    label_f = map_labels(label_f)
-
-                segment = Segment(star_f, end_f)
+    def from_arrays(
+        cls,
+        starts,
+        ends,
+        labels,
+        uri: Optional[str] = None,
+        modality: Optional[str] = None,
+    ) -> "MusicAnnotation":
+        """Build an annotation from parallel start/end/label sequences
+
+        All tracks are inserted in a single `from_records` call instead of
+        one `annotation[segment] = label` per segment. As with item
+        assignment, empty segments are skipped and a repeated segment keeps
+        its last label.
+        """
+        if isinstance(starts, np.ndarray):
+            starts = starts.tolist()
+        if isinstance(ends, np.ndarray):
+            ends = ends.tolist()
+
+        tracks = {}
+        for star_f, end_f, label_f in zip(starts, ends, labels):
+            segment = Segment(star_f, end_f)
+            if segment:
+                tracks[segment] = label_f
+
+        return cls.from_records(
+            ((segment, "_", label) for segment, label in tracks.items()),
+            uri=uri,
+            modality=modality,
+        )
 
-                annotation[segment] = label_f
+    @classmethod
+    def from_txt(cls, filename: str, start=None, end=None, map_labels=None):
+        from .loaders import load_txt
 
-        return annotation
+        return load_txt(filename, start=start, end=end, map_labels=map_labels)
 
     def segmentation(self):
         timeline: list[Segment] = self.get_timeline()
@@ -92,5 +92,20 @@ class SegmentationPurityCoverageFMeasureMusic(BaseMetric):
     def metric_components(cls):
         return [CVG_TOTAL, CVG_INTER, PTY_TOTAL, PTY_INTER]
 
+    def accumulate(self, components, uri=None):
+        """Accumulate components computed elsewhere (e.g. in another process)
+
+        Same bookkeeping as `BaseMetric.__call__`, so `abs(metric)` and
+        `compute_metrics()` give the micro-average over every accumulated file.
+        """
+        components = dict(components)
+        components[self.metric_name_] = self.compute_metric(components)
+        self.results_.append((uri, components))
+
+        for name in self.components_:
+            self.accumulated_[name] += components[name]
+
+        return components
+
     def get_intersect_detail(self):
         return self.datail_intersect.for_json()
\ No newline at end of file
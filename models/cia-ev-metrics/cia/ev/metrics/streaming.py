@@ -0,0 +1,359 @@
+"""Incremental (streaming) versions of the music metrics
+
+Reference and hypothesis arrive as time-ordered batches of
+(start, end, label) tuples, e.g. one hour of audit and detector output at a
+time. Each stream must be sorted by segment start across batches; segments
+may extend past the end of their batch. Passing `until` to `update` promises
+that every segment starting before `until` has been delivered, which lets
+segments be finalized early; `finalize()` closes both streams.
+
+A segment is scored once everything that can still intersect it is known,
+and only segments that can still interact with future input are kept, so the
+state is O(active segments). After `finalize()` the results are the same as
+`SegmentationPurityCoverageFMeasureMusic` and
+`IdentificationErrorAnalysisMusicECAD.music_difference` on the whole
+annotations. As with `annotation[segment] = label`, a segment repeated with
+the same boundaries keeps its last label.
+"""
+
+import math
+
+from pyannote.core import Segment
+from pyannote.metrics.base import f_measure
+from pyannote.metrics.matcher import (
+    MATCH_CONFUSION,
+    MATCH_FALSE_ALARM,
+    MATCH_MISSED_DETECTION,
+    MATCH_TOTAL,
+)
+from pyannote.metrics.segmentation import CVG_INTER, CVG_TOTAL, PTY_INTER, PTY_TOTAL
+
+from .identification import MATCH_CORRECT_DAP, MATCH_CORRECT_TP, MATCH_TOTAL_HYP
+from .musicannotation import extend
+
+
+class _SegmentStream:
+    """Time-ordered segment stream with last-label-wins deduplication
+
+    Segments sharing the latest start are staged until a later start (or
+    `until`) proves no duplicate of them can still arrive.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.watermark = -math.inf  # every segment starting before is committed
+        self._staged = {}
+        self._staged_start = -math.inf
+
+    def push(self, segments, until=None):
+        committed = []
+
+        for start, end, label in segments:
+            if start < self._staged_start or start < self.watermark:
+                raise ValueError(
+                    "{} segments must be sorted by start time "
+                    "({} received after {})".format(
+                        self.name, start, max(self._staged_start, self.watermark)
+                    )
+                )
+
+            segment = Segment(start, end)
+            if not segment:
+                continue
+
+            if start > self._staged_start:
+                committed += self._staged.items()
+                self._staged = {}
+                self._staged_start = start
+            self._staged[segment] = label
+
+        if self._staged:
+            self.watermark = max(self.watermark, self._staged_start)
+
+        if until is not None:
+            if until > self._staged_start:
+                committed += self._staged.items()
+                self._staged = {}
+            self.watermark = max(self.watermark, until)
+
+        return committed
+
+    def close(self):
+        committed = list(self._staged.items())
+        self._staged = {}
+        self.watermark = math.inf
+        return committed
+
+
+class _StreamingMusicMetric:
+    """Shared stream bookkeeping: commit, finalize and prune"""
+
+    def __init__(self, tolerance=0.0, bounds=(-1, -1)):
+        self.tolerance = tolerance
+        self.bounds = bounds
+        self.reset()
+
+    def reset(self):
+        self._reference = _SegmentStream("reference")
+        self._hypothesis = _SegmentStream("hypothesis")
+
+        # reference segments waiting for hypothesis: (segment, label, extended)
+        self._pending_ref = []
+        # hypothesis segments waiting for reference: (segment, label)
+        self._pending_hyp = []
+
+        # reference segments that may still intersect hypothesis segments
+        self._active_ref = []
+        # merged hypothesis intervals per label ([start, end] lists), i.e.
+        # the part of hypothesis.label_support(label) that is still needed
+        self._hyp_support = {}
+
+    def _extend(self, segment):
+        return extend(segment, tolerance=self.tolerance, bounds=self.bounds)
+
+    def update(self, reference=(), hypothesis=(), until=None):
+        """Add time-ordered (start, end, label) batches to both streams"""
+        for segment, label in self._reference.push(reference, until=until):
+            self._commit_reference(segment, label)
+
+        for segment, label in self._hypothesis.push(hypothesis, until=until):
+            self._commit_hypothesis(segment, label)
+
+        self._flush()
+        return self
+
+    def finalize(self):
+        """Close both streams and score every remaining segment"""
+        for segment, label in self._reference.close():
+            self._commit_reference(segment, label)
+
+        for segment, label in self._hypothesis.close():
+            self._commit_hypothesis(segment, label)
+
+        self._flush()
+        return self
+
+    def _commit_reference(self, segment, label):
+        extended = self._extend(segment)
+        self._pending_ref.append((segment, label, extended))
+        self._active_ref.append((segment, label, extended))
+        self._reference_committed(segment, label)
+
+    def _commit_hypothesis(self, segment, label):
+        # segments come sorted by start, so only the last interval can merge
+        # (same rule as Timeline.support)
+        support = self._hyp_support.setdefault(label, [])
+        if support and not (segment ^ Segment(*support[-1])):
+            support[-1][1] = max(support[-1][1], segment.end)
+        else:
+            support.append([segment.start, segment.end])
+
+        self._pending_hyp.append((segment, label))
+        self._hypothesis_committed(segment, label)
+
+    def _flush(self):
+        ref_done = self._reference.watermark
+        hyp_done = self._hypothesis.watermark
+
+        pending = []
+        for segment, label, extended in self._pending_ref:
+            if hyp_done >= max(segment.end, extended.end):
+                support = [Segment(*s) for s in self._hyp_support.get(label, [])]
+                self._score_reference(segment, label, extended, support)
+            else:
+                pending.append((segment, label, extended))
+        self._pending_ref = pending
+
+        pending = []
+        for segment, label in self._pending_hyp:
+            if ref_done >= segment.end + self.tolerance:
+                self._score_hypothesis(segment, label, self._active_ref)
+            else:
+                pending.append((segment, label))
+        self._pending_hyp = pending
+
+        self._prune()
+
+    def _prune(self):
+        # future reference segments start after the reference watermark
+        horizon = self._reference.watermark - self.tolerance
+        for segment, _, extended in self._pending_ref:
+            horizon = min(horizon, segment.start, extended.start)
+
+        for label, support in self._hyp_support.items():
+            # the last interval may still grow, keep it
+            keep = [s for s in support[:-1] if s[1] > horizon]
+            self._hyp_support[label] = keep + support[-1:]
+
+        horizon = self._hypothesis.watermark
+        for segment, _ in self._pending_hyp:
+            horizon = min(horizon, segment.start)
+
+        self._active_ref = [
+            item
+            for item in self._active_ref
+            if max(item[0].end, item[2].end) > horizon
+        ]
+
+    @property
+    def state_size(self):
+        """Number of segments/intervals currently held"""
+        return (
+            len(self._pending_ref)
+            + len(self._pending_hyp)
+            + len(self._active_ref)
+            + sum(len(s) for s in self._hyp_support.values())
+        )
+
+    def _reference_committed(self, segment, label):
+        pass
+
+    def _hypothesis_committed(self, segment, label):
+        pass
+
+    def _score_reference(self, segment, label, extended, support):
+        pass
+
+    def _score_hypothesis(self, segment, label, references):
+        pass
+
+
+class StreamingSegmentationPurityCoverage(_StreamingMusicMetric):
+    """Incremental `SegmentationPurityCoverageFMeasureMusic`
+
+    Components only include reference segments already scored; after
+    `finalize()` they equal the batch components.
+    """
+
+    def __init__(self, beta=1):
+        self.beta = beta
+        super(StreamingSegmentationPurityCoverage, self).__init__()
+
+    def reset(self):
+        super(StreamingSegmentationPurityCoverage, self).reset()
+        self.components = {
+            CVG_TOTAL: 0.0,
+            CVG_INTER: 0.0,
+            PTY_TOTAL: 0.0,
+            PTY_INTER: 0.0,
+        }
+
+    def _hypothesis_committed(self, segment, label):
+        self.components[PTY_TOTAL] += segment.duration
+
+    def _score_reference(self, segment, label, extended, support):
+        self.components[CVG_TOTAL] += segment.duration
+        for h in support:
+            if segment.intersects(h):
+                intersection = (segment & h).duration
+                self.components[CVG_INTER] += intersection
+                self.components[PTY_INTER] += intersection
+
+    def compute_metrics(self):
+        detail = self.components
+
+        purity = (
+            1.0 if detail[PTY_TOTAL] == 0.0 else detail[PTY_INTER] / detail[PTY_TOTAL]
+        )
+        coverage = (
+            1.0 if detail[CVG_TOTAL] == 0.0 else detail[CVG_INTER] / detail[CVG_TOTAL]
+        )
+
+        return purity, coverage, f_measure(purity, coverage, beta=self.beta)
+
+
+class StreamingIdentificationCounts(_StreamingMusicMetric):
+    """Incremental counts of `IdentificationErrorAnalysisMusicECAD`
+
+    Defaults match `compute_identification_metrics` as called by
+    `compute_metrics` (bounds=(0.0, -1)).
+    """
+
+    def __init__(self, tolerance=0.0, bounds=(0.0, -1)):
+        super(StreamingIdentificationCounts, self).__init__(
+            tolerance=tolerance, bounds=bounds
+        )
+
+    def reset(self):
+        super(StreamingIdentificationCounts, self).reset()
+        self.counts = {
+            MATCH_MISSED_DETECTION: 0,
+            MATCH_FALSE_ALARM: 0,
+            MATCH_CORRECT_TP: 0,
+            MATCH_CORRECT_DAP: 0,
+            MATCH_TOTAL: 0,
+            MATCH_TOTAL_HYP: 0,
+            MATCH_CONFUSION: 0,
+        }
+
+    def _reference_committed(self, segment, label):
+        self.counts[MATCH_TOTAL] += 1
+
+    def _hypothesis_committed(self, segment, label):
+        self.counts[MATCH_TOTAL_HYP] += 1
+
+    def _score_reference(self, segment, label, extended, support):
+        matches = sum(1 for h in support if h.intersects(extended))
+
+        if matches:
+            self.counts[MATCH_CORRECT_TP] += matches
+            self.counts[MATCH_CORRECT_DAP] += 1
+        else:
+            self.counts[MATCH_MISSED_DETECTION] += 1
+
+    def _score_hypothesis(self, segment, label, references):
+        for ref_segment, ref_label, extended in references:
+            if ref_label == label and segment.intersects(extended):
+                return
+
+        self.counts[MATCH_FALSE_ALARM] += 1
+        self.counts[MATCH_CONFUSION] += sum(
+            1 for ref_segment, _, _ in references if segment.intersects(ref_segment)
+        )
+
+    @property
+    def dap(self):
+        total = self.counts[MATCH_TOTAL]
+        return self.counts[MATCH_CORRECT_DAP] / total if total else 0.0
+
+
+class StreamingMusicEvaluator:
+    """Live counterpart of `compute_metrics` (without context filtering)
+
+    >>> evaluator = StreamingMusicEvaluator()
+    >>> for hour in feed:
+    ...     evaluator.update(hour.reference, hour.hypothesis, until=hour.end)
+    ...     print(evaluator.snapshot()["F"])
+    >>> results = evaluator.finalize().snapshot()
+    """
+
+    def __init__(self, tolerance=0.0, bounds=(0.0, -1)):
+        self.identification = StreamingIdentificationCounts(
+            tolerance=tolerance, bounds=bounds
+        )
+        self.segmentation = StreamingSegmentationPurityCoverage()
+
+    def update(self, reference=(), hypothesis=(), until=None):
+        reference, hypothesis = list(reference), list(hypothesis)
+        self.identification.update(reference, hypothesis, until=until)
+        self.segmentation.update(reference, hypothesis, until=until)
+        return self
+
+    def finalize(self):
+        self.identification.finalize()
+        self.segmentation.finalize()
+        return self
+
+    def snapshot(self):
+        purity, coverage, F = self.segmentation.compute_metrics()
+        counts = dict(self.identification.counts)
+        counts["total musics audit"] = counts[MATCH_TOTAL]
+
+        return {
+            "counts": counts,
+            "dap": self.identification.dap,
+            "dlp": coverage,
+            "purity": purity,
+            "F": F,
+            "components_segmentation": dict(self.segmentation.components),
+        }
@@ -1,39 +1,340 @@
-import logging, logging.handlers
-import os
-import pathlib
-# print(str(pathlib.Path(__file__).parent.parent.parent.absolute()) + "/log/worker.log")
+"""Non-blocking, structured logging
+
+`get_logger` returns loggers whose only handler puts records on an
+in-memory queue; a `QueueListener` thread formats them as json lines and
+writes them to the file. A full queue drops the record (and counts it)
+instead of blocking, so logging never stalls an evaluation or inference
+worker.
+
+Every process writes its own file: `logger.log` in the process that
+configures logging first, `logger-<pid>.log` in child processes, so pool
+workers do not interleave writes in one file. Alternatively, start a
+`LogListenerProcess` in the parent and pass its `queue` to `get_logger` in
+the workers: one process then writes every record to one file. A forked
+child keeps the loggers its parent configured: their first record in the
+child starts the queue, listener thread and file of the child.
+
+Records of a hot loop are rate limited per call site (logger, line and
+message template); the next record let through from that call site carries
+the number of records suppressed before it.
+"""
 
-import logging, logging.handlers
+import copy
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import multiprocessing.util
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+LOG_DIR = "/log"
+
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+}
+_FORMATTER = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One json object per record: time, level, logger, process, thread,
+    message, exception and any `extra` fields
+    """
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime(
+                "%Y-%m-%dT%H:%M:%S", time.localtime(record.created)
+            )
+            + ".{:03d}".format(int(record.msecs)),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site: `rate` records per second after a
+    `burst`; suppressed records are counted in the next one let through
+    (`suppressed` field)
+
+    Only the `max_sites` most recently used call sites are tracked.
+    """
+
+    def __init__(self, rate=10.0, burst=50, max_sites=1024):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_sites = max_sites
+        self._sites = OrderedDict()  # site: [tokens, last time, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        site = (record.name, record.pathname, record.lineno, record.msg)
+        now = record.created
+
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None:
+                state = self._sites[site] = [float(self.burst), now, 0]
+                if len(self._sites) > self.max_sites:
+                    self._sites.popitem(last=False)
+            else:
+                self._sites.move_to_end(site)
+
+            tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+            if tokens < 1.0:
+                state[0] = tokens
+                state[2] += 1
+                return False
+
+            state[0] = tokens - 1.0
+            if state[2]:
+                record.suppressed = state[2]
+                state[2] = 0
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full
+
+    `on_fork` is called before the first record of a forked child, whose
+    inherited queue no thread reads.
+    """
+
+    def __init__(self, log_queue, on_fork=None):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.pid = os.getpid()
+        self.on_fork = on_fork
+
+    def prepare(self, record):
+        """Picklable copy of the record: the message formatted, the
+        traceback kept in `exc_text` for JsonFormatter
+        """
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _FORMATTER.formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.pid != os.getpid() and self.on_fork is not None:
+            self.on_fork()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _log_file(log_dir, name="logger", forked=False):
+    """logger.log in the configuring process, logger-<pid>.log in children"""
+    if multiprocessing.parent_process() is None and not forked:
+        filename = "{}.log".format(name)
+    else:
+        filename = "{}-{}.log".format(name, os.getpid())
+    return os.path.join(log_dir, filename)
+
+
+def _file_handler(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handler = logging.FileHandler(path)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+class _ProcessLogging:
+    """Queue, handler and listener thread of this process"""
+
+    def __init__(self, log_dir, max_queue, rate, burst, remote_queue=None):
+        self.config = (log_dir, max_queue, rate, burst, remote_queue)
+        self.path = None
+        self.listener = None
+        self.handler = DroppingQueueHandler(remote_queue, on_fork=self.rebind)
+        if rate is not None:
+            self.handler.addFilter(RateLimitFilter(rate=rate, burst=burst))
+        self._start()
+
+    def _start(self, forked=False):
+        log_dir, max_queue, _, _, remote_queue = self.config
+        if remote_queue is not None:
+            return
+
+        self.path = _log_file(log_dir, forked=forked)
+        self.handler.queue = queue.Queue(max_queue)
+        self.listener = logging.handlers.QueueListener(
+            self.handler.queue, _file_handler(self.path), respect_handler_level=True
+        )
+        self.listener.start()
+        # unlike atexit, also runs when a multiprocessing child exits
+        multiprocessing.util.Finalize(self, self.stop, exitpriority=0)
+
+    def rebind(self):
+        """Start the queue and listener of this process in a forked child
+
+        The child inherits the handler and queue of its parent, but not the
+        listener thread: without a new one, its records would pile up in
+        the queue and be lost.
+        """
+        with self.handler.lock:
+            if self.handler.pid == os.getpid():
+                return
+            self.handler.pid = os.getpid()
+            self.handler.dropped = 0
+            self.listener = None
+            self._start(forked=True)
+
+    def stop(self):
+        """Write the queued records and stop the listener"""
+        # a forked child has not rebound yet: the listener is the parent's
+        if self.listener is not None and self.handler.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+
+
+_logging = None
+_lock = threading.Lock()
+
+
+def _reset_lock():
+    # the lock may have been held by another thread of the parent at the fork
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_lock)
+
+
+def _process_logging(log_dir, max_queue, rate, burst, remote_queue):
+    global _logging
+    config = (log_dir, max_queue, rate, burst, remote_queue)
+    with _lock:
+        forked = _logging is not None and _logging.handler.pid != os.getpid()
+        if _logging is None or (forked and _logging.config != config):
+            # a forked child may configure its own logging
+            _logging = _ProcessLogging(*config)
+        _logging.rebind()
+        if _logging.config != config:
+            raise ValueError(
+                "logging of this process is already configured with "
+                "log_dir={!r}, max_queue={}, rate={}, burst={}, log_queue={!r}".format(
+                    *_logging.config
+                )
+            )
+        return _logging
+
+
+def get_logger(
+    module_name,
+    log_dir=LOG_DIR,
+    level=logging.INFO,
+    log_queue=None,
+    max_queue=10000,
+    rate=10.0,
+    burst=50,
+):
+    """Logger of `module_name` writing json lines through a queue
+
+    parameters:
+    log_dir: str
+            folder of the per-process files
+    log_queue: multiprocessing queue, optional
+            `LogListenerProcess.queue`: send the records to that process
+            instead of a file of this process
+    max_queue: int
+            records waiting to be written before new ones are dropped
+    rate, burst: float, int
+            rate limit of each call site (records per second, after a
+            burst); None disables it
+
+    log_dir, log_queue, max_queue, rate and burst configure the whole
+    process: later calls must pass the same values (ValueError otherwise).
+
+    return:
+    {"logger": logging.Logger, "path": file written by this process, or
+    None when records go to a listener process}
+    """
+    state = _process_logging(log_dir, max_queue, rate, burst, log_queue)
 
-def get_logger(module_name):
     logger = logging.getLogger(module_name)
-    logger.setLevel(logging.INFO)
-    formatter = logging.Formatter('%(asctime)s:%(levelname)s : %(message)s')
-    file_location = "/log/logger.log"
-
-    try:
-        if not os.path.exists(file_location):
-            os.makedirs("/log")
-            f= open(file_location,"w+")
-            f.close()
-    except:
-        pass
-    
-
-    file_handler = logging.FileHandler(file_location)
-    file_handler.setFormatter(formatter)
-
-    if (logger.hasHandlers()):
-        logger.handlers.clear()
-    logger.addHandler(file_handler)
-    return ({'logger':logger, 'path':file_location})
-
-
-
-if __name__ == '__main__':
-    handler = get_logger(__name__)
-    logger = handler['logger']
-    print(handler['path'])
-    logger.info("working")
-    
+    logger.setLevel(level)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        if isinstance(handler, DroppingQueueHandler) and handler is not state.handler:
+            logger.removeHandler(handler)
+    if state.handler not in logger.handlers:
+        logger.addHandler(state.handler)
+
+    return {"logger": logger, "path": state.path}
+
+
+def dropped_records():
+    """Records this process dropped because its queue was full"""
+    return 0 if _logging is None else _logging.handler.dropped
+
+
+def _listen(log_queue, path):
+    handler = _file_handler(path)
+    while True:
+        record = log_queue.get()
+        if record is None:
+            break
+        handler.handle(record)
+    handler.close()
+
+
+class LogListenerProcess:
+    """A process writing the records of every worker to one file
+
+    Create it in the parent before starting the workers and pass `queue`
+    to get_logger(..., log_queue=...) in each of them.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, max_queue=10000, context=None):
+        context = context or multiprocessing.get_context()
+        self.path = os.path.join(log_dir, "logger.log")
+        self.queue = context.Queue(max_queue)
+        self._process = context.Process(
+            target=_listen, args=(self.queue, self.path), daemon=True
+        )
+
+    def start(self):
+        self._process.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Write the queued records and stop, or kill the listener when the
+        queue stays full for `timeout` seconds
+        """
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            self._process.terminate()
+        self._process.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
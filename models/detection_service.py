@@ -0,0 +1,370 @@
+"""Music and speech detection as a local HTTP service
+
+A fixed pool of worker processes each builds one MusicSpeechController
+(client from a "module:Class" spec, called with the params) and warms it
+up with a prediction of silence before the service accepts jobs. At most
+`workers + max_queue` jobs are accepted at a time; beyond that requests
+are answered 503 with Retry-After, so callers back off instead of piling
+up work. A worker that dies (crash, out of memory) breaks the pool: the
+jobs it held fail, and the next job starts a new warmed-up pool.
+
+    POST /detect                  audio file in the body (any format
+                                  libsndfile reads)
+    POST /detect                  {"path": "..."} with Content-Type
+                                  application/json, a file the service
+                                  can read
+    GET  /health                  pool and job counters, pool restarts
+
+/detect?format=tsv returns the tab-separated "start\\tend\\tlabel" lines of
+detection_music_speech.ipynb instead of json.
+
+Usage (from the repository root):
+    python -m models.detection_service \
+        --client models.musicspeech_class:MusicSpeechClass
+    python -m models.detection_service --client models.fake_client:FakeClient
+"""
+
+import argparse
+import importlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import librosa
+import numpy as np
+
+try:
+    from .musicspeech_controller import MusicSpeechController
+    from .musicspeech_params import MusicSpeech_Params
+except ImportError:  # imported from within models/
+    from musicspeech_controller import MusicSpeechController
+    from musicspeech_params import MusicSpeech_Params
+
+
+def load_client(spec, params):
+    """Client built by the callable `spec` ("module:attribute") from params"""
+    module, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module), attribute)(params)
+
+
+def events_to_tsv(events):
+    """Events in the tab-separated format of detection_music_speech.ipynb"""
+    return "\n".join(
+        "{}\t{}\t{}".format(round(start, 5), round(stop, 5), label)
+        for start, stop, label in events
+    )
+
+
+# controller of each worker process, set once by the pool initializer
+_worker = {}
+
+
+def _init_worker(client_spec, params):
+    controller = MusicSpeechController(load_client(client_spec, params), params)
+    silence = np.zeros(int(params.audio_clip_length * params.sample_rate))
+    controller.predict(silence, params.sample_rate)
+    _worker["controller"] = controller
+
+
+def _ready():
+    return os.getpid()
+
+
+def _detect(job):
+    """Events of a job: ("path", filename) or ("upload", bytes)"""
+    kind, data = job
+    controller = _worker["controller"]
+    if kind == "path":
+        return controller.predict(data)
+
+    try:
+        audio, fs = librosa.load(io.BytesIO(data), sr=None, mono=True)
+    except Exception as e:
+        raise ValueError("cannot decode the upload ({})".format(e)) from None
+    return controller.predict(audio, fs)
+
+
+class Busy(Exception):
+    """Every worker and queue slot is taken"""
+
+
+class DetectionService:
+    """Pool of warmed-up controllers behind a bounded job queue
+
+    parameters:
+    client_spec: str
+            "module:Class" of the inference client, e.g.
+            "models.musicspeech_class:MusicSpeechClass"
+    params: MusicSpeech_Params, optional
+    workers: int, optional
+            worker processes, defaults to os.cpu_count()
+    max_queue: int
+            accepted jobs waiting for a worker
+    """
+
+    def __init__(self, client_spec, params=None, workers=None, max_queue=16):
+        self.client_spec = client_spec
+        self.params = params or MusicSpeech_Params()
+        self.workers = workers or os.cpu_count()
+        self.max_queue = max_queue
+
+        self._slots = threading.BoundedSemaphore(self.workers + max_queue)
+        self._lock = threading.Lock()
+        # separate from _lock: done callbacks of a broken pool count jobs
+        # while a new pool warms up
+        self._pool_lock = threading.Lock()
+        self.counters = {
+            "accepted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "restarts": 0,
+        }
+        self.active = 0
+
+        self._executor = self._start_pool()
+
+    def _start_pool(self):
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.client_spec, self.params),
+        )
+        # one job per worker, so that every process is started and warm
+        for future in [executor.submit(_ready) for _ in range(self.workers)]:
+            future.result()
+        return executor
+
+    def _restart(self, broken):
+        """Replace the pool `broken`, unless another thread already did"""
+        with self._pool_lock:
+            if self._executor is broken:
+                broken.shutdown(wait=False)
+                self._executor = self._start_pool()
+                self._count("restarts")
+
+    def _count(self, name, active=0):
+        with self._lock:
+            self.counters[name] += 1
+            self.active += active
+
+    def submit(self, job):
+        """Future of the events of `job`; raise Busy when the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise Busy()
+        self._count("accepted", 1)
+
+        try:
+            executor = self._executor
+            try:
+                future = executor.submit(_detect, job)
+            except BrokenProcessPool:
+                self._restart(executor)
+                future = self._executor.submit(_detect, job)
+        except BaseException:
+            self._slots.release()
+            self._count("failed", -1)
+            raise
+
+        def done(future):
+            self._slots.release()
+            self._count("failed" if future.exception() else "completed", -1)
+
+        future.add_done_callback(done)
+        return future
+
+    def detect(self, job):
+        return self.submit(job).result()
+
+    def health(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "active": self.active,
+                "queued": max(0, self.active - self.workers),
+                **self.counters,
+            }
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _handler(service, max_upload_bytes):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, body, content_type="application/json", headers=()):
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/health":
+                self._send(200, service.health())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/detect":
+                self._send(404, {"error": "not found"})
+                return
+            output = parse_qs(url.query).get("format", ["json"])[0]
+            if output not in ("json", "tsv"):
+                self._send(400, {"error": "format must be json or tsv"})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            if length > max_upload_bytes:
+                self.close_connection = True
+                error = "upload over {} bytes".format(max_upload_bytes)
+                self._send(413, {"error": error})
+                return
+            body = self.rfile.read(length)
+
+            content_type = self.headers.get("Content-Type", "")
+            if content_type.startswith("application/json"):
+                try:
+                    job = ("path", json.loads(body)["path"])
+                except (ValueError, KeyError, TypeError):
+                    self._send(400, {"error": 'expected {"path": "..."}'})
+                    return
+            elif body:
+                job = ("upload", body)
+            else:
+                self._send(400, {"error": "empty request"})
+                return
+
+            tic = time.perf_counter()
+            try:
+                events = service.detect(job)
+            except Busy:
+                retry = [("Retry-After", "1")]
+                self._send(503, {"error": "queue full"}, headers=retry)
+                return
+            except FileNotFoundError as e:
+                self._send(404, {"error": str(e)})
+                return
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+                return
+            except Exception as e:  # decoding or inference error of this job
+                self._send(500, {"error": "{}: {}".format(type(e).__name__, e)})
+                return
+
+            if output == "tsv":
+                tsv = events_to_tsv(events).encode()
+                self._send(200, tsv, "text/tab-separated-values")
+            else:
+                self._send(
+                    200,
+                    {
+                        "events": [
+                            {"start": start, "end": stop, "label": label}
+                            for start, stop, label in events
+                        ],
+                        "seconds": time.perf_counter() - tic,
+                    },
+                )
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class DetectionServer:
+    """HTTP front end of a DetectionService, served from a daemon thread
+
+    port 0 picks a free port, see `port` / `url` once created.
+    """
+
+    def __init__(
+        self, service, host="127.0.0.1", port=8080, max_upload_bytes=1 << 30
+    ):
+        self.service = service
+        self._server = ThreadingHTTPServer(
+            (host, port), _handler(service, max_upload_bytes)
+        )
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(self._server.server_address[0], self.port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def close(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Music and speech detection service")
+    parser.add_argument(
+        "--client",
+        default="models.musicspeech_class:MusicSpeechClass",
+        help="module:Class of the inference client, built with the params",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--queue", type=int, default=16, help="jobs waiting for a worker"
+    )
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    params = MusicSpeech_Params(batch_size=args.batch_size)
+    with DetectionService(args.client, params, args.workers, args.queue) as service:
+        server = DetectionServer(service, args.host, args.port)
+        print("serving on {} with {} workers".format(server.url, service.workers))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import time
+
+import numpy as np
+
+
+class FakeClient:
+    """Offline stand-in for a hermes Client: {"time_distributed": (batch, 802, 2)}
+
+    Not a model: speech follows the smoothed frame level of the mel input,
+    music its complement, so post-processing sees runs of realistic length
+    (both classes switch every few seconds on the synthetic radio examples).
+    `latency` adds a fixed delay per batch to stand in for a server.
+
+    Takes the controller params like MusicSpeechClass, so either can be
+    built from a "module:Class" spec.
+    """
+
+    def __init__(self, params=None, latency=0.0, width=50):
+        self.latency = latency
+        self.kernel = np.ones(width) / width
+
+    def predict(self, *inputs, timeout=None):
+        mel = inputs[0]
+        level = mel.mean(axis=-1)
+        level = np.apply_along_axis(np.convolve, 1, level, self.kernel, mode="same")
+        level -= np.median(level, axis=1, keepdims=True)
+        speech = 1.0 / (1.0 + np.exp(-level / 2.0))
+        if self.latency:
+            time.sleep(self.latency)
+        return {"time_distributed": np.stack((speech, 1.0 - speech), axis=-1)}
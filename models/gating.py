@@ -0,0 +1,54 @@
+"""Dead air detection of the 8 s analysis windows of mk_preds_fa
+
+A window is dead air when its RMS level (before the peak normalization
+mk_preds_fa applies) is below `silence_floor_db`, or below
+`noise_floor_db` with a spectral flatness above `noise_flatness`, i.e.
+quiet and noise-like (carrier noise, hiss). Such windows are labelled
+neither speech nor music without mel extraction or inference.
+
+Levels are in dB relative to full scale (a full scale sine is -3 dB).
+The window energies come from one pass over the signal; only windows
+below the noise floor are analysed spectrally.
+"""
+
+import librosa
+import numpy as np
+
+
+def window_levels(signal, n_windows, hop, win):
+    """RMS level (dB) of signal[k * hop : k * hop + win] for every window
+
+    `signal` holds n_windows * hop + (win - hop) samples, as the padded
+    signal of mk_preds_fa.
+    """
+    overlap = win - hop
+    blocks = signal[: n_windows * hop].reshape(n_windows, hop)
+    energy = np.einsum("ij,ij->i", blocks, blocks)
+
+    # each window reaches `overlap` samples into the next block
+    heads = np.einsum("ij,ij->i", blocks[:, :overlap], blocks[:, :overlap])
+    tail = signal[n_windows * hop : n_windows * hop + overlap]
+    energy[:-1] += heads[1:]
+    energy[-1] += np.dot(tail, tail)
+
+    return 10.0 * np.log10(energy / win + 1e-20)
+
+
+def spectral_flatness(segment, n_fft=2048):
+    """Mean spectral flatness of non-overlapping frames of `segment`"""
+    flatness = librosa.feature.spectral_flatness(
+        y=segment, n_fft=n_fft, hop_length=n_fft, center=False
+    )
+    return float(flatness.mean())
+
+
+def dead_air_windows(signal, n_windows, hop, win, params):
+    """Boolean mask of the windows to skip, see module docstring"""
+    levels = window_levels(signal, n_windows, hop, win)
+    dead = levels < params.silence_floor_db
+
+    for k in np.flatnonzero(~dead & (levels < params.noise_floor_db)):
+        segment = signal[k * hop : k * hop + win]
+        dead[k] = spectral_flatness(segment) > params.noise_flatness
+
+    return dead
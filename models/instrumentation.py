@@ -0,0 +1,215 @@
+"""Timings and counters of MusicSpeechController
+
+The controller reports to an `Instrumentation`:
+
+    span(stage)         context manager timing one stage ("decode",
+                        "resample", "feature", "inference", "postprocess",
+                        "predict" around a whole prediction)
+    count(name, value)  counter increments ("windows", "batches",
+                        "padded_windows", "bytes_sent", "audio_seconds")
+    publish()           called once per prediction, to push to sinks
+
+The base class records nothing and is the controller's default, so a
+disabled controller only pays for a few empty method calls per window.
+`Metrics` keeps totals, which `prometheus_text` and `MetricsServer` (a
+/metrics endpoint in a thread) expose in the Prometheus text format, and
+`JsonLinesSink` appends to a file on every publish().
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Instrumentation:
+    """Hooks of the controller; this base class records nothing"""
+
+    enabled = False
+
+    def span(self, stage):
+        return _NO_SPAN
+
+    def count(self, name, value=1):
+        pass
+
+    def publish(self):
+        pass
+
+
+NO_INSTRUMENTATION = Instrumentation()
+
+
+class _Span:
+    __slots__ = ("metrics", "stage", "tic")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.tic = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.tic)
+        return False
+
+
+class Metrics(Instrumentation):
+    """Totals of every span and counter since creation (or reset())
+
+    parameters:
+    sinks: list of callables, optional
+            each called with snapshot() on publish()
+    """
+
+    enabled = True
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.spans = {}  # stage: [calls, seconds, max seconds]
+            self.counters = {}
+
+    def span(self, stage):
+        return _Span(self, stage)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            span = self.spans.get(stage)
+            if span is None:
+                self.spans[stage] = [1, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                span[2] = max(span[2], seconds)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        """{"time", "spans": {stage: {"calls", "seconds", "max_seconds"}},
+        "counters": {name: value}}
+        """
+        with self._lock:
+            return {
+                "time": time.time(),
+                "spans": {
+                    stage: {"calls": calls, "seconds": seconds, "max_seconds": peak}
+                    for stage, (calls, seconds, peak) in self.spans.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+    def publish(self):
+        if self.sinks:
+            snapshot = self.snapshot()
+            for sink in self.sinks:
+                sink(snapshot)
+
+
+class JsonLinesSink:
+    """Appends every published snapshot to `path`, one json object per line"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, snapshot):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(snapshot) + "\n")
+
+
+def prometheus_text(snapshot, prefix="musicspeech"):
+    """A Metrics snapshot in the Prometheus text exposition format"""
+    lines = [
+        "# HELP {}_stage_seconds Wall clock of the controller stages".format(prefix),
+        "# TYPE {}_stage_seconds summary".format(prefix),
+    ]
+    for stage, span in sorted(snapshot["spans"].items()):
+        label = '{{stage="{}"}}'.format(stage)
+        lines.append(
+            "{}_stage_seconds_sum{} {!r}".format(prefix, label, span["seconds"])
+        )
+        lines.append("{}_stage_seconds_count{} {}".format(prefix, label, span["calls"]))
+
+    lines.append(
+        "# HELP {}_stage_max_seconds Longest call of each stage".format(prefix)
+    )
+    lines.append("# TYPE {}_stage_max_seconds gauge".format(prefix))
+    for stage, span in sorted(snapshot["spans"].items()):
+        lines.append(
+            '{}_stage_max_seconds{{stage="{}"}} {!r}'.format(
+                prefix, stage, span["max_seconds"]
+            )
+        )
+
+    for name, value in sorted(snapshot["counters"].items()):
+        lines.append("# TYPE {}_{}_total counter".format(prefix, name))
+        lines.append("{}_{}_total {!r}".format(prefix, name, value))
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves prometheus_text(metrics.snapshot()) on http://host:port/metrics
+    from a daemon thread
+
+    port 0 picks a free port, see `port` once started.
+    """
+
+    def __init__(self, metrics, host="127.0.0.1", port=0):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = prometheus_text(metrics.snapshot()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
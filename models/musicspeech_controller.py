@@ -8,6 +8,7 @@ Original file is located at
 """
 
 import argparse
+import contextlib
 from typing import Optional
 import numpy as np
 import librosa
@@ -15,17 +16,34 @@ import math
 from hermes.abstract.client import Client
 from hermes.openvino.client import OpenVinoClient
 
+try:
+    from .gating import dead_air_windows
+    from .instrumentation import NO_INSTRUMENTATION
+except ImportError:  # imported from within models/
+    from gating import dead_air_windows
+    from instrumentation import NO_INSTRUMENTATION
+
 # from musicspeech_class import MusicSpeechClass
 
 
 class MusicSpeechController:
 
-    def __init__(self, client: Client, params):
+    def __init__(
+        self, client: Client, params, instrumentation=None, cache=None, buffers=None
+    ):
         # self.model = MusicSpeechClass(params)
         self.params = params
         self.client = client
+        # spans and counters, see instrumentation.py; records nothing by default
+        self.instrumentation = instrumentation or NO_INSTRUMENTATION
+        # fingerprint_cache.FingerprintCache of posteriors of repeated windows
+        self.cache = cache
+        # shared_pool.BufferPool lending the (batch_size, 802, 80) mel batches
+        self.buffers = buffers
         self.output_name = None
-        if isinstance(self.client, OpenVinoClient):
+        # pooled_client.PooledClient tells the class of the clients it pools
+        client_class = getattr(self.client, "client_class", type(self.client))
+        if isinstance(client_class, type) and issubclass(client_class, OpenVinoClient):
             self.output_name = "Identity:0"
         else:
             self.output_name = "time_distributed"
@@ -170,21 +188,73 @@ class MusicSpeechController:
         audio_events.sort(key=lambda x: x[0])
         return audio_events
 
+    def _predict_batch(self, mss_batch):
+        """Posteriors of a (windows, 802, 80) batch of log-mel windows"""
+        instrumentation = self.instrumentation
+        instrumentation.count("batches")
+        instrumentation.count("bytes_sent", mss_batch.nbytes)
+        with instrumentation.span("inference"):
+            return self.client.predict(mss_batch, timeout=20000)[self.output_name]
+
+    @contextlib.contextmanager
+    def _batch_buffer(self):
+        """A (batch_size, 802, 80) buffer for the mel batches of one signal"""
+        if self.buffers is None:
+            yield np.zeros((self.params.batch_size, 802, 80), dtype=np.float32)
+        else:
+            with self.buffers.batch() as buffer:
+                yield buffer
+
+    def _predict_cached(self, mss_batch):
+        """_predict_batch, reusing the cached posteriors of repeated windows"""
+        cache = self.cache
+        if cache is None:
+            return self._predict_batch(mss_batch)
+
+        instrumentation = self.instrumentation
+        with instrumentation.span("cache"):
+            keys = [cache.key(mel) for mel in mss_batch]
+            prediction = np.empty((len(mss_batch), 802, 2), dtype=np.float32)
+            missing = {}  # key: windows of the batch, repeats inferred once
+            for j, key in enumerate(keys):
+                posteriors = cache.get(key) if key not in missing else None
+                if posteriors is None:
+                    missing.setdefault(key, []).append(j)
+                else:
+                    prediction[j] = posteriors
+        instrumentation.count("cache_hits", len(keys) - len(missing))
+        instrumentation.count("cache_misses", len(missing))
+
+        if missing:
+            first = [windows[0] for windows in missing.values()]
+            computed = self._predict_batch(mss_batch[first])
+            for (key, windows), posteriors in zip(missing.items(), computed):
+                prediction[windows] = posteriors
+                cache.put(key, posteriors)
+        return prediction
+
     def mk_preds_fa(
         self, in_signal, hop_size=6.0, discard=1.0, win_length=8.0, sampling_rate=22050
     ):
         """
         Make predictions for full audio.
         """
+        return self.overall_preds(self.window_preds(in_signal, sampling_rate))
+
+    def window_preds(self, in_signal, sampling_rate=22050):
+        """
+        Thresholded predictions (n_windows, 802, 2) of the 8 s windows of
+        in_signal, every 6 s (602 frames).
+        """
         # Pad the input signal if it is shorter than 8 s.
 
+        n_samples = in_signal.shape[0]
         if in_signal.shape[0] < int(8.0 * sampling_rate):
             pad_signal = np.zeros((int(8.0 * sampling_rate)))
             pad_signal[: in_signal.shape[0]] = in_signal
             in_signal = np.copy(pad_signal)
 
         audio_clip_length_samples = in_signal.shape[0]
-        print("audio_clip_length_samples is {}".format(audio_clip_length_samples))
 
         hop_size_samples = 220 * 602 - 1
         win_length_samples = 220 * 802 - 1
@@ -201,97 +271,101 @@ class MusicSpeechController:
         in_signal_pad[0:audio_clip_length_samples] = in_signal
         preds = np.zeros((n_preds, 802, 2))
 
+        instrumentation = self.instrumentation
+        if instrumentation.enabled:
+            # windows reaching past the end of the (unpadded) signal
+            complete = (n_samples - win_length_samples) // hop_size_samples + 1
+            instrumentation.count("windows", n_preds)
+            instrumentation.count("padded_windows", n_preds - max(complete, 0))
+
+        # windows of dead air stay at 0 (neither class) without inference
+        windows = np.arange(n_preds)
+        if self.params.silence_gating:
+            with instrumentation.span("gating"):
+                dead = dead_air_windows(
+                    in_signal_pad,
+                    n_preds,
+                    hop_size_samples,
+                    win_length_samples,
+                    self.params,
+                )
+            windows = windows[~dead]
+            instrumentation.count("skipped_windows", n_preds - len(windows))
+
         # Split the predictions into batches of size batch_size.
         batch_size = self.params.batch_size
-        n_batch = n_preds // self.params.batch_size
-
-        for i in range(n_batch):
-            mss_batch = np.zeros((batch_size, 802, 80), dtype=np.float32)
-            for j in range(batch_size):
-                seg = in_signal_pad[
-                    (i * batch_size + j)
-                    * hop_size_samples : ((i * batch_size + j) * hop_size_samples)
-                    + win_length_samples
-                ]
-                seg = librosa.util.normalize(seg)
-                mss = self.get_log_melspectrogram(seg)
-                M = mss.T
-                mss_batch[j, :, :] = M
-
-            print(mss_batch.shape)
-
-            prediction = self.client.predict(mss_batch, timeout=20000)[self.output_name]
-            preds[i * batch_size : (i + 1) * batch_size, :, :] = (
-                prediction >= self.threshold
-            ).astype(float)
-
-            # prediction = self.client.predict([mss_batch], timeout=20000)[self.output_name]
-            # preds[i * batch_size : (i + 1) * batch_size, :, :] = (
-            #     prediction >= threshold
-            # ).astype(float)
-
-        if n_batch * batch_size < n_preds:
-            i = n_batch
-            mss_batch = np.zeros(
-                (n_preds - n_batch * batch_size, 802, 80), dtype=np.float32
-            )
-            for j in range(n_preds - n_batch * batch_size):
-                seg = in_signal_pad[
-                    (i * batch_size + j)
-                    * hop_size_samples : ((i * batch_size + j) * hop_size_samples)
-                    + win_length_samples
-                ]
-                seg = librosa.util.normalize(seg)
-                mss = self.get_log_melspectrogram(seg)
-                M = mss.T
-                mss_batch[j, :, :] = M
-            # preds[i * batch_size:n_preds, :, :] = (self.model.predict(mss_batch) >= (0.5, 0.5)).astype(float)
-
-            prediction = self.client.predict(mss_batch, timeout=20000)[self.output_name]
-            preds[i * batch_size : (i + 1) * batch_size, :, :] = (
-                prediction >= self.threshold
-            ).astype(float)
-
-        preds_mid = np.copy(preds[1:-1, 100:702, :])
-
-        preds_mid_2 = preds_mid.reshape(-1, 2)
-
-        if preds.shape[0] > 1:
-            oa_preds = preds[0, 0:702, :]  # oa stands for overall predictions
-        else:
-            oa_preds = preds[0, 0:802, :]  # oa stands for overall predictions
-
-        oa_preds = np.concatenate((oa_preds, preds_mid_2), axis=0)
 
-        if preds.shape[0] > 1:
-            oa_preds = np.concatenate((oa_preds, preds[-1, 100:, :]), axis=0)
-
-        return oa_preds
-
-    def predict(self, input_data, fs=None):
-
-        if isinstance(input_data, str):
-            input_data, fs = librosa.load(
-                input_data, mono=True, sr=self.params.sample_rate
-            )
-
-        if fs != self.params.sample_rate:
-            input_data = librosa.resample(
-                input_data, orig_sr=fs, target_sr=self.params.sample_rate
-            )
-
-        oop = self.mk_preds_fa(input_data)
+        with self._batch_buffer() as buffer:
+            for first in range(0, len(windows), batch_size):
+                batch = windows[first : first + batch_size]
+                mss_batch = buffer[: len(batch)]  # every row is overwritten
+                for j, k in enumerate(batch):
+                    seg = in_signal_pad[
+                        k * hop_size_samples : k * hop_size_samples + win_length_samples
+                    ]
+                    seg = librosa.util.normalize(seg)
+                    with instrumentation.span("feature"):
+                        mss = self.get_log_melspectrogram(seg)
+                    M = mss.T
+                    mss_batch[j, :, :] = M
+
+                prediction = self._predict_cached(mss_batch)
+                preds[batch, :, :] = (prediction >= self.threshold).astype(float)
+
+        return preds
+
+    @staticmethod
+    def overall_preds(preds, first=True, last=True):
+        """
+        Frames of the window predictions in the overall predictions.
 
+        Consecutive windows overlap by 200 frames: each contributes its
+        middle frames 100:702, the first window from frame 0 and the last
+        one up to its end. A shard of the windows of a longer signal is
+        not `first` / `last` when windows precede / follow it.
+        """
+        n = preds.shape[0]
+        parts = []
+        for k in range(n):
+            start = 0 if first and k == 0 else 100
+            stop = None if last and k == n - 1 else 702
+            parts.append(preds[k, start:stop, :])
+        return np.concatenate(parts, axis=0)  # oa stands for overall predictions
+
+    def postprocess(self, oa_preds, audio_clip_length):
+        """Speech and music events (start, end, label) of overall predictions"""
         p_smooth = self.smooth_output(
-            oop.T,
+            oa_preds.T,
             min_speech=1.3,
             min_music=3.4,
             max_silence_speech=0.4,
             max_silence_music=0.6,
         )
         p_smooth = p_smooth.T
-        see = self.preds_to_se(
-            p_smooth, audio_clip_length=input_data.size / self.params.sample_rate
-        )
+        return self.preds_to_se(p_smooth, audio_clip_length=audio_clip_length)
+
+    def predict(self, input_data, fs=None):
+        instrumentation = self.instrumentation
+
+        with instrumentation.span("predict"):
+            if isinstance(input_data, str):
+                # decoded at its own rate, so that decode and resample are
+                # timed apart (librosa.load(sr=...) resamples the same way)
+                with instrumentation.span("decode"):
+                    input_data, fs = librosa.load(input_data, mono=True, sr=None)
+
+            if fs != self.params.sample_rate:
+                with instrumentation.span("resample"):
+                    input_data = librosa.resample(
+                        input_data, orig_sr=fs, target_sr=self.params.sample_rate
+                    )
+
+            oop = self.mk_preds_fa(input_data)
+
+            with instrumentation.span("postprocess"):
+                see = self.postprocess(oop, input_data.size / self.params.sample_rate)
 
+        audio_seconds = input_data.size / self.params.sample_rate
+        instrumentation.count("audio_seconds", audio_seconds)
+        instrumentation.publish()
         return see
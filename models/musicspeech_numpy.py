@@ -0,0 +1,293 @@
+"""CRNN of MusicSpeechClass in NumPy, without TensorFlow
+
+Reads the Keras weights of `params.model_weights_file` (HDF5, needs h5py)
+and runs the network of MusicSpeechClass.build_model for inference:
+
+    Conv2D(16, 7) BN relu MaxPool(1, 2)
+    Conv2D(64, 7) BN relu MaxPool(1, 2)
+    BiGRU(80) BN
+    BiGRU(80) BN
+    Dense(2) sigmoid
+
+Dropout is the identity at inference, and every BatchNormalization (moving
+statistics) is an affine map folded into a neighbour: into the kernel and
+bias of the convolution before it, and into the input kernel of the GRU
+or Dense layer after it. A convolution is one matmul per kernel row over
+im2col patches. The GRU input projections of every frame are one matmul;
+only the recurrence steps through time, for every window of the batch and
+both directions at once, compiled by numba with `use_numba`.
+
+GRUs are those of TF 2 Keras (reset_after, sigmoid recurrent activation).
+benchmarks/check_numpy_engine.py validates the posteriors against
+MusicSpeechClass.
+"""
+
+import numpy as np
+from hermes.abstract.client import Client
+from scipy.special import expit
+
+BN_EPSILON = 1e-3  # keras.layers.BatchNormalization default
+
+
+def load_weights(path):
+    """Weights of every layer with weights of a Keras 2 HDF5 file
+
+    A list with the arrays of each layer, in the order Keras load_weights
+    assigns them (the order of the layers in the model).
+    """
+    import h5py  # only needed to read the weights
+
+    def text(name):
+        return name.decode() if isinstance(name, bytes) else name
+
+    with h5py.File(path, "r") as f:
+        group = f["model_weights"] if "model_weights" in f else f
+        layers = []
+        for layer in group.attrs["layer_names"]:
+            names = group[text(layer)].attrs.get("weight_names", [])
+            if len(names):
+                layers.append(
+                    [np.asarray(group[text(layer)][text(n)]) for n in names]
+                )
+    return layers
+
+
+def _batch_norm(gamma, beta, mean, variance):
+    """(scale, shift) of a BatchNormalization at inference"""
+    scale = gamma / np.sqrt(variance + BN_EPSILON)
+    return scale, beta - mean * scale
+
+
+class _GRU:
+    """One direction of a GRU, its input optionally behind an affine map"""
+
+    ARRAYS = ("kernel", "input_bias", "recurrent_kernel", "recurrent_bias")
+
+    def __init__(self, kernel, recurrent_kernel, bias, scale=None, shift=None):
+        if bias.ndim != 2:
+            raise ValueError("only GRUs with reset_after=True are supported")
+        input_bias, self.recurrent_bias = bias
+        if scale is not None:
+            # (x * scale + shift) @ kernel + bias
+            input_bias = input_bias + shift @ kernel
+            kernel = scale[:, None] * kernel
+        self.kernel = kernel
+        self.input_bias = input_bias
+        self.recurrent_kernel = recurrent_kernel
+
+    @classmethod
+    def from_arrays(cls, kernel, input_bias, recurrent_kernel, recurrent_bias):
+        gru = cls.__new__(cls)
+        gru.kernel = kernel
+        gru.input_bias = input_bias
+        gru.recurrent_kernel = recurrent_kernel
+        gru.recurrent_bias = recurrent_bias
+        return gru
+
+
+def _gru_scan(projections, recurrent_kernel, recurrent_bias):
+    """States of the GRU recurrence over the input projections
+
+    projections: (directions, windows, frames, 3 * units), the inputs
+    through the kernel and input bias, gates z, r, h.
+    """
+    directions, windows, frames, gates = projections.shape
+    units = gates // 3
+    state = np.zeros((directions, windows, units), dtype=np.float32)
+    states = np.empty((directions, windows, frames, units), dtype=np.float32)
+    for t in range(frames):
+        x = projections[:, :, t]
+        h = np.matmul(state, recurrent_kernel) + recurrent_bias[:, None, :]
+        z = expit(x[..., :units] + h[..., :units])
+        r = expit(x[..., units : 2 * units] + h[..., units : 2 * units])
+        candidate = np.tanh(x[..., 2 * units :] + r * h[..., 2 * units :])
+        state = z * state + (1.0 - z) * candidate
+        states[:, :, t] = state
+    return states
+
+
+_numba_scan = None
+
+
+def _compiled_gru_scan():
+    """_gru_scan compiled by numba (imported and compiled on first use)"""
+    global _numba_scan
+    if _numba_scan is not None:
+        return _numba_scan
+
+    import numba
+
+    @numba.njit(cache=True)
+    def scan(projections, recurrent_kernel, recurrent_bias):
+        directions, windows, frames, gates = projections.shape
+        units = gates // 3
+        states = np.empty((directions, windows, frames, units), dtype=np.float32)
+        for d in range(directions):
+            state = np.zeros((windows, units), dtype=np.float32)
+            for t in range(frames):
+                h = np.dot(state, recurrent_kernel[d]) + recurrent_bias[d]
+                for w in range(windows):
+                    x = projections[d, w, t]
+                    for u in range(units):
+                        z = 1.0 / (1.0 + np.exp(-(x[u] + h[w, u])))
+                        r = 1.0 / (1.0 + np.exp(-(x[units + u] + h[w, units + u])))
+                        candidate = np.tanh(
+                            x[2 * units + u] + r * h[w, 2 * units + u]
+                        )
+                        state[w, u] = z * state[w, u] + (1.0 - z) * candidate
+                states[d, :, t] = state
+        return states
+
+    _numba_scan = scan
+    return scan
+
+
+class NumpyCRNN:
+    """Inference of the CRNN from the layer weights of load_weights
+
+    parameters:
+    layers: list of lists of arrays
+    use_numba: bool
+            compile the GRU recurrence with numba; pays off for small
+            batches, where the per-frame overhead of NumPy dominates
+    chunk: int
+            windows per pass of the convolutions, bounds the im2col memory
+            (~15 MB per window)
+    """
+
+    def __init__(self, layers, use_numba=False, chunk=4):
+        self.scan = _compiled_gru_scan() if use_numba else _gru_scan
+        self.chunk = chunk
+        if layers is None:  # from_state
+            return
+
+        if len(layers) != 9:
+            raise ValueError(
+                "expected the 9 layers with weights of MusicSpeechClass, "
+                "got {}".format(len(layers))
+            )
+        layers = [[np.asarray(w, dtype=np.float32) for w in ws] for ws in layers]
+        conv1, bn1, conv2, bn2, gru1, bn3, gru2, bn4, dense = layers
+
+        self.convs = [self._fold_conv(*conv1, *bn1), self._fold_conv(*conv2, *bn2)]
+
+        scale, shift = _batch_norm(*bn3)
+        self.grus = [
+            (_GRU(*gru1[:3]), _GRU(*gru1[3:])),
+            (_GRU(*gru2[:3], scale, shift), _GRU(*gru2[3:], scale, shift)),
+        ]
+
+        scale, shift = _batch_norm(*bn4)
+        kernel, bias = dense
+        self.dense_kernel = scale[:, None] * kernel
+        self.dense_bias = bias + shift @ kernel
+
+    def state(self):
+        """The folded weights, a flat dict of arrays"""
+        state = {"dense_kernel": self.dense_kernel, "dense_bias": self.dense_bias}
+        for k, (rows, bias) in enumerate(self.convs):
+            state["conv{}_rows".format(k)] = rows
+            state["conv{}_bias".format(k)] = bias
+        for k, directions in enumerate(self.grus):
+            for direction, gru in zip(("forward", "backward"), directions):
+                for name in gru.ARRAYS:
+                    state["gru{}_{}_{}".format(k, direction, name)] = getattr(
+                        gru, name
+                    )
+        return state
+
+    @classmethod
+    def from_state(cls, state, use_numba=False, chunk=4):
+        """Engine over the arrays of state(), used as they are (no copies)"""
+        model = cls(None, use_numba, chunk)
+        model.convs = [
+            (state["conv{}_rows".format(k)], state["conv{}_bias".format(k)])
+            for k in range(2)
+        ]
+        model.grus = [
+            tuple(
+                _GRU.from_arrays(
+                    *(state["gru{}_{}_{}".format(k, d, n)] for n in _GRU.ARRAYS)
+                )
+                for d in ("forward", "backward")
+            )
+            for k in range(2)
+        ]
+        model.dense_kernel = state["dense_kernel"]
+        model.dense_bias = state["dense_bias"]
+        return model
+
+    @staticmethod
+    def _fold_conv(kernel, bias, *bn):
+        """Kernel rows (k, k * channels, filters) and bias, BN folded in"""
+        scale, shift = _batch_norm(*bn)
+        size, _, channels, filters = kernel.shape
+        kernel = kernel * scale
+        # row dy matches the (channels, dx) columns of the im2col patches
+        rows = kernel.transpose(0, 2, 1, 3).reshape(size, channels * size, filters)
+        return np.ascontiguousarray(rows), bias * scale + shift
+
+    @staticmethod
+    def _conv_relu_pool(x, rows, bias):
+        """'same' convolution, relu and (1, 2) max pooling of (n, H, W, C)"""
+        size = rows.shape[0]
+        pad = size // 2
+        n, height, width, channels = x.shape
+        padded = np.pad(x, ((0, 0), (pad, pad), (pad, pad), (0, 0)))
+        # (n, H + 2 pad, W, C, size): the columns each output position sees
+        patches = np.lib.stride_tricks.sliding_window_view(padded, size, axis=2)
+
+        out = np.empty((n * height * width, rows.shape[2]), dtype=np.float32)
+        out[:] = bias
+        for dy in range(size):
+            row = patches[:, dy : dy + height].reshape(-1, channels * size)
+            out += row @ rows[dy]
+
+        out = out.reshape(n, height, width // 2, 2, -1).max(axis=3)
+        return np.maximum(out, 0.0, out=out)
+
+    def _bigru(self, x, forward, backward):
+        """(windows, frames, 2 * units) of a Bidirectional GRU, merged by concat"""
+        projections = np.stack(
+            [
+                x @ forward.kernel + forward.input_bias,
+                x[:, ::-1] @ backward.kernel + backward.input_bias,
+            ]
+        )
+        states = self.scan(
+            projections,
+            np.stack([forward.recurrent_kernel, backward.recurrent_kernel]),
+            np.stack([forward.recurrent_bias, backward.recurrent_bias]),
+        )
+        return np.concatenate([states[0], states[1, :, ::-1]], axis=-1)
+
+    def __call__(self, mel):
+        """Posteriors (windows, frames, 2) of log-mel windows (windows, frames, 80)"""
+        mel = np.asarray(mel, dtype=np.float32)
+        windows, frames, _ = mel.shape
+
+        features = []
+        for first in range(0, windows, self.chunk):
+            x = mel[first : first + self.chunk, :, :, None]
+            for rows, bias in self.convs:
+                x = self._conv_relu_pool(x, rows, bias)
+            features.append(x.reshape(len(x), frames, -1))
+        x = np.concatenate(features)
+
+        for forward, backward in self.grus:
+            x = self._bigru(x, forward, backward)
+
+        return expit(x @ self.dense_kernel + self.dense_bias)
+
+
+class MusicSpeechNumpy(Client):
+    """MusicSpeechClass without TensorFlow: {"time_distributed": posteriors}"""
+
+    def __init__(self, params, use_numba=False, model=None):
+        if model is None:
+            model = NumpyCRNN(load_weights(params.model_weights_file), use_numba)
+        self.model = model
+        self.params = params
+
+    def predict(self, *inputs, timeout=None):
+        return {"time_distributed": self.model(inputs[0])}
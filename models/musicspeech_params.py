@@ -19,4 +19,10 @@ class MusicSpeech_Params:
     model_weights_file: str = 'model d-DS.h5'
     threshold = [0.5, 0.5]
     
-    batch_size: int = 32
\ No newline at end of file
+    batch_size: int = 32
+    
+    # silence gating: windows of dead air skip inference (see gating.py)
+    silence_gating: bool = False
+    silence_floor_db: float = -60.0
+    noise_floor_db: float = -45.0
+    noise_flatness: float = 0.5
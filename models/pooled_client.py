@@ -0,0 +1,250 @@
+"""One hermes Client over several model server replicas
+
+`PooledClient` keeps a small pool of clients (connections) per endpoint
+and sends every predict to the available endpoint with the fewest
+requests in flight. Each endpoint has a circuit breaker:
+
+    closed      requests flow; `failure_threshold` consecutive failures
+                open it
+    open        no requests for `reset_timeout` seconds, then half open
+    half open   one trial request: success closes it, failure opens it
+                again
+
+A failed request is retried on the next endpoint (failover), up to
+`max_attempts` endpoints. An optional `health_check(connection) -> bool`
+runs every `health_interval` seconds in a daemon thread: a failing check
+opens the endpoint's circuit, a passing one half opens an open circuit
+early.
+"""
+
+import threading
+import time
+from queue import Empty, LifoQueue
+
+from hermes.abstract.client import Client
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half open"
+
+
+class NoEndpointAvailable(RuntimeError):
+    """Every endpoint is open or already failed for this request"""
+
+
+class Endpoint:
+    """Clients and breaker state of one connection"""
+
+    def __init__(self, connection, factory, max_clients):
+        self.connection = connection
+        self.factory = factory
+        self.max_clients = max_clients
+
+        self._idle = LifoQueue()
+        self.clients = 0
+        self.outstanding = 0
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+        self.counters = {"requests": 0, "failures": 0}
+
+    @property
+    def name(self):
+        c = self.connection
+        return "{}:{}".format(c["ip"], c.get("grpc_port") or c.get("rest_port"))
+
+    def acquire(self):
+        """An idle client, or None"""
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            return None
+
+    def release(self, client):
+        self._idle.put(client)
+
+
+class PooledClient(Client):
+    """Client over `connections`, see module docstring
+
+    parameters:
+    client_class: callable
+            client_class(model, connection) -> Client, e.g. TritonClient or
+            OpenVinoClient
+    model: str
+    connections: list of hermes Connection
+    max_clients: int
+            clients (connections) per endpoint, for concurrent predicts
+    failure_threshold: int
+    reset_timeout: float
+            seconds an open circuit rejects requests
+    max_attempts: int, optional
+            endpoints tried per request, defaults to all of them
+    health_check: callable, optional
+            health_check(connection) -> bool
+    health_interval: float
+    """
+
+    def __init__(
+        self,
+        client_class,
+        model,
+        connections,
+        max_clients=4,
+        failure_threshold=3,
+        reset_timeout=10.0,
+        max_attempts=None,
+        health_check=None,
+        health_interval=5.0,
+    ):
+        if not connections:
+            raise ValueError("no connections")
+
+        self.client_class = client_class
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_attempts = max_attempts or len(connections)
+
+        def factory(connection):
+            return client_class(model, connection)
+
+        self.endpoints = [Endpoint(c, factory, max_clients) for c in connections]
+        self._lock = threading.Condition()
+        self._next = 0  # round robin among equally loaded endpoints
+
+        self._health_check = health_check
+        self._stop = threading.Event()
+        self._health_thread = None
+        if health_check is not None:
+            self._health_thread = threading.Thread(
+                target=self._check_health, args=(health_interval,), daemon=True
+            )
+            self._health_thread.start()
+
+    def _available(self, endpoint, now):
+        if endpoint.state == OPEN and now - endpoint.opened_at >= self.reset_timeout:
+            endpoint.state = HALF_OPEN
+            endpoint.trial = False
+        if endpoint.state == CLOSED:
+            return True
+        return endpoint.state == HALF_OPEN and not endpoint.trial
+
+    def _choose(self, tried):
+        """Least loaded available endpoint not in `tried` (under the lock)"""
+        now = time.monotonic()
+        count = len(self.endpoints)
+        best = None
+        for k in range(count):
+            endpoint = self.endpoints[(self._next + k) % count]
+            if endpoint in tried or not self._available(endpoint, now):
+                continue
+            if best is None or endpoint.outstanding < best.outstanding:
+                best = endpoint
+        if best is not None:
+            self._next = (self.endpoints.index(best) + 1) % count
+            if best.state == HALF_OPEN:
+                best.trial = True
+        return best
+
+    def _client(self, endpoint):
+        """A client of `endpoint`, created or waited for (under the lock)"""
+        while True:
+            client = endpoint.acquire()
+            if client is not None:
+                return client
+            if endpoint.clients < endpoint.max_clients:
+                endpoint.clients += 1
+                return None  # created outside the lock
+            self._lock.wait()
+
+    def _record(self, endpoint, ok):
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.counters["requests"] += 1
+            if ok:
+                endpoint.state = CLOSED
+                endpoint.failures = 0
+            else:
+                endpoint.counters["failures"] += 1
+                endpoint.failures += 1
+                if (
+                    endpoint.state == HALF_OPEN
+                    or endpoint.failures >= self.failure_threshold
+                ):
+                    endpoint.state = OPEN
+                    endpoint.opened_at = time.monotonic()
+            endpoint.trial = False
+            self._lock.notify_all()
+
+    def _discard(self, endpoint):
+        """Forget a client whose connection may be broken"""
+        with self._lock:
+            endpoint.clients -= 1
+            self._lock.notify_all()
+
+    def predict(self, *inputs, timeout=None):
+        tried = []
+        error = None
+
+        while len(tried) < self.max_attempts:
+            with self._lock:
+                endpoint = self._choose(tried)
+                if endpoint is None:
+                    break
+                endpoint.outstanding += 1
+                client = self._client(endpoint)
+            tried.append(endpoint)
+
+            try:
+                if client is None:
+                    client = endpoint.factory(endpoint.connection)
+                result = client.predict(*inputs, timeout=timeout)
+            except Exception as e:
+                error = e
+                self._discard(endpoint)
+                self._record(endpoint, ok=False)
+                continue
+
+            endpoint.release(client)
+            self._record(endpoint, ok=True)
+            return result
+
+        raise NoEndpointAvailable(
+            "no endpoint answered ({})".format(
+                ", ".join(e.name for e in tried) or "all circuits open"
+            )
+        ) from error
+
+    def _check_health(self, interval):
+        while not self._stop.wait(interval):
+            for endpoint in self.endpoints:
+                try:
+                    healthy = bool(self._health_check(endpoint.connection))
+                except Exception:
+                    healthy = False
+                with self._lock:
+                    if not healthy and endpoint.state != OPEN:
+                        endpoint.state = OPEN
+                        endpoint.opened_at = time.monotonic()
+                    elif healthy and endpoint.state == OPEN:
+                        endpoint.state = HALF_OPEN
+                        endpoint.trial = False
+
+    def status(self):
+        """State, load and counters of every endpoint"""
+        with self._lock:
+            return [
+                {
+                    "endpoint": e.name,
+                    "state": e.state,
+                    "outstanding": e.outstanding,
+                    "clients": e.clients,
+                    **e.counters,
+                }
+                for e in self.endpoints
+            ]
+
+    def close(self):
+        self._stop.set()
+        if self._health_thread is not None:
+            self._health_thread.join()
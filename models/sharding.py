@@ -0,0 +1,158 @@
+"""Split-and-merge processing of one long recording on several workers
+
+The windows of mk_preds_fa are independent of each other: window k is the
+8 s of the (zero padded) signal from sample k * hop, peak normalized on its
+own. `plan_shards` splits the windows of a recording into runs of
+consecutive windows, i.e. on the 602-frame hop grid. A shard carries the
+samples its windows read: its hops plus the 2 s (200 frames) its last
+window reaches into the next shard, the margin the 100:702 crop of
+overall_preds discards. A worker thus computes exactly the window
+predictions of a single pass, and returns its part of the overall
+predictions.
+
+The parts are concatenated in order and post-processed as a whole: the
+smoothing of smooth_output is a scan over every frame, so running it after
+the merge makes the events across seams those of
+MusicSpeechController.predict, bit for bit.
+
+Shards run on a local process pool; a job is a plain (Shard, samples)
+pair, so another executor (nodes) can run `process_shard` later.
+"""
+
+import math
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import librosa
+import numpy as np
+
+try:
+    from .detection_service import load_client
+    from .musicspeech_controller import MusicSpeechController
+    from .musicspeech_params import MusicSpeech_Params
+except ImportError:  # imported from within models/
+    from detection_service import load_client
+    from musicspeech_controller import MusicSpeechController
+    from musicspeech_params import MusicSpeech_Params
+
+# window geometry of mk_preds_fa, in samples at 22050 Hz
+HOP_SAMPLES = 220 * 602 - 1
+WIN_SAMPLES = 220 * 802 - 1
+MIN_SAMPLES = int(8.0 * 22050)  # shorter signals are padded to 8 s
+
+# windows: range of window indices; start, stop: samples of the signal;
+# first, last: whether the shard starts / ends the recording
+Shard = namedtuple("Shard", "windows start stop first last")
+
+
+def count_windows(n_samples):
+    """Windows mk_preds_fa predicts for a signal of `n_samples`"""
+    n_samples = max(n_samples, MIN_SAMPLES)
+    return int(math.ceil((n_samples - WIN_SAMPLES) / HOP_SAMPLES)) + 1
+
+
+def plan_shards(n_samples, shard_windows):
+    """Shards of at most `shard_windows` consecutive windows"""
+    n_windows = count_windows(n_samples)
+    shards = []
+    for first in range(0, n_windows, shard_windows):
+        last = min(first + shard_windows, n_windows)
+        shards.append(
+            Shard(
+                windows=range(first, last),
+                start=first * HOP_SAMPLES,
+                stop=min((last - 1) * HOP_SAMPLES + WIN_SAMPLES, n_samples),
+                first=first == 0,
+                last=last == n_windows,
+            )
+        )
+    return shards
+
+
+def process_shard(controller, shard, samples):
+    """Overall predictions of the windows of `shard` (samples[start:stop])"""
+    preds = controller.window_preds(samples)
+    if preds.shape[0] != len(shard.windows):
+        raise ValueError(
+            "shard of windows {} gave {} windows".format(shard.windows, len(preds))
+        )
+    return controller.overall_preds(preds, first=shard.first, last=shard.last)
+
+
+# controller of each worker process, set once by the pool initializer
+_worker = {}
+
+
+def _init_worker(client_spec, params):
+    _worker["controller"] = MusicSpeechController(
+        load_client(client_spec, params), params
+    )
+
+
+def _process(job):
+    return process_shard(_worker["controller"], *job)
+
+
+class ShardedDetector:
+    """MusicSpeechController.predict of one recording over a process pool
+
+    parameters:
+    client_spec: str
+            "module:Class" of the inference client, built in every worker
+    params: MusicSpeech_Params, optional
+    workers: int, optional
+            worker processes, defaults to os.cpu_count()
+    shard_windows: int
+            windows (6 s each) per shard; smaller shards balance the load
+            better, larger ones send fewer margins
+    """
+
+    def __init__(self, client_spec, params=None, workers=None, shard_windows=150):
+        self.params = params or MusicSpeech_Params()
+        self.workers = workers or os.cpu_count()
+        self.shard_windows = shard_windows
+        # post-processing only, inference runs in the workers
+        self._controller = MusicSpeechController(None, self.params)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(client_spec, self.params),
+        )
+
+    def overall_preds(self, signal):
+        """mk_preds_fa of `signal`, merged from its shards"""
+        parts = []
+        pending = deque()
+        # at most two shards per worker in flight, so that a long recording
+        # is not copied to the pool all at once
+        for shard in plan_shards(len(signal), self.shard_windows):
+            if len(pending) >= 2 * self.workers:
+                parts.append(pending.popleft().result())
+            job = (shard, signal[shard.start : shard.stop])
+            pending.append(self._executor.submit(_process, job))
+        parts.extend(future.result() for future in pending)
+        return np.concatenate(parts, axis=0)
+
+    def predict(self, input_data, fs=None):
+        """Events of a file or a signal, as MusicSpeechController.predict"""
+        if isinstance(input_data, str):
+            input_data, fs = librosa.load(input_data, mono=True, sr=None)
+        if fs != self.params.sample_rate:
+            input_data = librosa.resample(
+                input_data, orig_sr=fs, target_sr=self.params.sample_rate
+            )
+
+        oa_preds = self.overall_preds(input_data)
+        return self._controller.postprocess(
+            oa_preds, input_data.size / self.params.sample_rate
+        )
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
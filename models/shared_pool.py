@@ -0,0 +1,255 @@
+"""Worker pool sharing the model weights and batch buffers in shared memory
+
+In a plain pool every worker loads its own copy of the model weights and
+allocates its own mel batches, so memory grows by a model per worker.
+`SharedPool` loads the weights once in the parent, folds them
+(musicspeech_numpy.NumpyCRNN) and copies them into one
+multiprocessing.shared_memory block; every worker runs its engine on
+read-only, zero-copy views of that block. The (batch_size, 802, 80) mel
+batches of mk_preds_fa come from a second block of `slots` buffers, which
+a BufferPool lends to a controller for one signal and takes back after.
+
+benchmarks/bench_shared_pool.py measures the memory every added worker
+costs, with and without sharing.
+"""
+
+import contextlib
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import librosa
+import numpy as np
+
+try:
+    from .musicspeech_controller import MusicSpeechController
+    from .musicspeech_numpy import MusicSpeechNumpy, NumpyCRNN, load_weights
+    from .musicspeech_params import MusicSpeech_Params
+except ImportError:  # imported from within models/
+    from musicspeech_controller import MusicSpeechController
+    from musicspeech_numpy import MusicSpeechNumpy, NumpyCRNN, load_weights
+    from musicspeech_params import MusicSpeech_Params
+
+ALIGNMENT = 64
+
+
+class SharedArrays:
+    """Named arrays in one shared memory block
+
+    create() makes the block and owns it; attach(spec) maps it in another
+    process, read-only unless `writeable`. `spec` is picklable.
+    """
+
+    def __init__(self, block, layout, owner):
+        self._block = block
+        self.owner = owner
+        self.spec = (block.name, layout)
+        self.arrays = {
+            name: np.ndarray(shape, dtype, buffer=block.buf, offset=offset)
+            for name, (offset, shape, dtype) in layout.items()
+        }
+
+    @classmethod
+    def allocate(cls, shapes):
+        """New zeroed block of arrays {name: (shape, dtype)}"""
+        layout, size = {}, 0
+        for name, (shape, dtype) in shapes.items():
+            dtype = np.dtype(dtype)
+            size = -(-size // ALIGNMENT) * ALIGNMENT
+            layout[name] = (size, tuple(shape), dtype.str)
+            size += int(np.prod(shape)) * dtype.itemsize
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        return cls(block, layout, owner=True)
+
+    @classmethod
+    def create(cls, arrays):
+        """New block holding copies of `arrays` {name: array}"""
+        arrays = {name: np.asarray(a) for name, a in arrays.items()}
+        shared = cls.allocate({name: (a.shape, a.dtype) for name, a in arrays.items()})
+        for name, a in arrays.items():
+            shared.arrays[name][...] = a
+        return shared
+
+    @classmethod
+    def attach(cls, spec, writeable=False):
+        name, layout = spec
+        shared = cls(shared_memory.SharedMemory(name=name), layout, owner=False)
+        for a in shared.arrays.values():
+            a.flags.writeable = writeable
+        return shared
+
+    @property
+    def nbytes(self):
+        return self._block.size
+
+    def close(self):
+        """Unmap the block (no views may be left), and free it if owned"""
+        self.arrays = {}
+        self._block.close()
+        if self.owner:
+            self._block.unlink()
+
+
+class BufferPool:
+    """`slots` arrays of one shape in shared memory, lent one at a time
+
+    The free slots are indices in a multiprocessing queue, so that the
+    pool (attach(spec)) is shared by every worker: a borrower waits for a
+    slot when all are lent out.
+    """
+
+    def __init__(self, shared, free):
+        self._shared = shared
+        self._free = free
+        self.spec = (shared.spec, free)
+
+    @classmethod
+    def create(cls, slots, shape, dtype=np.float32):
+        shared = SharedArrays.allocate({"buffers": ((slots, *shape), dtype)})
+        free = multiprocessing.Queue()
+        for slot in range(slots):
+            free.put(slot)
+        return cls(shared, free)
+
+    @classmethod
+    def attach(cls, spec):
+        shared_spec, free = spec
+        return cls(SharedArrays.attach(shared_spec, writeable=True), free)
+
+    @contextlib.contextmanager
+    def batch(self):
+        slot = self._free.get()
+        try:
+            yield self._shared.arrays["buffers"][slot]
+        finally:
+            self._free.put(slot)
+
+    def close(self):
+        self._shared.close()
+
+
+# controller of each worker process, and the shared blocks it maps
+_worker = {}
+
+
+def _init_worker(params, weights, buffers, use_numba):
+    """`weights`: spec of the shared folded weights, or the layers to load"""
+    if isinstance(weights, tuple):
+        shared = SharedArrays.attach(weights)
+        model = NumpyCRNN.from_state(shared.arrays, use_numba)
+        _worker["weights"] = shared
+    else:
+        model = NumpyCRNN(weights, use_numba)
+    pool = BufferPool.attach(buffers) if buffers is not None else None
+
+    client = MusicSpeechNumpy(params, model=model)
+    controller = MusicSpeechController(client, params, buffers=pool)
+    silence = np.zeros(int(params.audio_clip_length * params.sample_rate))
+    controller.predict(silence, params.sample_rate)
+    _worker["controller"] = controller
+
+
+def _predict(job):
+    """Events of a job: ("path", file), ("upload", bytes), ("signal", (x, fs))"""
+    kind, data = job
+    controller = _worker["controller"]
+    if kind == "path":
+        return controller.predict(data)
+    if kind == "upload":
+        return controller.predict(*librosa.load(io.BytesIO(data), sr=None, mono=True))
+    return controller.predict(*data)
+
+
+def _pid():
+    return os.getpid()
+
+
+class SharedPool:
+    """Worker processes predicting with the NumPy engine, see module docstring
+
+    parameters:
+    params: MusicSpeech_Params, optional
+    workers: int, optional
+            worker processes, defaults to os.cpu_count()
+    shared: bool
+            share the weights and mel batches; False gives every worker
+            its own copies (for comparison)
+    slots: int, optional
+            mel batch buffers, defaults to one per worker
+    layers: list, optional
+            layer weights as load_weights returns them, instead of reading
+            params.model_weights_file
+    use_numba: bool
+    """
+
+    def __init__(
+        self,
+        params=None,
+        workers=None,
+        shared=True,
+        slots=None,
+        layers=None,
+        use_numba=False,
+    ):
+        self.params = params or MusicSpeech_Params()
+        self.workers = workers or os.cpu_count()
+        if layers is None:
+            layers = load_weights(self.params.model_weights_file)
+
+        self.weights = None
+        self.buffers = None
+        weights = layers
+        if shared:
+            self.weights = SharedArrays.create(NumpyCRNN(layers).state())
+            self.buffers = BufferPool.create(
+                slots or self.workers, (self.params.batch_size, 802, 80)
+            )
+            weights = self.weights.spec
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(
+                self.params,
+                weights,
+                self.buffers.spec if shared else None,
+                use_numba,
+            ),
+        )
+        # one job per worker, so that every process is started and warm
+        for future in [self._executor.submit(_pid) for _ in range(self.workers)]:
+            future.result()
+
+    @property
+    def shared_bytes(self):
+        """Size of the shared blocks"""
+        if self.weights is None:
+            return 0
+        return self.weights.nbytes + self.buffers._shared.nbytes
+
+    def submit(self, input_data, fs=None):
+        """Future of the events of a file, uploaded bytes or a signal"""
+        if isinstance(input_data, str):
+            job = ("path", input_data)
+        elif isinstance(input_data, bytes):
+            job = ("upload", input_data)
+        else:
+            job = ("signal", (input_data, fs))
+        return self._executor.submit(_predict, job)
+
+    def predict(self, input_data, fs=None):
+        return self.submit(input_data, fs).result()
+
+    def close(self):
+        self._executor.shutdown()
+        if self.weights is not None:
+            self.weights.close()
+            self.buffers.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,17 @@
+"""Synthesis of radio-like training examples (see data-synthesis.ipynb)"""
+
+from .engine import (
+    example_rng,
+    plan_combined_audio_examples,
+    render_manifest,
+    synthesise_combined_audio_examples,
+    synthesise_example,
+    synthesise_examples_OF,
+)
+from .features import NpyDirectoryWriter, get_log_melspectrogram
+from .index import SourceIndex, SourceReader
+from .manifest import Manifest
+from .params import Synthesis_Params
+from .render import plan_example, render_batch
+from .sources import Sources, load_sources
+from .stream import SynthesisStream
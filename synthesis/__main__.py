@@ -0,0 +1,139 @@
+"""Synthesise training examples
+
+Usage:
+    python -m synthesis --music musan/music --speech musan/speech \
+        --noise musan/noise --output "Mel Files" -n 5120 --seed 1234 \
+        --index musan/index.json --format shards
+    python -m synthesis --music musan/music --speech musan/speech \
+        --output "Mel Files" --one-file
+
+Plan once, render anywhere (part 2 of 4 of the manifest):
+    python -m synthesis --music musan/music --speech musan/speech \
+        -n 5120 --seed 1234 --plan manifest.npz
+    python -m synthesis --manifest manifest.npz --part 2/4 --output "Mel Files"
+"""
+
+import argparse
+import json
+
+from .engine import (
+    plan_combined_audio_examples,
+    render_manifest,
+    synthesise_combined_audio_examples,
+    synthesise_examples_OF,
+)
+from .features import NpyDirectoryWriter
+from .index import SourceIndex
+from .manifest import Manifest
+from .params import Synthesis_Params
+from .shards import ShardWriter
+from .sources import Sources, load_sources
+
+
+def _writer(args, params):
+    if args.format == "shards":
+        return ShardWriter(
+            args.output,
+            shard_size=args.shard_size,
+            mel_shape=(params.n_frames, params.n_mels),
+            label_shape=(params.n_frames, 2),
+        )
+    return NpyDirectoryWriter(args.output, block_size=params.block_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthesise training examples")
+    parser.add_argument("--music", help="music folder")
+    parser.add_argument("--speech", help="speech folder")
+    parser.add_argument("--noise", default=None, help="noise folder")
+    parser.add_argument("--output", help="mel directory")
+    parser.add_argument("-n", "--examples", type=int, default=5120)
+    parser.add_argument(
+        "--offset", type=int, default=0, help="first example is offset + 1"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--subset", choices=["train", "val", "all"], default="train")
+    parser.add_argument("--min-dur", type=float, default=9.1)
+    parser.add_argument("--index", default=None, help="source index file (json)")
+    parser.add_argument(
+        "--cache-mb", type=int, default=256, help="decoded sources per worker"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["npy", "shards"],
+        default="npy",
+        help="block-id-N/mel-id-N.npy files or an appendable sharded dataset",
+    )
+    parser.add_argument("--shard-size", type=int, default=4096)
+    parser.add_argument(
+        "--one-file", action="store_true", help="single-source examples (OF)"
+    )
+    parser.add_argument("--plan", default=None, help="only write the manifest (.npz)")
+    parser.add_argument("--manifest", default=None, help="render this manifest")
+    parser.add_argument(
+        "--part", default="1/1", help="render part I of K of the manifest (I/K)"
+    )
+    args = parser.parse_args()
+
+    if args.manifest is None and (args.music is None or args.speech is None):
+        parser.error("--music and --speech are required without --manifest")
+    if args.plan is None and args.output is None:
+        parser.error("--output is required")
+
+    params = Synthesis_Params(source_cache_bytes=args.cache_mb << 20)
+
+    if args.manifest is not None:
+        part, parts = (int(i) for i in args.part.split("/"))
+        manifest = Manifest.load(args.manifest).part(part - 1, parts)
+        index = SourceIndex.load(args.index) if args.index else None
+        report = render_manifest(
+            manifest,
+            _writer(args, params),
+            params,
+            sources=Sources(index=index),
+            workers=args.workers,
+        )
+        print(json.dumps(report, indent=2))
+        return
+
+    sources = load_sources(
+        args.music,
+        args.speech,
+        args.noise,
+        subset=None if args.subset == "all" else args.subset,
+        min_dur=args.min_dur,
+        sr=params.sample_rate,
+        index_path=args.index,
+        workers=args.workers,
+    )
+
+    if args.plan is not None:
+        manifest = plan_combined_audio_examples(
+            args.examples, sources, params, seed=args.seed, offset=args.offset
+        )
+        manifest.save(args.plan)
+        print(json.dumps({"examples": len(manifest), **manifest.meta}, indent=2))
+        return
+
+    writer = _writer(args, params)
+    if args.one_file:
+        report = synthesise_examples_OF(
+            writer, sources, params, offset=args.offset, workers=args.workers
+        )
+    else:
+        report = synthesise_combined_audio_examples(
+            args.examples,
+            writer,
+            sources,
+            params,
+            seed=args.seed,
+            offset=args.offset,
+            workers=args.workers,
+        )
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
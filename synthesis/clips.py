@@ -0,0 +1,286 @@
+"""Audio clip rendering (data-synthesis.ipynb)
+
+Source files are expected to be preprocessed already (22050 Hz, silences
+removed, at least 9.1 s long).
+"""
+
+import librosa
+import numpy as np
+
+from .fades import (
+    apply_cross_fade_in,
+    apply_cross_fade_out,
+    apply_mixed_fade_out,
+    apply_mixed_normal_fade_in,
+    apply_normal_fade_in,
+    apply_normal_fade_out,
+)
+from .index import SourceReader
+from .loudness import LoudnessCache, integrated_loudness
+from .transitions import (
+    create_mixed_samples_list,
+    create_mixed_transition,
+    get_mixed_segment_lengths,
+)
+
+
+# reader and loudness cache of the current process, see use_reader
+_reader = SourceReader()
+_loudness = LoudnessCache(_reader)
+
+
+def use_reader(reader: SourceReader, loudness: LoudnessCache = None):
+    """Serve the source reads (and excerpt loudness) of this process from
+    `reader`
+    """
+    global _reader, _loudness
+    _reader = reader
+    _loudness = LoudnessCache(reader) if loudness is None else loudness
+
+
+def source_length(filename):
+    """Number of samples of a source file"""
+    return _reader.length(filename)
+
+
+def read_segment(filename, start=0, stop=None):
+    """Samples [start, stop) of a source file, peak normalized"""
+    return librosa.util.normalize(_reader.read(filename, start, stop))
+
+
+def read_scaled_segment(filename, start=0, stop=None):
+    """read_segment, also returning the gain of the peak normalization"""
+    audio = _reader.read(filename, start, stop)
+    peak = np.max(np.abs(audio), axis=0)
+    if audio.ndim > 1 or peak < np.finfo(audio.dtype).tiny:
+        return librosa.util.normalize(audio), None
+
+    audio /= peak
+    return audio, 1.0 / peak
+
+
+def excerpt_loudness(filename, start, stop, audio, gain, envelope=None):
+    """Integrated loudness of `audio`, the excerpt [start, stop) of a source
+    scaled by `gain` and faded by `envelope` (see LoudnessCache)
+
+    Served from the cached source energy when possible, else measured.
+    """
+    if gain is not None:
+        loudness = _loudness.excerpt_loudness(filename, start, stop, gain, envelope)
+        if loudness is not None:
+            return loudness
+
+    return integrated_loudness(audio)
+
+
+def get_mixed_random_segments(rng, samples, segment_lengths, f_buffer=0.0, sr=22050):
+    """{"speech": (start, stop), "music": (start, stop)} in samples"""
+    f_buffer_samples = int(f_buffer * sr)
+
+    segments = {}
+    for key in ["speech", "music"]:
+        sample_length = source_length(samples[key])
+        r = int(
+            rng.integers(
+                f_buffer_samples,
+                sample_length - segment_lengths[key] - f_buffer_samples,
+            )
+        )
+        segments[key] = (r, r + segment_lengths[key])
+
+    return segments
+
+
+def get_random_segments(rng, samples_list, segment_lengths, f_buffer=1.1, sr=22050):
+    """[(segment_start, segment_end), ...] in seconds, one per source"""
+    if len(samples_list) != len(segment_lengths):
+        raise ValueError(
+            "Data mismatch --- The length of samples_list needs to be equal to "
+            "segment_lengths!!"
+        )
+
+    segments = []
+    for sample, length in zip(samples_list, segment_lengths):
+        sample_length = float(source_length(sample) / sr)
+        r = rng.uniform(f_buffer, sample_length - length - f_buffer)
+        segments.append((r, r + length))
+
+    return segments
+
+
+def get_random_loudness_gain(rng, speech_data, music_data, rate=22050):
+    """Music gain placing it 7 to 18 LU below the speech"""
+    speech_loudness = integrated_loudness(speech_data, rate)
+    music_loudness = integrated_loudness(music_data, rate)
+    random_loudness = rng.uniform(speech_loudness - 18.0, speech_loudness - 7.0)
+    delta_loudness = random_loudness - music_loudness
+
+    return np.power(10.0, delta_loudness / 20.0)
+
+
+def loudness_gain(speech_loudness, music_loudness, offset):
+    """Music gain placing it `offset` LU from the speech (offset drawn
+    beforehand, see render.plan_example)
+    """
+    delta_loudness = speech_loudness + offset - music_loudness
+
+    return np.power(10.0, delta_loudness / 20.0)
+
+
+def create_mixed_audio_clip(
+    rng, music_sounds, speech_sounds, audio_clip_length=8.0, sr=22050.0
+):
+    """Music + speech example: (synth_audio, transition)"""
+    transition = create_mixed_transition(rng, audio_clip_length=audio_clip_length)
+    samples = create_mixed_samples_list(rng, music_sounds, speech_sounds)
+    segment_lengths = get_mixed_segment_lengths(
+        transition, audio_clip_length=audio_clip_length, sr=int(sr)
+    )
+    segments = get_mixed_random_segments(rng, samples, segment_lengths, sr=int(sr))
+
+    params = transition[0]
+    kind = params["type"]
+    point = int(transition[1] * sr)
+
+    speech = read_segment(samples["speech"], *segments["speech"])
+    music = read_segment(samples["music"], *segments["music"])
+
+    if kind == "music+speech":
+        synth_audio = speech
+        m_gain = get_random_loudness_gain(rng, synth_audio, music)
+        synth_audio += m_gain * music
+
+    elif kind == "speech_to_music+speech":
+        synth_audio = speech
+        m_gain = get_random_loudness_gain(rng, synth_audio, music)
+
+        apply_mixed_normal_fade_in(music, transition, sr=sr, end_gain=m_gain)
+        f_in_length_samples = int(params["f_in_dur"] * sr)
+        music[f_in_length_samples:] *= m_gain
+
+        synth_audio[point:] += music
+
+    elif kind == "music_to_music+speech":
+        synth_audio = music
+        synth_music1 = synth_audio[0:point] * params["music_gain_1"]
+
+        apply_mixed_normal_fade_in(speech, transition, sr=sr)
+
+        m_gain = get_random_loudness_gain(rng, speech, synth_audio)
+        apply_mixed_fade_out(synth_music1, transition, sr=sr, end_gain=m_gain)
+
+        synth_music2 = synth_audio[point:] * m_gain
+
+        synth_audio[0:point] = synth_music1
+        synth_audio[point:] = speech + synth_music2
+
+    elif kind == "music+speech_to_music":
+        synth_audio = music
+
+        apply_mixed_fade_out(speech, transition, sr=sr)
+
+        m_gain = get_random_loudness_gain(rng, speech, synth_audio)
+        synth_music1 = synth_audio[0:point] * m_gain
+
+        synth_music2 = synth_audio[point:]
+        f_in_length_samples = int(params["f_in_dur"] * sr)
+        apply_mixed_normal_fade_in(
+            synth_music2,
+            transition,
+            sr=sr,
+            start_gain=m_gain,
+            end_gain=params["music_gain_2"],
+        )
+        synth_music2[f_in_length_samples:] *= params["music_gain_2"]
+
+        synth_audio[0:point] = speech + synth_music1
+
+    elif kind == "music+speech_to_speech":
+        synth_audio = speech
+        m_gain = get_random_loudness_gain(rng, synth_audio, music)
+
+        music *= m_gain
+        apply_mixed_fade_out(music, transition, sr=sr)
+
+        synth_audio[0:point] += music
+
+    return synth_audio, transition
+
+
+def create_template_audio_clip(audio_clip_length, samples_list, segments, sr):
+    """Stitch the source segments without transitions
+
+    return:
+    synth_audio: np.ndarray
+            the concatenated segments
+    synth_audio_seg_samples: list of tuple
+            (start, stop) of each segment in `synth_audio`, the reference
+            points of the fade operations
+    """
+    if len(samples_list) < 1:
+        raise ValueError("The samples_list argument is invalid!!")
+
+    synth_audio_seg_samples = []
+    parts = []
+    ac_stop = 0
+
+    for sample, (seg_start, seg_stop) in zip(samples_list, segments):
+        start = int(seg_start * sr)
+        stop = int(np.ceil(seg_stop * sr))
+        ac_start = ac_stop
+        ac_stop = ac_start + stop - start
+        synth_audio_seg_samples.append((ac_start, ac_stop))
+        parts.append(read_segment(sample, start, stop))
+
+    return np.concatenate(parts, axis=0), synth_audio_seg_samples
+
+
+def create_audio_clip(
+    rng, audio_clip_length, transitions_list, samples_list, segments, sr
+):
+    """Example without background music, transitions applied"""
+    if len(samples_list) < 1:
+        raise ValueError("The samples_list argument is invalid!!")
+
+    ss = int(audio_clip_length * sr)
+
+    if len(transitions_list) == 0:
+        # a single source, random excerpt (only the excerpt is read, the
+        # example is peak normalized afterwards anyway)
+        l_a = source_length(samples_list[0])
+        l_st = 0 if l_a == ss else int(rng.integers(0, l_a - ss))
+        return read_segment(samples_list[0], l_st, l_st + ss)
+
+    synth_audio, synth_audio_seg_samples = create_template_audio_clip(
+        audio_clip_length, samples_list, segments, sr
+    )
+
+    for i, transition in enumerate(transitions_list):
+        if transition[0]["type"] == "normal":
+            apply_normal_fade_out(
+                synth_audio, transition, synth_audio_seg_samples[i], sr
+            )
+            apply_normal_fade_in(
+                synth_audio, transition, synth_audio_seg_samples[i + 1], sr
+            )
+
+        elif transition[0]["type"] == "cross-fade":
+            # continuation of the outgoing source after its segment
+            n = int(transition[0]["f_out_dur"] * sr)
+            if n > 0:
+                stop = int(segments[i][1] * sr)
+                cf_out_audio = read_segment(samples_list[i], stop, stop + n)
+                apply_cross_fade_out(
+                    synth_audio, transition, cf_out_audio, synth_audio_seg_samples[i]
+                )
+
+            # lead-in of the incoming source before its segment
+            n = int(transition[0]["f_in_dur"] * sr)
+            if n > 0:
+                start = int(segments[i + 1][0] * sr)
+                cf_in_audio = read_segment(samples_list[i + 1], start - n, start)
+                apply_cross_fade_in(
+                    synth_audio, transition, cf_in_audio, synth_audio_seg_samples[i + 1]
+                )
+
+    return synth_audio[0:ss]
@@ -0,0 +1,383 @@
+"""Parallel synthesis of training examples
+
+Each example N draws all of its randomness from its own generator, seeded
+from (seed, N). Examples are therefore identical whatever the number of
+workers, chunk size or `offset` split used to produce them, and any single
+example can be regenerated on its own.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from .clips import (
+    create_audio_clip,
+    create_mixed_audio_clip,
+    get_random_segments,
+    use_reader,
+)
+from .features import get_log_melspectrogram
+from .index import SourceReader
+from .labels import generate_mixed_multiclass_labels, generate_multiclass_labels
+from .loudness import LoudnessCache
+from .manifest import Manifest
+from .params import Synthesis_Params
+from .render import MARGIN, plan_example, render_batch
+from .sources import Sources
+from .transitions import (
+    create_class_list,
+    create_random_transition_points,
+    create_samples_list,
+    create_transition_list,
+    get_segment_lengths,
+)
+
+
+def example_rng(seed, number):
+    """Independent generator of example `number`"""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(number,)))
+
+
+def new_seed():
+    """Fresh 128-bit seed, to be reported so the run can be reproduced"""
+    return np.random.SeedSequence().entropy
+
+
+def extract_features(audio, params: Synthesis_Params):
+    """(frames, n_mels) log-mel matrix of a clip"""
+    mel = get_log_melspectrogram(
+        audio,
+        sr=params.sample_rate,
+        hop_length=params.hop_length,
+        n_fft=params.n_fft,
+        n_mels=params.n_mels,
+        fmin=params.fmin,
+        fmax=params.fmax,
+    )
+    return mel.T
+
+
+def synthesise_old_example(rng, sources: Sources, params: Synthesis_Params):
+    """Audio and labels of an example without background music"""
+    length = params.audio_clip_length
+    sr = params.sample_rate
+
+    weights = params.class_weights
+    if not sources.noise:
+        weights = (weights[0], weights[1], 0.0)
+
+    p = create_random_transition_points(rng, length, params.min_segment_length)
+    transitions_list = create_transition_list(rng, p)
+    class_list = create_class_list(rng, len(p) + 1, weights=weights)
+    samples_list = create_samples_list(
+        rng, class_list, sources.music, sources.speech, sources.noise
+    )
+    segment_lengths = get_segment_lengths(transitions_list, length)
+    segments = get_random_segments(
+        rng, samples_list, segment_lengths, f_buffer=params.f_buffer, sr=sr
+    )
+
+    audio = create_audio_clip(rng, length, transitions_list, samples_list, segments, sr)
+    labels = generate_multiclass_labels(
+        length, transitions_list, class_list, sr=sr, res=params.hop_length
+    )
+
+    return audio, labels
+
+
+def synthesise_mixed_example(rng, sources: Sources, params: Synthesis_Params):
+    """Audio and labels of a music + speech example"""
+    audio, transition = create_mixed_audio_clip(
+        rng,
+        sources.music,
+        sources.speech,
+        audio_clip_length=params.audio_clip_length,
+        sr=params.sample_rate,
+    )
+    labels = generate_mixed_multiclass_labels(
+        transition,
+        audio_clip_length=params.audio_clip_length,
+        sr=params.sample_rate,
+        res=params.hop_length,
+    )
+
+    return audio, labels
+
+
+def synthesise_example(rng, sources: Sources, params: Synthesis_Params):
+    """One example: (mel, labels, kind), kind being "old" or "mixed" """
+    kind = "mixed" if rng.random() < params.p_mixed else "old"
+
+    if kind == "mixed":
+        audio, labels = synthesise_mixed_example(rng, sources, params)
+    else:
+        audio, labels = synthesise_old_example(rng, sources, params)
+
+    audio = librosa.util.normalize(audio)
+    return extract_features(audio, params), labels, kind
+
+
+# state of each worker process, set once by the pool initializer
+_worker = {}
+
+
+def _init_worker(sources, params, seed, manifest=None):
+    _worker.update(sources=sources, params=params, seed=seed, manifest=manifest)
+    reader = SourceReader(sources.index, cache_bytes=params.source_cache_bytes)
+    loudness = LoudnessCache(
+        reader, rate=params.sample_rate, cache_bytes=params.loudness_cache_bytes
+    )
+    use_reader(reader, loudness)
+
+
+def _render(numbers, plans):
+    """Render `plans` as one batch: [(number, mel, labels, kind), ...]"""
+    params = _worker["params"]
+
+    # work buffer of the renderer, kept across batches
+    buffer = _worker.get("buffer")
+    if buffer is None or len(buffer) < len(plans):
+        buffer = np.empty((len(plans), params.clip_samples + MARGIN))
+        _worker["buffer"] = buffer
+
+    mels, labels = render_batch(plans, params, out=buffer[: len(plans)])
+    return [
+        (number, mel, label, plan["kind"])
+        for number, mel, label, plan in zip(numbers, mels, labels, plans)
+    ]
+
+
+def _synthesise_batch(numbers):
+    """Plan then render examples `numbers` as one batch"""
+    seed, sources, params = _worker["seed"], _worker["sources"], _worker["params"]
+    plans = [plan_example(example_rng(seed, n), sources, params) for n in numbers]
+    return _render(numbers, plans)
+
+
+def _render_rows(rows):
+    """Render rows of the worker's manifest as one batch"""
+    manifest = _worker["manifest"]
+    return _render(manifest.numbers[rows].tolist(), [manifest.plan(r) for r in rows])
+
+
+def _batches(first, stop, size):
+    return [range(n, min(n + size, stop)) for n in range(first, stop, size)]
+
+
+def _run(function, jobs, initargs, workers, chunksize):
+    """Ordered results of `function` over `jobs`, in-process for 1 worker"""
+    if workers == 1:
+        _init_worker(*initargs)
+        yield from map(function, jobs)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=initargs
+    ) as executor:
+        yield from executor.map(function, jobs, chunksize=chunksize)
+
+
+def synthesise_combined_audio_examples(
+    no_of_examples,
+    writer,
+    sources: Sources,
+    params: Synthesis_Params = None,
+    seed=None,
+    offset=0,
+    workers=None,
+    chunksize=16,
+):
+    """Synthesise examples offset + 1 ... offset + no_of_examples
+
+    parameters:
+    writer: object with write(number, mel, labels) and close(), e.g.
+            features.NpyDirectoryWriter
+    seed: int, optional
+            run seed, a fresh one is drawn (and reported) when None
+    workers: int, optional
+            worker processes, defaults to os.cpu_count()
+    chunksize: int
+            examples per job, rendered as one batch (render.render_batch)
+
+    return:
+    report: dict
+            seed, number of "old" and "mixed" examples, wall clock and
+            examples per second
+    """
+    params = params or Synthesis_Params()
+    seed = new_seed() if seed is None else seed
+    workers = workers or os.cpu_count()
+
+    batches = _batches(offset + 1, offset + no_of_examples + 1, chunksize)
+    counts = {"old": 0, "mixed": 0}
+
+    tic = time.perf_counter()
+    results = _run(_synthesise_batch, batches, (sources, params, seed), workers, 1)
+    for batch in results:
+        for number, mel, labels, kind in batch:
+            writer.write(number, mel, labels)
+            counts[kind] += 1
+    writer.close()
+    elapsed = time.perf_counter() - tic
+
+    return {
+        "seed": seed,
+        "examples": no_of_examples,
+        "offset": offset,
+        "old": counts["old"],
+        "mixed": counts["mixed"],
+        "workers": workers,
+        "seconds": elapsed,
+        "examples_per_second": no_of_examples / elapsed if elapsed else 0.0,
+    }
+
+
+def plan_combined_audio_examples(
+    no_of_examples,
+    sources: Sources,
+    params: Synthesis_Params = None,
+    seed=None,
+    offset=0,
+):
+    """Plans of examples offset + 1 ... offset + no_of_examples, as a Manifest
+
+    Planning only needs the source lengths (from the index), not the
+    audio. Rendering the manifest (render_manifest) gives the examples
+    synthesise_combined_audio_examples writes with the same seed.
+    """
+    params = params or Synthesis_Params()
+    seed = new_seed() if seed is None else seed
+    _init_worker(sources, params, seed)
+
+    numbers = range(offset + 1, offset + no_of_examples + 1)
+    plans = [plan_example(example_rng(seed, n), sources, params) for n in numbers]
+    meta = {
+        "seed": str(seed),
+        "sample_rate": params.sample_rate,
+        "audio_clip_length": params.audio_clip_length,
+    }
+    return Manifest.from_plans(numbers, plans, meta)
+
+
+def render_manifest(
+    manifest: Manifest,
+    writer,
+    params: Synthesis_Params = None,
+    sources: Sources = None,
+    workers=None,
+    chunksize=16,
+):
+    """Render every row of `manifest` to `writer`
+
+    parameters:
+    params: Synthesis_Params, optional
+            feature parameters may differ from the planning run; the sample
+            rate and clip length must match it
+    sources: Sources, optional
+            only its index is used, to avoid reading the file headers
+
+    return:
+    report: dict
+            number of "old" and "mixed" examples, wall clock and examples
+            per second
+    """
+    params = params or Synthesis_Params()
+    workers = workers or os.cpu_count()
+
+    for key in ["sample_rate", "audio_clip_length"]:
+        if key in manifest.meta and manifest.meta[key] != getattr(params, key):
+            raise ValueError(
+                "{} {} does not match the manifest ({})".format(
+                    key, getattr(params, key), manifest.meta[key]
+                )
+            )
+
+    sources = sources or Sources()
+    initargs = (sources, params, manifest.seed, manifest)
+    batches = _batches(0, len(manifest), chunksize)
+    counts = {"old": 0, "mixed": 0}
+
+    tic = time.perf_counter()
+    for batch in _run(_render_rows, batches, initargs, workers, 1):
+        for number, mel, labels, kind in batch:
+            writer.write(number, mel, labels)
+            counts[kind] += 1
+    writer.close()
+    elapsed = time.perf_counter() - tic
+
+    return {
+        "seed": manifest.meta.get("seed"),
+        "examples": len(manifest),
+        "old": counts["old"],
+        "mixed": counts["mixed"],
+        "workers": workers,
+        "seconds": elapsed,
+        "examples_per_second": len(manifest) / elapsed if elapsed else 0.0,
+    }
+
+
+def _file_examples(job):
+    """Every 8 s excerpt of one source, plus the last 8 s"""
+    filename, column = job
+    params = _worker["params"]
+    example_len = params.clip_samples
+
+    audio, _ = sf.read(filename)
+    if len(audio) < example_len:
+        return []
+
+    starts = list(range(0, len(audio) - example_len + 1, example_len))
+    starts.append(len(audio) - example_len)
+
+    examples = []
+    for start in starts:
+        synth_audio = librosa.util.normalize(audio[start : start + example_len])
+        labels = np.zeros((params.n_frames, 2), dtype=np.int16)
+        labels[:, column] = 1
+        examples.append((extract_features(synth_audio, params), labels))
+
+    return examples
+
+
+def synthesise_examples_OF(
+    writer,
+    sources: Sources,
+    params: Synthesis_Params = None,
+    offset=0,
+    workers=None,
+    chunksize=1,
+):
+    """Examples made of a single source ("one file"): every 8 s excerpt of
+    every speech file then every music file, labelled with its class
+
+    return:
+    report: dict
+            number of examples, wall clock and examples per second
+    """
+    params = params or Synthesis_Params()
+    workers = workers or os.cpu_count()
+
+    jobs = [(f, 0) for f in sources.speech] + [(f, 1) for f in sources.music]
+    number = offset
+
+    tic = time.perf_counter()
+    for examples in _run(
+        _file_examples, jobs, (sources, params, None), workers, chunksize
+    ):
+        for mel, labels in examples:
+            number += 1
+            writer.write(number, mel, labels)
+    writer.close()
+    elapsed = time.perf_counter() - tic
+
+    return {
+        "examples": number - offset,
+        "offset": offset,
+        "workers": workers,
+        "seconds": elapsed,
+        "examples_per_second": (number - offset) / elapsed if elapsed else 0.0,
+    }
@@ -0,0 +1,261 @@
+"""Fade in / fade out operations (data-synthesis.ipynb)
+
+All functions modify `audio` in place. `transition` is a
+(transition dict, time) tuple as returned by `transitions`.
+
+Every fade curve of the notebook is made of one or two pieces
+c0 + c1 * a**x, with a going linearly between 0 and 1. `fade_pieces`
+describes a curve that way; single curves are evaluated piece by piece
+into one buffer, and `FadeBatch` evaluates the fades of a whole batch of
+clips in a single vectorised pass and multiplies them into a
+(clips, samples) buffer.
+"""
+
+import numpy as np
+
+# sample positions 0, 1, 2 ... shared by all ramps, grown on demand
+_positions = np.arange(1 << 16, dtype=np.float64)
+
+
+def _arange(n):
+    global _positions
+    if n > len(_positions):
+        _positions = np.arange(max(n, 2 * len(_positions)), dtype=np.float64)
+    return _positions[:n]
+
+
+def _rising(n):
+    """(a0, da) of a ramp from 0 to 1 over n samples"""
+    step = 1.0 / (n - 1) if n > 1 else 0.0
+    return 0.0, step
+
+
+def _falling(n):
+    """(a0, da) of a ramp from 1 to 0 over n samples
+
+    a0 is (n - 1) * step rather than 1.0 so that the last sample is exactly
+    0.0 and never a tiny negative number (a negative base would turn a**x
+    into nan).
+    """
+    step = 1.0 / (n - 1) if n > 1 else 0.0
+    return ((n - 1) * step if n > 1 else 1.0), -step
+
+
+def fade_pieces(direction, curve, n, exp_value=None, start_gain=None, end_gain=None):
+    """Describe a fade as pieces (offset, length, a0, da, x, c0, c1)
+
+    Piece samples k = 0 .. length - 1 are c0 + c1 * (a0 + k * da) ** x.
+    `direction` is "in" (0 -> 1) or "out" (1 -> 0); the gains, when given,
+    map the curve linearly onto start_gain .. end_gain.
+    """
+    x = 1.0 if curve == "linear" else exp_value
+
+    if curve in ("linear", "exp-concave"):
+        a0, da = _rising(n) if direction == "in" else _falling(n)
+        pieces = [(0, n, a0, da, x, 0.0, 1.0)]
+
+    elif curve == "exp-convex":
+        a0, da = _falling(n) if direction == "in" else _rising(n)
+        pieces = [(0, n, a0, da, x, 1.0, -1.0)]
+
+    elif curve == "s-curve":
+        n_1 = int(n / 2)
+        n_2 = n - n_1
+        if direction == "in":
+            pieces = [
+                (0, n_1, *_rising(n_1), x, 0.0, 0.5),
+                (n_1, n_2, *_falling(n_2), x, 1.0, -0.5),
+            ]
+        else:
+            pieces = [
+                (0, n_1, *_rising(n_1), x, 1.0, -0.5),
+                (n_1, n_2, *_falling(n_2), x, 0.0, 0.5),
+            ]
+
+    else:
+        raise ValueError("unexpected fade curve {!r}".format(curve))
+
+    if start_gain is None and end_gain is None:
+        return pieces
+
+    # the curve runs between 0 and 1: gain = low + curve * (high - low)
+    low, high = (start_gain, end_gain) if direction == "in" else (end_gain, start_gain)
+    scale = high - low
+    return [
+        (offset, length, a0, da, x, c0 * scale + low, c1 * scale)
+        for offset, length, a0, da, x, c0, c1 in pieces
+    ]
+
+
+def render_pieces(pieces, n, out=None):
+    """Evaluate the pieces of one curve into an array of n samples"""
+    if out is None:
+        out = np.empty(n)
+
+    for offset, length, a0, da, x, c0, c1 in pieces:
+        piece = out[offset : offset + length]
+        np.multiply(_arange(length), da, out=piece)
+        piece += a0
+        if x != 1.0:
+            np.power(piece, x, out=piece)
+        if c1 != 1.0:
+            piece *= c1
+        if c0 != 0.0:
+            piece += c0
+
+    return out
+
+
+def fade_out_curve(curve, n, exp_value=None, out=None):
+    """Gain going from 1.0 to 0.0 over n samples"""
+    return render_pieces(fade_pieces("out", curve, n, exp_value), n, out=out)
+
+
+def fade_in_curve(curve, n, exp_value=None, out=None):
+    """Gain going from 0.0 to 1.0 over n samples"""
+    return render_pieces(fade_pieces("in", curve, n, exp_value), n, out=out)
+
+
+def apply_mixed_fade_out(audio, transition, sr=22050.0, end_gain=0.0):
+    """Fade the end of `audio` from 1.0 down to `end_gain`"""
+    params = transition[0]
+    stop = audio.shape[0]
+    n = int(params["f_out_dur"] * sr)
+
+    pieces = fade_pieces(
+        "out", params["f_out_curve"], n, params.get("exp_value"), 1.0, end_gain
+    )
+    segment = audio[stop - n : stop]
+    np.multiply(segment, render_pieces(pieces, n), out=segment)
+
+
+def apply_mixed_normal_fade_in(
+    audio, transition, sr=22050.0, end_gain=1.0, start_gain=0.0
+):
+    """Fade the start of `audio` from `start_gain` up to `end_gain`"""
+    params = transition[0]
+    n = int(params["f_in_dur"] * sr)
+
+    pieces = fade_pieces(
+        "in", params["f_in_curve"], n, params.get("exp_value"), start_gain, end_gain
+    )
+    segment = audio[0:n]
+    np.multiply(segment, render_pieces(pieces, n), out=segment)
+
+
+def apply_normal_fade_out(audio, transition, synth_audio_seg_samples, sr):
+    """Silence `time_gap` at the end of the segment and fade out before it
+
+    `synth_audio_seg_samples` is the (start, stop) of the segment in `audio`.
+    """
+    params = transition[0]
+    start, stop = synth_audio_seg_samples
+    n = int(params["f_out_dur"] * sr)
+
+    # new end point after silencing `time_gap` samples
+    stop_shrunk = stop - int(params["time_gap"] * sr)
+    audio[stop_shrunk:stop] = 0.0
+
+    fade_curve = fade_out_curve(params["f_out_curve"], n, params.get("exp_value"))
+    segment = audio[stop_shrunk - n : stop_shrunk]
+    np.multiply(segment, fade_curve, out=segment)
+
+
+def apply_normal_fade_in(audio, transition, synth_audio_seg_samples, sr):
+    """Fade in the start of the segment (start, stop) of `audio`"""
+    params = transition[0]
+    start, stop = synth_audio_seg_samples
+    n = int(params["f_in_dur"] * sr)
+
+    fade_curve = fade_in_curve(params["f_in_curve"], n, params.get("exp_value"))
+    segment = audio[start : start + n]
+    np.multiply(segment, fade_curve, out=segment)
+
+
+def apply_cross_fade_out(audio, transition, cf_out_audio, synth_audio_seg_samples):
+    """Add the faded-out continuation `cf_out_audio` of the outgoing source
+    after the end of its segment in `audio`
+    """
+    params = transition[0]
+    n = len(cf_out_audio)
+    _, synth_audio_stop = synth_audio_seg_samples
+
+    fade_curve = fade_out_curve(params["f_out_curve"], n, params.get("exp_value"))
+    np.multiply(fade_curve, cf_out_audio, out=fade_curve)
+    segment = audio[synth_audio_stop : synth_audio_stop + n]
+    np.add(segment, fade_curve, out=segment)
+
+
+def apply_cross_fade_in(audio, transition, cf_in_audio, synth_audio_seg_samples):
+    """Add the faded-in lead-in `cf_in_audio` of the incoming source before
+    the start of its segment in `audio`
+    """
+    params = transition[0]
+    n = len(cf_in_audio)
+    synth_audio_start, _ = synth_audio_seg_samples
+
+    fade_curve = fade_in_curve(params["f_in_curve"], n, params.get("exp_value"))
+    np.multiply(fade_curve, cf_in_audio, out=fade_curve)
+    segment = audio[synth_audio_start - n : synth_audio_start]
+    np.add(segment, fade_curve, out=segment)
+
+
+class FadeBatch:
+    """Gain curves of many clips, applied to a (clips, samples) buffer at once
+
+    batch = FadeBatch()
+    batch.add(row, start, "out", "s-curve", n, exp_value)
+    ...
+    batch.apply(audio)
+
+    Fades of the same row may overlap; their gains multiply.
+    """
+
+    def __init__(self):
+        self._pieces = []
+
+    def __len__(self):
+        return len(self._pieces)
+
+    def add(
+        self,
+        row,
+        start,
+        direction,
+        curve,
+        n,
+        exp_value=None,
+        start_gain=None,
+        end_gain=None,
+    ):
+        """Fade audio[row, start:start + n] (see `fade_pieces`)"""
+        for offset, length, a0, da, x, c0, c1 in fade_pieces(
+            direction, curve, n, exp_value, start_gain, end_gain
+        ):
+            if length:
+                self._pieces.append((row, start + offset, length, a0, da, x, c0, c1))
+
+    def clear(self):
+        self._pieces.clear()
+
+    def apply(self, audio, scratch=None):
+        """Multiply the gains into `audio` (clips, samples) in place
+
+        Pieces are evaluated one after the other into a single scratch
+        buffer (reused across calls when passed) and multiplied into their
+        rows, so no per-fade array is allocated.
+        """
+        if not self._pieces:
+            return audio
+
+        longest = max(piece[2] for piece in self._pieces)
+        if scratch is None or len(scratch) < longest:
+            scratch = np.empty(longest)
+
+        for row, start, length, a0, da, x, c0, c1 in self._pieces:
+            piece = [(0, length, a0, da, x, c0, c1)]
+            gains = render_pieces(piece, length, out=scratch[:length])
+            segment = audio[row, start : start + length]
+            np.multiply(segment, gains, out=segment)
+
+        return audio
@@ -0,0 +1,106 @@
+"""Features and on-disk layout of synthesised examples"""
+
+import os
+
+import librosa
+import numpy as np
+
+
+def get_log_melspectrogram(
+    audio, sr=22050, hop_length=220, n_fft=1024, n_mels=80, fmin=64, fmax=8000
+):
+    """Return the log-scaled Mel bands of an audio signal."""
+    bands = librosa.feature.melspectrogram(
+        y=audio,
+        sr=sr,
+        hop_length=hop_length,
+        n_fft=n_fft,
+        n_mels=n_mels,
+        fmin=fmin,
+        fmax=fmax,
+        dtype=np.float32,
+    )
+    return librosa.core.power_to_db(bands, amin=1e-7)
+
+
+def get_block_id(mel_id, block_size=320):
+    """Block directory of example `mel_id` ("mel-id-N", N starting at 1)"""
+    i = int(mel_id.replace("mel-id-", ""))
+    return (i - 1) // block_size + 1
+
+
+class NpyDirectoryWriter:
+    """Write examples as block-id-B/mel-id-N.npy and mel-id-label-N.npy
+
+    The layout read by the DataGenerator of train-CRNN.ipynb.
+    """
+
+    def __init__(self, mel_dir, block_size=320):
+        self.mel_dir = mel_dir
+        self.block_size = block_size
+
+    def write(self, number, mel, labels):
+        """Store example `number` (mel is (frames, n_mels))"""
+        mel_id = "mel-id-{}".format(number)
+        block = os.path.join(
+            self.mel_dir,
+            "block-id-{}".format(get_block_id(mel_id, block_size=self.block_size)),
+        )
+        os.makedirs(block, exist_ok=True)
+
+        np.save(os.path.join(block, mel_id + ".npy"), mel)
+        np.save(os.path.join(block, "mel-id-label-{}.npy".format(number)), labels)
+
+    def close(self):
+        pass
+
+
+def get_log_melspectrograms(
+    audio,
+    sr=22050,
+    hop_length=220,
+    n_fft=1024,
+    n_mels=80,
+    fmin=64,
+    fmax=8000,
+    chunk=1,
+    out=None,
+):
+    """Log-mel bands of a (clips, samples) batch as (clips, frames, n_mels)
+
+    Same values as get_log_melspectrogram(audio[i]).T for every clip i (the
+    80 dB floor of power_to_db is applied per clip). The STFT runs on
+    `chunk` clips at a time, and the mel projection and dB conversion are
+    done in place in buffers shared by the whole batch. On CPU one clip at
+    a time is fastest: the transform is memory bound and the spectrogram of
+    a single clip stays in cache.
+    """
+    mel_basis = librosa.filters.mel(
+        sr=sr, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax, dtype=np.float32
+    ).astype(np.float64)
+
+    bands = None
+    for first in range(0, len(audio), chunk):
+        clips = audio[first : first + chunk]
+        power = np.abs(librosa.stft(clips, n_fft=n_fft, hop_length=hop_length))
+        power **= 2
+
+        if bands is None:
+            bands = np.empty((len(clips), n_mels, power.shape[-1]))
+        if out is None:
+            out = np.empty((len(audio), power.shape[-1], n_mels))
+
+        for j in range(len(clips)):
+            np.matmul(mel_basis, power[j], out=bands[j])
+        db = bands[: len(clips)]
+
+        # power_to_db(amin=1e-7, ref=1.0, top_db=80.0), clip by clip
+        np.maximum(db, 1e-7, out=db)
+        np.log10(db, out=db)
+        db *= 10.0
+        floor = db.max(axis=(1, 2), keepdims=True) - 80.0
+        np.maximum(db, floor, out=db)
+
+        out[first : first + len(clips)] = db.transpose(0, 2, 1)
+
+    return out
@@ -0,0 +1,191 @@
+"""Source index and cached source reads
+
+`SourceIndex` records, once per file, what the synthesis keeps asking
+for (length, sample rate, peak and RMS level) and is saved next to the
+corpus so later runs only stat the files. `SourceReader` serves segment
+reads from a bounded LRU of decoded sources, falling back to partial
+`sf.read(start=, stop=)` reads for files too large to cache.
+"""
+
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+
+import numpy as np
+import soundfile as sf
+
+_BLOCK_FRAMES = 1 << 18
+
+
+@dataclass
+class SourceInfo:
+
+    frames: int
+    samplerate: int
+    peak: float
+    rms: float
+    # file state when indexed, to detect stale entries
+    mtime: float
+    size: int
+
+    @property
+    def duration(self):
+        return self.frames / self.samplerate
+
+
+def _file_state(filename):
+    stat = os.stat(filename)
+    return stat.st_mtime, stat.st_size
+
+
+def describe_source(filename) -> SourceInfo:
+    """Length and levels of one file, decoded block by block"""
+    info = sf.info(filename)
+    peak, energy = 0.0, 0.0
+
+    for block in sf.blocks(filename, blocksize=_BLOCK_FRAMES, dtype="float32"):
+        block = np.abs(block, dtype=np.float64)
+        if block.size:
+            peak = max(peak, float(block.max()))
+            energy += float(np.dot(block.ravel(), block.ravel()))
+
+    samples = info.frames * info.channels
+    mtime, size = _file_state(filename)
+
+    return SourceInfo(
+        frames=info.frames,
+        samplerate=info.samplerate,
+        peak=peak,
+        rms=float(np.sqrt(energy / samples)) if samples else 0.0,
+        mtime=mtime,
+        size=size,
+    )
+
+
+class SourceIndex(dict):
+    """filename -> SourceInfo"""
+
+    @classmethod
+    def build(cls, files, workers=None, index=None):
+        """Index `files`, reusing the up-to-date entries of `index`"""
+        result = cls()
+        stale = []
+
+        for filename in files:
+            known = index.get(filename) if index else None
+            if known is not None and (known.mtime, known.size) == _file_state(filename):
+                result[filename] = known
+            else:
+                stale.append(filename)
+
+        if workers == 1 or len(stale) <= 1:
+            infos = map(describe_source, stale)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                infos = list(executor.map(describe_source, stale, chunksize=8))
+
+        for filename, info in zip(stale, infos):
+            result[filename] = info
+
+        return result
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as file:
+            entries = json.load(file)
+        return cls({f: SourceInfo(**info) for f, info in entries.items()})
+
+    def save(self, path):
+        """Write the index as JSON (atomically)"""
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "w") as file:
+            json.dump({f: asdict(info) for f, info in self.items()}, file)
+        os.replace(tmp, path)
+
+    @classmethod
+    def open(cls, path, files, workers=None):
+        """Load `path` if it exists, index new or modified files and save"""
+        index = cls.load(path) if os.path.isfile(path) else None
+        result = cls.build(files, workers=workers, index=index)
+
+        if index is None or result != index:
+            result.save(path)
+
+        return result
+
+
+class SourceReader:
+    """Segment reads served from an LRU of decoded sources
+
+    parameters:
+    index: SourceIndex, optional
+            lengths are taken from it instead of the file headers
+    cache_bytes: int
+            memory budget of the decoded sources (float32)
+    max_source_bytes: int, optional
+            larger files are never cached, only read partially. Defaults to
+            1/8 of the budget
+    """
+
+    def __init__(self, index=None, cache_bytes=256 << 20, max_source_bytes=None):
+        self.index = index if index is not None else SourceIndex()
+        self.cache_bytes = cache_bytes
+        self.max_source_bytes = (
+            cache_bytes // 8 if max_source_bytes is None else max_source_bytes
+        )
+
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lengths = {}
+
+        self.stats = {"hits": 0, "decodes": 0, "partial_reads": 0, "frames_read": 0}
+
+    def length(self, filename):
+        """Number of frames of a source"""
+        info = self.index.get(filename)
+        if info is not None:
+            return info.frames
+
+        if filename not in self._lengths:
+            self._lengths[filename] = sf.info(filename).frames
+        return self._lengths[filename]
+
+    def read(self, filename, start=0, stop=None):
+        """Frames [start, stop) as a new float64 array (like sf.read)"""
+        audio = self._cache.get(filename)
+
+        if audio is not None:
+            self._cache.move_to_end(filename)
+            self.stats["hits"] += 1
+            return audio[start:stop].astype(np.float64)
+
+        frames = self.length(filename)
+        if frames * 4 <= self.max_source_bytes:
+            audio, _ = sf.read(filename, dtype="float32")
+            self.stats["decodes"] += 1
+            self.stats["frames_read"] += len(audio)
+            self._store(filename, audio)
+            return audio[start:stop].astype(np.float64)
+
+        audio, _ = sf.read(filename, start=start, stop=stop)
+        self.stats["partial_reads"] += 1
+        self.stats["frames_read"] += len(audio)
+        return audio
+
+    def _store(self, filename, audio):
+        self._cache[filename] = audio
+        self._cached_bytes += audio.nbytes
+
+        while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= evicted.nbytes
+
+    @property
+    def cached_bytes(self):
+        return self._cached_bytes
+
+    def clear(self):
+        self._cache.clear()
+        self._cached_bytes = 0
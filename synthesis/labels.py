@@ -0,0 +1,109 @@
+"""Frame labels of synthesised examples (column 0 speech, column 1 music)"""
+
+import numpy as np
+
+
+def _no_of_labels(audio_clip_length, sr, res):
+    return int(np.ceil(audio_clip_length / (res / sr)))
+
+
+def generate_mixed_multiclass_labels(
+    transition, audio_clip_length=8.0, sr=22050.0, res=220
+):
+    """Labels of a music + speech example (`res` is in samples)"""
+    res_t = res / sr
+    no_of_labels = _no_of_labels(audio_clip_length, sr, res)
+    t_point = int(transition[1] / res_t)
+    kind = transition[0]["type"]
+
+    labels = np.zeros((no_of_labels, 2), dtype=np.int16)
+
+    if kind == "music+speech":
+        labels[:, 0] = 1
+        labels[:, 1] = 1
+
+    elif kind == "speech_to_music+speech":
+        labels[:, 0] = 1
+        labels[t_point:, 1] = 1
+
+    elif kind == "music_to_music+speech":
+        labels[t_point:, 0] = 1
+        labels[:, 1] = 1
+
+    elif kind == "music+speech_to_music":
+        labels[0:t_point, 0] = 1
+        labels[:, 1] = 1
+
+    elif kind == "music+speech_to_speech":
+        labels[:, 0] = 1
+        labels[0:t_point, 1] = 1
+
+    return labels
+
+
+def generate_multiclass_labels(
+    audio_clip_length, transitions_list, class_list, sr=22050.0, res=220
+):
+    """Labels of an example without background music (noise is unlabelled)"""
+    res_t = res / sr
+    no_of_labels = _no_of_labels(audio_clip_length, sr, res)
+
+    # speech -> column 0, music -> column 1, noise -> no column
+    columns = [0 if c == "speech" else 1 if c == "music" else None for c in class_list]
+
+    labels = np.zeros((no_of_labels, 2), dtype=np.int16)
+    prev_point = 0
+
+    for c, (params, time) in enumerate(transitions_list):
+        point = int(time / res_t)
+        if columns[c] is not None:
+            labels[prev_point:point, columns[c]] = 1
+
+        if params["type"] == "cross-fade":
+            # the outgoing source keeps sounding during its fade out ...
+            end_sample = point + int(params["f_out_dur"] / res_t)
+            if columns[c] is not None:
+                labels[point:end_sample, columns[c]] = 1
+
+            # ... and the incoming one starts during its fade in
+            start_sample = point - int(params["f_in_dur"] / res_t)
+            if columns[c + 1] is not None:
+                labels[start_sample:point, columns[c + 1]] = 1
+
+        elif params["type"] == "normal":
+            # silent time gap
+            start_sample = point - int(params["time_gap"] / res_t)
+            if columns[c] is not None:
+                labels[start_sample:point, columns[c]] = 0
+
+        else:
+            raise ValueError("unexpected transition type {!r}".format(params["type"]))
+
+        prev_point = point
+
+    c = len(transitions_list)
+    if columns[c] is not None:
+        labels[prev_point:no_of_labels, columns[c]] = 1
+
+    return labels
+
+
+def generate_sed_eval_labels(audio_clip_length, transitions_list, class_list):
+    """[(start, end, class), ...] event list of an example"""
+    prev_point = 0.0
+    labels = []
+
+    for c, (params, time) in enumerate(transitions_list):
+        if params["type"] == "cross-fade":
+            end_point = time + params["f_out_dur"]
+        elif params["type"] == "normal":
+            end_point = time - params["time_gap"]
+        else:
+            raise ValueError("unexpected transition type {!r}".format(params["type"]))
+
+        labels.append((prev_point, end_point, class_list[c]))
+        prev_point = time
+
+    labels.append((prev_point, audio_clip_length, class_list[-1]))
+
+    return labels
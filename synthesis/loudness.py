@@ -0,0 +1,206 @@
+"""Integrated loudness (ITU-R BS.1770-4, as pyloudnorm.Meter) without
+per-example filtering
+
+The K-weighting filters only depend on the source, so `LoudnessCache`
+filters every source once (per process) and keeps the cumulative sum of
+its K-weighted energy. The mean square of any 400 ms gating block of any
+excerpt is then the difference of two entries of that sum, and the
+loudness of an excerpt, scaled and optionally faded, is gated from its
+~80 block energies. Values match pyloudnorm on the excerpt itself up to
+the start-up transient of the filters (the cached filters have seen the
+audio before the excerpt), a few thousandths of a LU.
+
+`integrated_loudness` and `batch_integrated_loudness` measure audio that
+is not a cached excerpt, the latter a whole (clips, samples) batch with
+one filter call per stage.
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import pyloudnorm as pyln
+import scipy.signal
+
+BLOCK_SIZE = 0.4
+OVERLAP = 0.75
+ABSOLUTE_GATE = -70.0
+CHANNEL_GAINS = np.array([1.0, 1.0, 1.0, 1.41, 1.41])
+
+
+@lru_cache(maxsize=None)
+def k_weighting(rate):
+    """[(b, a, passband_gain), ...] stages of pyloudnorm's K-weighting filter"""
+    return [
+        (stage.b, stage.a, stage.passband_gain)
+        for stage in pyln.Meter(rate)._filters.values()
+    ]
+
+
+def k_weighted_energy(audio, rate, axis=0):
+    """Channel-weighted square of the K-weighted audio
+
+    `audio` is filtered along `axis`; (samples, channels) input is reduced
+    to (samples,) with the BS.1770 channel gains.
+    """
+    filtered = audio
+    for b, a, passband_gain in k_weighting(rate):
+        filtered = scipy.signal.lfilter(b, a, filtered, axis=axis)
+        if passband_gain != 1.0:
+            filtered *= passband_gain
+
+    energy = np.square(filtered, out=filtered)
+    if axis == 0 and energy.ndim == 2:
+        energy = energy @ CHANNEL_GAINS[: energy.shape[1]]
+    return energy
+
+
+def gating_blocks(n, rate):
+    """(lower, upper) sample bounds of the gating blocks of n samples"""
+    step = 1.0 - OVERLAP
+    count = int(np.round((n / rate - BLOCK_SIZE) / (BLOCK_SIZE * step))) + 1
+    j = np.arange(count, dtype=np.float64)
+
+    lower = (BLOCK_SIZE * (j * step) * rate).astype(np.int64)
+    upper = (BLOCK_SIZE * (j * step + 1) * rate).astype(np.int64)
+    return np.minimum(lower, n), np.minimum(upper, n)
+
+
+def gated_loudness(z):
+    """Integrated loudness from block mean squares z (..., blocks)"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        block_loudness = -0.691 + 10.0 * np.log10(z)
+
+        above = block_loudness >= ABSOLUTE_GATE
+        mean = (z * above).sum(axis=-1) / above.sum(axis=-1)
+        relative_gate = -0.691 + 10.0 * np.log10(mean) - 10.0
+
+        gated = (block_loudness > relative_gate[..., None]) & (
+            block_loudness > ABSOLUTE_GATE
+        )
+        mean = np.nan_to_num((z * gated).sum(axis=-1) / gated.sum(axis=-1))
+        return -0.691 + 10.0 * np.log10(mean)
+
+
+def _block_energies(cumulative, n, rate):
+    """Block mean squares from the cumulative energy of n samples"""
+    lower, upper = gating_blocks(n, rate)
+    return (cumulative[..., upper] - cumulative[..., lower]) / (BLOCK_SIZE * rate)
+
+
+def _cumulative(energy):
+    shape = energy.shape[:-1] + (1,)
+    return np.concatenate((np.zeros(shape), np.cumsum(energy, axis=-1)), axis=-1)
+
+
+def integrated_loudness(audio, rate=22050):
+    """Integrated loudness of (samples,) or (samples, channels) audio"""
+    cumulative = _cumulative(k_weighted_energy(np.asarray(audio, float), rate))
+    return float(gated_loudness(_block_energies(cumulative, len(audio), rate)))
+
+
+def batch_integrated_loudness(clips, rate=22050):
+    """Integrated loudness of every row of a (clips, samples) mono batch"""
+    energy = k_weighted_energy(np.asarray(clips, float), rate, axis=-1)
+    return gated_loudness(_block_energies(_cumulative(energy), clips.shape[-1], rate))
+
+
+class LoudnessCache:
+    """Loudness of source excerpts from cached K-weighted energies
+
+    parameters:
+    reader: index.SourceReader
+            decodes the sources
+    rate: int
+    cache_bytes: int
+            memory budget of the cumulative energies (float64, one value
+            per frame)
+    """
+
+    def __init__(self, reader, rate=22050, cache_bytes=512 << 20):
+        self.reader = reader
+        self.rate = rate
+        self.cache_bytes = cache_bytes
+
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._multichannel = set()
+
+        self.stats = {"hits": 0, "filtered": 0, "uncached": 0}
+
+    def cacheable(self, filename):
+        """Mono sources the reader keeps in memory (others are measured
+        directly: a partial read or per-channel normalization would not
+        match the cached energy)
+        """
+        if filename in self._multichannel:
+            return False
+        return self.reader.length(filename) * 4 <= self.reader.max_source_bytes
+
+    def energy(self, filename):
+        """Cumulative K-weighted energy of a source, (frames + 1,)"""
+        cumulative = self._cache.get(filename)
+        if cumulative is not None:
+            self._cache.move_to_end(filename)
+            self.stats["hits"] += 1
+            return cumulative
+
+        audio = self.reader.read(filename)
+        if audio.ndim != 1:
+            self._multichannel.add(filename)
+            return None
+
+        cumulative = _cumulative(k_weighted_energy(audio, self.rate))
+        self.stats["filtered"] += 1
+
+        self._cache[filename] = cumulative
+        self._cached_bytes += cumulative.nbytes
+        while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= evicted.nbytes
+
+        return cumulative
+
+    def excerpt_loudness(self, filename, start, stop, gain=1.0, envelope=None):
+        """Integrated loudness of gain * source[start:stop]
+
+        envelope: (offset, gains), optional
+                the excerpt samples offset ... offset + len(gains) are
+                faded by `gains`
+
+        return None when the source cannot be served from the cache.
+        """
+        if not self.cacheable(filename):
+            self.stats["uncached"] += 1
+            return None
+
+        cumulative = self.energy(filename)
+        if cumulative is None:
+            self.stats["uncached"] += 1
+            return None
+
+        n = stop - start
+        lower, upper = gating_blocks(n, self.rate)
+        z = cumulative[start + upper] - cumulative[start + lower]
+
+        if envelope is not None and len(envelope[1]):
+            offset, gains = envelope
+            first = start + offset
+            energy = np.diff(cumulative[first : first + len(gains) + 1])
+
+            # energy added by the fade, accumulated over the faded span
+            energy *= np.square(gains) - 1.0
+            change = _cumulative(energy)
+            z += change[np.clip(upper - offset, 0, len(gains))]
+            z -= change[np.clip(lower - offset, 0, len(gains))]
+
+        z *= gain * gain / (BLOCK_SIZE * self.rate)
+        return float(gated_loudness(z))
+
+    @property
+    def cached_bytes(self):
+        return self._cached_bytes
+
+    def clear(self):
+        self._cache.clear()
+        self._cached_bytes = 0
@@ -0,0 +1,217 @@
+"""Columnar example manifests
+
+A manifest stores the plans of a run (render.plan_example), one row per
+example, as numpy columns in a single .npz file:
+
+    number      (N,) int64      example number (mel-id-N)
+    kind        (N,) uint8      KINDS
+    source      (N, 2) int32    rows of `sources` (old: segment sources,
+                                mixed: speech, music), -1 when unused
+    klass       (N, 2) int8     CLASSES of the old segments, -1 when unused
+    seg_start   (N, 2) float64  old: seconds, mixed: samples
+    seg_stop    (N, 2) float64
+    start       (N,) int64      excerpt start of single source examples, -1
+    type        (N,) int8       TRANSITION_TYPES, -1 without transition
+    time        (N,) float64    transition time
+    f_out_curve, f_in_curve     (N,) int8, transitions.CURVES, -1 when unused
+    f_out_dur, f_in_dur, time_gap, exp_value, music_gain, music_gain_1,
+    music_gain_2, loudness      (N,) float64, nan when unused
+
+plus the `sources` file names and a json `meta` (seed, sample rate, clip
+length). Any row can be turned back into its plan and rendered on its own,
+so a manifest can be split across workers or machines, or re-rendered
+with other feature parameters.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from .transitions import CLASSES, CURVES, MIXED_TYPES
+
+KINDS = ["old", "mixed"]
+TRANSITION_TYPES = ["normal", "cross-fade"] + MIXED_TYPES
+MAX_SEGMENTS = 2
+
+CURVE_KEYS = ["f_out_curve", "f_in_curve"]
+VALUE_KEYS = [
+    "f_out_dur",
+    "f_in_dur",
+    "time_gap",
+    "exp_value",
+    "music_gain",
+    "music_gain_1",
+    "music_gain_2",
+]
+
+
+def _empty_columns(n):
+    columns = {
+        "number": np.zeros(n, dtype=np.int64),
+        "kind": np.zeros(n, dtype=np.uint8),
+        "source": np.full((n, MAX_SEGMENTS), -1, dtype=np.int32),
+        "klass": np.full((n, MAX_SEGMENTS), -1, dtype=np.int8),
+        "seg_start": np.full((n, MAX_SEGMENTS), np.nan),
+        "seg_stop": np.full((n, MAX_SEGMENTS), np.nan),
+        "start": np.full(n, -1, dtype=np.int64),
+        "type": np.full(n, -1, dtype=np.int8),
+        "time": np.full(n, np.nan),
+        "loudness": np.full(n, np.nan),
+    }
+    for key in CURVE_KEYS:
+        columns[key] = np.full(n, -1, dtype=np.int8)
+    for key in VALUE_KEYS:
+        columns[key] = np.full(n, np.nan)
+    return columns
+
+
+class Manifest:
+    """Plans of a run as columns (see module docstring)
+
+    parameters:
+    columns: dict of np.ndarray
+    sources: list of str
+    meta: dict
+            seed, sample_rate and audio_clip_length of the planning run
+    """
+
+    def __init__(self, columns, sources, meta):
+        self.columns = columns
+        self.sources = list(sources)
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.columns["number"])
+
+    @property
+    def numbers(self):
+        return self.columns["number"]
+
+    @property
+    def seed(self):
+        seed = self.meta.get("seed")
+        return None if seed is None else int(seed)
+
+    @classmethod
+    def from_plans(cls, numbers, plans, meta):
+        columns = _empty_columns(len(plans))
+        sources = {}
+
+        def source_id(filename):
+            return sources.setdefault(filename, len(sources))
+
+        for row, (number, plan) in enumerate(zip(numbers, plans)):
+            columns["number"][row] = number
+            columns["kind"][row] = KINDS.index(plan["kind"])
+
+            if plan["kind"] == "mixed":
+                transitions = [plan["transition"]]
+                names = ["speech", "music"]
+                files = [plan["samples"][name] for name in names]
+                segments = [plan["segments"][name] for name in names]
+                columns["loudness"][row] = plan["loudness"]
+            else:
+                transitions = plan["transitions"]
+                files = plan["samples"]
+                segments = plan["segments"]
+                columns["klass"][row, : len(files)] = [
+                    CLASSES.index(c) for c in plan["classes"]
+                ]
+                if plan["start"] is not None:
+                    columns["start"][row] = plan["start"]
+
+            if len(files) > MAX_SEGMENTS or len(transitions) > 1:
+                raise ValueError(
+                    "example {} has more than {} segments".format(number, MAX_SEGMENTS)
+                )
+
+            columns["source"][row, : len(files)] = [source_id(f) for f in files]
+            columns["seg_start"][row, : len(segments)] = [s[0] for s in segments]
+            columns["seg_stop"][row, : len(segments)] = [s[1] for s in segments]
+
+            for params, time in transitions:
+                columns["type"][row] = TRANSITION_TYPES.index(params["type"])
+                columns["time"][row] = time
+                for key in CURVE_KEYS:
+                    if key in params:
+                        columns[key][row] = CURVES.index(params[key])
+                for key in VALUE_KEYS:
+                    if key in params:
+                        columns[key][row] = params[key]
+
+        return cls(columns, sorted(sources, key=sources.get), meta)
+
+    def _transition(self, row):
+        c = self.columns
+        params = {"type": TRANSITION_TYPES[c["type"][row]]}
+        for key in CURVE_KEYS:
+            if c[key][row] >= 0:
+                params[key] = CURVES[c[key][row]]
+        for key in VALUE_KEYS:
+            if not np.isnan(c[key][row]):
+                params[key] = float(c[key][row])
+        return (params, float(c["time"][row]))
+
+    def plan(self, row):
+        """The plan of row `row` (as returned by render.plan_example)"""
+        c = self.columns
+        count = int((c["source"][row] >= 0).sum())
+        files = [self.sources[i] for i in c["source"][row, :count]]
+        starts, stops = c["seg_start"][row, :count], c["seg_stop"][row, :count]
+
+        if KINDS[c["kind"][row]] == "mixed":
+            return {
+                "kind": "mixed",
+                "transition": self._transition(row),
+                "samples": {"speech": files[0], "music": files[1]},
+                "segments": {
+                    "speech": (int(starts[0]), int(stops[0])),
+                    "music": (int(starts[1]), int(stops[1])),
+                },
+                "loudness": float(c["loudness"][row]),
+            }
+
+        start = int(c["start"][row])
+        return {
+            "kind": "old",
+            "transitions": [self._transition(row)] if c["type"][row] >= 0 else [],
+            "classes": [CLASSES[k] for k in c["klass"][row, :count]],
+            "samples": files,
+            "segments": [(float(a), float(b)) for a, b in zip(starts, stops)],
+            "start": None if start < 0 else start,
+        }
+
+    def select(self, rows):
+        """Manifest of the given rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = {key: column[rows] for key, column in self.columns.items()}
+        return Manifest(columns, self.sources, dict(self.meta))
+
+    def part(self, index, count):
+        """Part `index` of `count` contiguous parts (one per machine)"""
+        return self.select(np.array_split(np.arange(len(self)), count)[index])
+
+    def save(self, path):
+        """Write the manifest atomically to `path` (.npz)"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = "{}.{}.tmp.npz".format(path, os.getpid())
+        try:
+            np.savez(
+                tmp,
+                sources=np.array(self.sources, dtype=str),
+                meta=np.array(json.dumps(self.meta)),
+                **self.columns,
+            )
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            columns = {key: data[key] for key in data.files}
+        sources = columns.pop("sources").tolist()
+        meta = json.loads(columns.pop("meta").item())
+        return cls(columns, sources, meta)
@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class Synthesis_Params:
+
+    sample_rate: int = 22050
+    audio_clip_length: float = 8.0
+
+    # features (must match MusicSpeechController.get_log_melspectrogram)
+    hop_length: int = 220
+    n_fft: int = 1024
+    n_mels: int = 80
+    fmin: int = 64
+    fmax: int = 8000
+
+    # "old" examples (no background music)
+    min_segment_length: float = 1.0
+    f_buffer: float = 1.1
+    class_weights: tuple[float, float, float] = (0.4, 0.4, 0.2)  # music, speech, noise
+
+    # probability of a "mixed" (music + speech) example
+    p_mixed: float = 0.5
+
+    # decoded sources kept in memory by each worker
+    source_cache_bytes: int = 256 << 20
+
+    # cumulative K-weighted energies of the sources (loudness of excerpts)
+    loudness_cache_bytes: int = 512 << 20
+
+    # output layout: block-id-N directories of block_size examples
+    block_size: int = 320
+
+    @property
+    def clip_samples(self):
+        return int(self.audio_clip_length * self.sample_rate)
+
+    @property
+    def n_frames(self):
+        res_t = self.hop_length / self.sample_rate
+        return int(np.ceil(self.audio_clip_length / res_t))
@@ -0,0 +1,199 @@
+"""Source preparation without sox (data-synthesis.ipynb, MUSAN cell)
+
+The notebook ran, for every file,
+
+    sox in.wav out.wav rate 22050 silence -l 1 0.1 1% -1 0.1 1%   (music, speech)
+    sox in.wav out.wav rate 22050                                  (noise)
+    sox in.wav out.wav repeat 4                         (noise shorter than 9.1 s)
+
+and copied the result over the original. Here the same stages run in
+process (soxr resampling through librosa, RMS-based silence removal and
+np.tile looping) across a process pool. Every output is written once,
+atomically, into a separate tree, and files whose output is newer than
+their source are skipped.
+
+Usage:
+    python -m synthesis.preprocess musan musan-22k --workers 8
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from .sources import list_sources
+
+# folders trimmed of silences; the others (noise) are looped instead
+TRIMMED = ["music", "speech"]
+
+
+def moving_rms(audio, window):
+    """RMS of the `window` samples ending at each sample"""
+    power = np.square(audio, dtype=np.float64)
+    if power.ndim > 1:
+        power = power.mean(axis=1)
+
+    cumulative = np.concatenate(([0.0], np.cumsum(power)))
+    end = np.arange(1, len(power) + 1)
+    start = np.maximum(end - window, 0)
+
+    return np.sqrt(np.maximum(cumulative[end] - cumulative[start], 0.0) / (end - start))
+
+
+def trim_silence(audio, sr, duration=0.1, threshold=0.01, window=0.02):
+    """Equivalent of `sox silence -l 1 <duration> <threshold> -1 <duration> <threshold>`
+
+    Sound is RMS (20 ms window, like sox) above `threshold` of full scale.
+    Audio is dropped until `duration` of continuous sound is found; after
+    that every silence longer than `duration` is cut down to `duration`
+    (-l) and trimming starts again, so short bursts inside long silences
+    are dropped as well.
+    """
+    n = len(audio)
+    if n == 0:
+        return audio
+
+    active = moving_rms(audio, max(1, int(window * sr))) > threshold
+    min_samples = int(duration * sr)
+
+    # runs of equal activity: boundaries and state
+    change = np.flatnonzero(active[1:] != active[:-1]) + 1
+    bounds = np.concatenate(([0], change, [n]))
+    states = active[bounds[:-1]]
+
+    keep = []
+    trimming = True
+    for start, stop, sound in zip(bounds[:-1], bounds[1:], states):
+        length = stop - start
+
+        if sound:
+            if trimming and length < min_samples:
+                continue
+            trimming = False
+            keep.append((start, stop))
+
+        elif not trimming:
+            if length > min_samples:
+                keep.append((start, start + min_samples))
+                trimming = True
+            else:
+                keep.append((start, stop))
+
+    if not keep:
+        return audio[:0]
+
+    return np.concatenate([audio[start:stop] for start, stop in keep])
+
+
+def loop_audio(audio, min_samples, repeats=4):
+    """`sox repeat <repeats>` (repeats + 1 copies) when shorter than min_samples"""
+    if len(audio) >= min_samples:
+        return audio
+    return np.tile(audio, (repeats + 1,) + (1,) * (audio.ndim - 1))
+
+
+def preprocess_audio(audio, orig_sr, trim=True, sr=22050, min_dur=9.1):
+    """Resample, then trim silences (music, speech) or loop (noise)"""
+    if orig_sr != sr:
+        audio = librosa.resample(audio.T, orig_sr=orig_sr, target_sr=sr).T
+
+    if trim:
+        return trim_silence(audio, sr)
+
+    return loop_audio(audio, int(min_dur * sr))
+
+
+def is_up_to_date(source, output):
+    return os.path.isfile(output) and os.path.getmtime(output) >= os.path.getmtime(
+        source
+    )
+
+
+def write_atomic(filename, audio, sr, subtype=None):
+    """Write to a temporary file in the same folder, then rename"""
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    root, extension = os.path.splitext(filename)
+    tmp = "{}.{}.tmp{}".format(root, os.getpid(), extension)
+
+    try:
+        sf.write(tmp, audio, sr, subtype=subtype)
+        os.replace(tmp, filename)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def preprocess_file(job):
+    """Process one (source, output, trim) job; runs in a worker process"""
+    source, output, trim, sr, min_dur = job
+
+    if is_up_to_date(source, output):
+        return source, "skipped", None
+
+    try:
+        info = sf.info(source)
+        audio, orig_sr = sf.read(source, dtype="float32")
+        audio = preprocess_audio(audio, orig_sr, trim=trim, sr=sr, min_dur=min_dur)
+        write_atomic(output, audio, sr, subtype=info.subtype)
+    except Exception as error:
+        return source, "failed", repr(error)
+
+    return source, "processed", None
+
+
+def preprocess_corpus(root, output, workers=None, sr=22050, min_dur=9.1):
+    """Mirror `root` (music/, speech/, noise/ ...) into `output`
+
+    return:
+    report: dict
+            processed, skipped and failed counts, failures and wall clock
+    """
+    jobs = []
+    for folder in sorted(os.listdir(root)):
+        if not os.path.isdir(os.path.join(root, folder)):
+            continue
+
+        trim = folder in TRIMMED
+        for source in list_sources(os.path.join(root, folder)):
+            target = os.path.join(output, os.path.relpath(source, root))
+            jobs.append((source, target, trim, sr, min_dur))
+
+    tic = time.perf_counter()
+    if workers == 1 or len(jobs) <= 1:
+        results = list(map(preprocess_file, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(preprocess_file, jobs, chunksize=4))
+
+    report = {"processed": 0, "skipped": 0, "failed": 0, "failures": {}}
+    for source, status, error in results:
+        report[status] += 1
+        if error:
+            report["failures"][source] = error
+    report["seconds"] = time.perf_counter() - tic
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resample and trim source audio")
+    parser.add_argument("root", help="folder with music/, speech/ and noise/")
+    parser.add_argument("output", help="output folder (same layout)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sr", type=int, default=22050)
+    parser.add_argument("--min-dur", type=float, default=9.1)
+    args = parser.parse_args()
+
+    report = preprocess_corpus(
+        args.root, args.output, workers=args.workers, sr=args.sr, min_dur=args.min_dur
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
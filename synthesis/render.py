@@ -0,0 +1,331 @@
+"""Batched rendering of examples
+
+Synthesis is split in two steps. `plan_example` draws every random choice
+of an example (transitions, classes, sources, excerpts and loudness
+offset) from its generator, without touching any audio. `render_batch`
+then renders the plans of a batch into one preallocated (clips, samples)
+buffer, peak normalizes the rows and computes the log-mel features of
+the whole batch at once:
+
+    plans = [plan_example(example_rng(seed, n), sources, params) for n in numbers]
+    mels, labels = render_batch(plans, params)    # (B, 802, 80), (B, 802, 2)
+
+A plan draws the generator in the same order as synthesise_example, so a
+rendered example is the example of the same number synthesised one by
+one. The loudness offset is drawn relative to the speech loudness, which
+is only known when rendering, and the loudness of the excerpts comes from
+the cached source energies (loudness.LoudnessCache): the music gain of
+mixed examples differs by a few thousandths of a dB.
+"""
+
+import numpy as np
+
+from .clips import (
+    excerpt_loudness,
+    get_mixed_random_segments,
+    get_random_segments,
+    loudness_gain,
+    read_scaled_segment,
+    read_segment,
+    source_length,
+)
+from .fades import (
+    FadeBatch,
+    apply_cross_fade_in,
+    apply_cross_fade_out,
+    apply_mixed_fade_out,
+    apply_mixed_normal_fade_in,
+    fade_in_curve,
+    fade_out_curve,
+)
+from .features import get_log_melspectrograms
+from .labels import generate_mixed_multiclass_labels, generate_multiclass_labels
+from .params import Synthesis_Params
+from .sources import Sources
+from .transitions import (
+    create_class_list,
+    create_mixed_samples_list,
+    create_mixed_transition,
+    create_random_transition_points,
+    create_samples_list,
+    create_transition_list,
+    get_mixed_segment_lengths,
+    get_segment_lengths,
+)
+
+# extra samples per row: stitched segments may run a few samples past the
+# clip (their ends are rounded up) before being cut to its length
+MARGIN = 64
+
+
+def plan_example(rng, sources: Sources, params: Synthesis_Params):
+    """Random choices of one example, as a dict
+
+    "old" plans: transitions, classes, samples, segments (seconds) and
+    start (samples, single source examples only).
+    "mixed" plans: transition, samples, segments (samples) and loudness,
+    the music level relative to the speech in LU.
+    """
+    kind = "mixed" if rng.random() < params.p_mixed else "old"
+    length = params.audio_clip_length
+    sr = params.sample_rate
+
+    if kind == "mixed":
+        transition = create_mixed_transition(rng, audio_clip_length=length)
+        samples = create_mixed_samples_list(rng, sources.music, sources.speech)
+        segment_lengths = get_mixed_segment_lengths(
+            transition, audio_clip_length=length, sr=int(sr)
+        )
+        segments = get_mixed_random_segments(rng, samples, segment_lengths, sr=int(sr))
+
+        return {
+            "kind": kind,
+            "transition": transition,
+            "samples": samples,
+            "segments": segments,
+            "loudness": rng.uniform(-18.0, -7.0),
+        }
+
+    weights = params.class_weights
+    if not sources.noise:
+        weights = (weights[0], weights[1], 0.0)
+
+    p = create_random_transition_points(rng, length, params.min_segment_length)
+    transitions_list = create_transition_list(rng, p)
+    class_list = create_class_list(rng, len(p) + 1, weights=weights)
+    samples_list = create_samples_list(
+        rng, class_list, sources.music, sources.speech, sources.noise
+    )
+    segment_lengths = get_segment_lengths(transitions_list, length)
+    segments = get_random_segments(
+        rng, samples_list, segment_lengths, f_buffer=params.f_buffer, sr=sr
+    )
+
+    start = None
+    if not transitions_list:
+        l_a = source_length(samples_list[0])
+        ss = params.clip_samples
+        start = 0 if l_a == ss else int(rng.integers(0, l_a - ss))
+
+    return {
+        "kind": kind,
+        "transitions": transitions_list,
+        "classes": class_list,
+        "samples": samples_list,
+        "segments": segments,
+        "start": start,
+    }
+
+
+def plan_labels(plan, params: Synthesis_Params):
+    """(frames, 2) labels of a plan"""
+    if plan["kind"] == "mixed":
+        return generate_mixed_multiclass_labels(
+            plan["transition"],
+            audio_clip_length=params.audio_clip_length,
+            sr=params.sample_rate,
+            res=params.hop_length,
+        )
+
+    return generate_multiclass_labels(
+        params.audio_clip_length,
+        plan["transitions"],
+        plan["classes"],
+        sr=params.sample_rate,
+        res=params.hop_length,
+    )
+
+
+def _render_old(plan, row, fades, i, sr):
+    """Stitch the segments of an "old" plan into `row`; the gain fades are
+    added to `fades` (row i) and applied with the rest of the batch
+    """
+    samples_list, segments = plan["samples"], plan["segments"]
+
+    if plan["start"] is not None:
+        ss = len(row) - MARGIN
+        row[:ss] = read_segment(samples_list[0], plan["start"], plan["start"] + ss)
+        return
+
+    seg_samples = []
+    ac_stop = 0
+    for sample, (seg_start, seg_stop) in zip(samples_list, segments):
+        start = int(seg_start * sr)
+        stop = int(np.ceil(seg_stop * sr))
+        ac_start, ac_stop = ac_stop, ac_stop + stop - start
+        seg_samples.append((ac_start, ac_stop))
+        row[ac_start:ac_stop] = read_segment(sample, start, stop)
+
+    for t, transition in enumerate(plan["transitions"]):
+        params = transition[0]
+        exp_value = params.get("exp_value")
+
+        if params["type"] == "normal":
+            stop = seg_samples[t][1]
+            stop_shrunk = stop - int(params["time_gap"] * sr)
+            row[stop_shrunk:stop] = 0.0
+
+            n = int(params["f_out_dur"] * sr)
+            fades.add(i, stop_shrunk - n, "out", params["f_out_curve"], n, exp_value)
+            n = int(params["f_in_dur"] * sr)
+            start = seg_samples[t + 1][0]
+            fades.add(i, start, "in", params["f_in_curve"], n, exp_value)
+
+        elif params["type"] == "cross-fade":
+            n = int(params["f_out_dur"] * sr)
+            if n > 0:
+                stop = int(segments[t][1] * sr)
+                cf_out_audio = read_segment(samples_list[t], stop, stop + n)
+                apply_cross_fade_out(row, transition, cf_out_audio, seg_samples[t])
+
+            n = int(params["f_in_dur"] * sr)
+            if n > 0:
+                start = int(segments[t + 1][0] * sr)
+                cf_in_audio = read_segment(samples_list[t + 1], start - n, start)
+                apply_cross_fade_in(row, transition, cf_in_audio, seg_samples[t + 1])
+
+
+def _render_mixed(plan, row, sr):
+    """Mix the speech and music excerpts of a "mixed" plan into `row`
+
+    Same operations as clips.create_mixed_audio_clip, written into `row`.
+    The loudness of the excerpts comes from the cached source energies
+    (clips.excerpt_loudness), so no filtering is done per example.
+    """
+    transition = plan["transition"]
+    params = transition[0]
+    kind = params["type"]
+    point = int(transition[1] * sr)
+    exp_value = params.get("exp_value")
+
+    speech_file, speech_segment = plan["samples"]["speech"], plan["segments"]["speech"]
+    music_file, music_segment = plan["samples"]["music"], plan["segments"]["music"]
+    speech, speech_scale = read_scaled_segment(speech_file, *speech_segment)
+    music, music_scale = read_scaled_segment(music_file, *music_segment)
+
+    # speech faded before its loudness is measured
+    envelope = None
+    if kind == "music_to_music+speech":
+        n = int(params["f_in_dur"] * sr)
+        envelope = (0, fade_in_curve(params["f_in_curve"], n, exp_value))
+    elif kind == "music+speech_to_music":
+        n = int(params["f_out_dur"] * sr)
+        curve = fade_out_curve(params["f_out_curve"], n, exp_value)
+        envelope = (len(speech) - n, curve)
+
+    def music_gain():
+        speech_loudness = excerpt_loudness(
+            speech_file, *speech_segment, speech, speech_scale, envelope
+        )
+        music_loudness = excerpt_loudness(
+            music_file, *music_segment, music, music_scale
+        )
+        return loudness_gain(speech_loudness, music_loudness, plan["loudness"])
+
+    if kind == "music+speech":
+        m_gain = music_gain()
+        row[:] = speech
+        music *= m_gain
+        row += music
+
+    elif kind == "speech_to_music+speech":
+        m_gain = music_gain()
+        apply_mixed_normal_fade_in(music, transition, sr=sr, end_gain=m_gain)
+        music[int(params["f_in_dur"] * sr) :] *= m_gain
+
+        row[:] = speech
+        row[point:] += music
+
+    elif kind == "music_to_music+speech":
+        apply_mixed_normal_fade_in(speech, transition, sr=sr)
+        m_gain = music_gain()
+
+        row[:] = music
+        before, after = row[:point], row[point:]
+        before *= params["music_gain_1"]
+        apply_mixed_fade_out(before, transition, sr=sr, end_gain=m_gain)
+        after *= m_gain
+        after += speech
+
+    elif kind == "music+speech_to_music":
+        apply_mixed_fade_out(speech, transition, sr=sr)
+        m_gain = music_gain()
+
+        row[:] = music
+        before, after = row[:point], row[point:]
+        before *= m_gain
+        before += speech
+        apply_mixed_normal_fade_in(
+            after,
+            transition,
+            sr=sr,
+            start_gain=m_gain,
+            end_gain=params["music_gain_2"],
+        )
+        after[int(params["f_in_dur"] * sr) :] *= params["music_gain_2"]
+
+    elif kind == "music+speech_to_speech":
+        m_gain = music_gain()
+        music *= m_gain
+        apply_mixed_fade_out(music, transition, sr=sr)
+
+        row[:] = speech
+        row[:point] += music
+
+
+def render_audio(plans, params: Synthesis_Params, out=None):
+    """Render the clips of `plans` into a (B, clip samples) array
+
+    `out`, when given, is a (B, clip samples + MARGIN) work buffer reused
+    across batches; the returned clips are a view of it.
+    """
+    ss = params.clip_samples
+    sr = params.sample_rate
+
+    if out is None:
+        out = np.empty((len(plans), ss + MARGIN))
+    out.fill(0.0)
+
+    fades = FadeBatch()
+    for i, plan in enumerate(plans):
+        if plan["kind"] == "mixed":
+            _render_mixed(plan, out[i, :ss], sr)
+        else:
+            _render_old(plan, out[i], fades, i, sr)
+    fades.apply(out)
+
+    clips = out[: len(plans), :ss]
+
+    # peak normalization of every clip (librosa.util.normalize)
+    peaks = np.abs(clips).max(axis=1)
+    peaks[peaks < np.finfo(clips.dtype).tiny] = 1.0
+    clips /= peaks[:, None]
+
+    return clips
+
+
+def render_batch(plans, params: Synthesis_Params = None, out=None, chunk=1):
+    """Features and labels of a batch of plans
+
+    return:
+    mels: np.ndarray
+            (B, frames, n_mels) log-mel features
+    labels: np.ndarray
+            (B, frames, 2) int16 labels
+    """
+    params = params or Synthesis_Params()
+    clips = render_audio(plans, params, out=out)
+
+    mels = get_log_melspectrograms(
+        clips,
+        sr=params.sample_rate,
+        hop_length=params.hop_length,
+        n_fft=params.n_fft,
+        n_mels=params.n_mels,
+        fmin=params.fmin,
+        fmax=params.fmax,
+        chunk=chunk,
+    )
+    labels = np.stack([plan_labels(plan, params) for plan in plans])
+
+    return mels, labels
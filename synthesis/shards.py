@@ -0,0 +1,275 @@
+"""Sharded example storage
+
+Replaces the two tiny .npy files per example (mel-id-N.npy and
+mel-id-label-N.npy) by a few large shards:
+
+    dataset/
+        index.json               shapes, dtypes and per-shard counts
+        shard-00000.mel.npy      (shard_size, 802, 80) float16
+        shard-00000.label.npy    (shard_size, 802, 2) uint8
+        shard-00000.id.npy       (shard_size,) int64, example numbers
+        ...
+
+Shards are preallocated .npy files opened with np.load(mmap_mode="r"),
+so slicing an example or a contiguous run of examples does not copy.
+`ShardWriter` appends to an existing dataset, filling its last shard first.
+
+Usage:
+    python -m synthesis.shards "Mel Files" dataset
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+
+import numpy as np
+
+INDEX = "index.json"
+
+
+def _shard_files(path, shard):
+    prefix = os.path.join(path, "shard-{:05d}".format(shard))
+    return prefix + ".mel.npy", prefix + ".label.npy", prefix + ".id.npy"
+
+
+def _read_index(path):
+    with open(os.path.join(path, INDEX), "r") as file:
+        return json.load(file)
+
+
+def _write_index(path, index):
+    filename = os.path.join(path, INDEX)
+    tmp = "{}.{}.tmp".format(filename, os.getpid())
+    with open(tmp, "w") as file:
+        json.dump(index, file, indent=2)
+    os.replace(tmp, filename)
+
+
+class ShardWriter:
+    """Append examples to a sharded dataset
+
+    Same interface as features.NpyDirectoryWriter: write(number, mel, labels)
+    then close(). The index is updated each time a shard is filled and on
+    close, so an interrupted run keeps every completed shard.
+    """
+
+    def __init__(
+        self,
+        path,
+        shard_size=4096,
+        mel_shape=(802, 80),
+        label_shape=(802, 2),
+        mel_dtype="float16",
+        label_dtype="uint8",
+    ):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        if os.path.isfile(os.path.join(path, INDEX)):
+            self.index = _read_index(path)
+        else:
+            self.index = {
+                "shard_size": shard_size,
+                "mel_shape": list(mel_shape),
+                "label_shape": list(label_shape),
+                "mel_dtype": mel_dtype,
+                "label_dtype": label_dtype,
+                "counts": [],
+            }
+
+        self._arrays = None
+        self._shard = None
+        self._count = 0
+
+    def _open_shard(self):
+        counts = self.index["counts"]
+        size = self.index["shard_size"]
+
+        if counts and counts[-1] < size:
+            # continue the last shard
+            self._shard, self._count = len(counts) - 1, counts[-1]
+            mel, label, ids = _shard_files(self.path, self._shard)
+            self._arrays = [np.load(f, mmap_mode="r+") for f in (mel, label, ids)]
+            return
+
+        self._shard, self._count = len(counts), 0
+        counts.append(0)
+
+        mel, label, ids = _shard_files(self.path, self._shard)
+        open_memmap = np.lib.format.open_memmap
+        self._arrays = [
+            open_memmap(
+                mel,
+                mode="w+",
+                dtype=self.index["mel_dtype"],
+                shape=(size, *self.index["mel_shape"]),
+            ),
+            open_memmap(
+                label,
+                mode="w+",
+                dtype=self.index["label_dtype"],
+                shape=(size, *self.index["label_shape"]),
+            ),
+            open_memmap(ids, mode="w+", dtype=np.int64, shape=(size,)),
+        ]
+
+    def _close_shard(self):
+        for array in self._arrays:
+            array.flush()
+        self.index["counts"][self._shard] = self._count
+        _write_index(self.path, self.index)
+        self._arrays = None
+
+    def write(self, number, mel, labels):
+        if self._arrays is None:
+            self._open_shard()
+
+        mels, label_array, ids = self._arrays
+        mels[self._count] = mel
+        label_array[self._count] = labels
+        ids[self._count] = number
+        self._count += 1
+
+        if self._count == self.index["shard_size"]:
+            self._close_shard()
+
+    def close(self):
+        if self._arrays is not None:
+            self._close_shard()
+        elif not os.path.isfile(os.path.join(self.path, INDEX)):
+            _write_index(self.path, self.index)
+
+
+class ShardedDataset:
+    """Read-only view of a sharded dataset
+
+    dataset[i] -> (mel, labels) memory-mapped views of example i.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = _read_index(path)
+
+        counts = self.index["counts"]
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        self.mels, self.labels, self.ids = [], [], []
+        for shard, count in enumerate(counts):
+            mel, label, ids = _shard_files(path, shard)
+            self.mels.append(np.load(mel, mmap_mode="r")[:count])
+            self.labels.append(np.load(label, mmap_mode="r")[:count])
+            self.ids.append(np.load(ids, mmap_mode="r")[:count])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def locate(self, i):
+        """(shard, position in shard) of example i"""
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        shard = int(np.searchsorted(self.offsets, i, side="right") - 1)
+        return shard, int(i - self.offsets[shard])
+
+    def __getitem__(self, i):
+        shard, j = self.locate(i)
+        return self.mels[shard][j], self.labels[shard][j]
+
+    def numbers(self):
+        """Example number of every record (mel-id-N)"""
+        return np.concatenate([np.asarray(ids) for ids in self.ids])
+
+    def runs(self, indices):
+        """Split sorted `indices` into (shard, positions) groups"""
+        indices = np.asarray(indices, dtype=np.int64)
+        shards = np.searchsorted(self.offsets, indices, side="right") - 1
+        for shard in np.unique(shards):
+            yield int(shard), indices[shards == shard] - self.offsets[shard]
+
+    def read(self, indices, mel_out=None, label_out=None):
+        """Gather examples into (len(indices), ...) arrays
+
+        Reads are grouped per shard in increasing order; contiguous indices
+        become a single slice. Preallocated outputs can be passed to avoid
+        an allocation per batch.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        order = np.argsort(indices, kind="stable")
+        n = len(indices)
+
+        if mel_out is None:
+            mel_out = np.empty((n, *self.index["mel_shape"]), self.index["mel_dtype"])
+        if label_out is None:
+            label_out = np.empty(
+                (n, *self.index["label_shape"]), self.index["label_dtype"]
+            )
+
+        done = 0
+        for shard, positions in self.runs(indices[order]):
+            targets = order[done : done + len(positions)]
+            done += len(positions)
+
+            first, last = positions[0], positions[-1]
+            if last - first + 1 == len(positions):
+                mel = self.mels[shard][first : last + 1]
+                label = self.labels[shard][first : last + 1]
+            else:
+                mel = self.mels[shard][positions]
+                label = self.labels[shard][positions]
+
+            mel_out[targets] = mel
+            label_out[targets] = label
+
+        return mel_out, label_out
+
+
+def _natural_key(text):
+    return [int(c) if c.isdigit() else c.lower() for c in re.split("([0-9]+)", text)]
+
+
+def convert_npy_directory(mel_dir, path, shard_size=4096):
+    """Pack an existing block-id-*/mel-id-N.npy tree into shards
+
+    Examples are appended in natural order of their file names, as the
+    DataGenerator of train-CRNN.ipynb reads them.
+    """
+    pattern = os.path.join(mel_dir, "**", "mel-id-[0-9]*.npy")
+    mel_files = sorted(glob.glob(pattern, recursive=True), key=_natural_key)
+
+    writer = None
+    for mel_file in mel_files:
+        number = int(re.search(r"mel-id-(\d+)\.npy$", mel_file).group(1))
+        label_file = os.path.join(
+            os.path.dirname(mel_file), "mel-id-label-{}.npy".format(number)
+        )
+        mel, labels = np.load(mel_file), np.load(label_file)
+
+        if writer is None:
+            writer = ShardWriter(
+                path,
+                shard_size=shard_size,
+                mel_shape=mel.shape,
+                label_shape=labels.shape,
+            )
+        writer.write(number, mel, labels)
+
+    if writer is not None:
+        writer.close()
+
+    return len(mel_files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack mel-id-N.npy files into shards")
+    parser.add_argument("mel_dir")
+    parser.add_argument("path", help="dataset folder")
+    parser.add_argument("--shard-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    count = convert_npy_directory(args.mel_dir, args.path, shard_size=args.shard_size)
+    print("{} examples written to {}".format(count, args.path))
+
+
+if __name__ == "__main__":
+    main()
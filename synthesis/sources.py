@@ -0,0 +1,93 @@
+"""Source file lists (MUSAN layout: music/, speech/ and noise/ folders)
+
+The duration filter uses the `SourceIndex` instead of decoding every file,
+and the index is only rebuilt for new or modified files.
+"""
+
+import glob
+import os
+import random
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from .index import SourceIndex
+
+
+@dataclass
+class Sources:
+
+    music: List[str] = field(default_factory=list)
+    speech: List[str] = field(default_factory=list)
+    noise: List[str] = field(default_factory=list)
+
+    index: Optional[SourceIndex] = None
+
+
+def list_sources(directory, extension="wav"):
+    """Sorted list of every *.wav below `directory`"""
+    pattern = os.path.join(directory, "**", "*.{}".format(extension))
+    return sorted(glob.glob(pattern, recursive=True))
+
+
+def filter_min_duration(files, index: SourceIndex, min_dur=9.1, sr=22050):
+    """Files with at least `min_dur` seconds"""
+    min_samples = int(min_dur * sr)
+    return [f for f in files if index[f].frames >= min_samples]
+
+
+def split_sources(sources: Sources, subset="train", train_fraction=0.8, seed=4):
+    """Train or validation part of every list
+
+    Same split as the notebook: the three lists are shuffled in turn with
+    random.seed(4) and the first 80 % of each is the training set.
+    """
+    shuffler = random.Random(seed)
+    parts = {}
+
+    for name in ["music", "speech", "noise"]:
+        files = sorted(getattr(sources, name))
+        shuffler.shuffle(files)
+        split = int(train_fraction * len(files))
+        parts[name] = files[:split] if subset == "train" else files[split:]
+
+    return Sources(index=sources.index, **parts)
+
+
+def load_sources(
+    music_dir,
+    speech_dir,
+    noise_dir=None,
+    subset="train",
+    min_dur=9.1,
+    sr=22050,
+    index_path=None,
+    workers=None,
+):
+    """List, filter by duration and split the source folders
+
+    The index is loaded from (and refreshed into) `index_path` when given.
+    """
+    lists = {
+        "music": list_sources(music_dir),
+        "speech": list_sources(speech_dir),
+        "noise": list_sources(noise_dir) if noise_dir else [],
+    }
+
+    files = [f for name in ["music", "speech", "noise"] for f in lists[name]]
+    if index_path:
+        index = SourceIndex.open(index_path, files, workers=workers)
+    else:
+        index = SourceIndex.build(files, workers=workers)
+
+    sources = Sources(
+        index=index,
+        **{
+            name: filter_min_duration(files, index, min_dur, sr)
+            for name, files in lists.items()
+        },
+    )
+
+    if subset is None:
+        return sources
+
+    return split_sources(sources, subset=subset)
@@ -0,0 +1,164 @@
+"""On-the-fly synthesis: (mel, labels) batches straight into training
+
+Examples are synthesised by background worker processes (same per-example
+seeding as the engine, so a stream is reproducible from its seed) and
+grouped into batches, without writing anything to disk:
+
+    stream = SynthesisStream(sources, seed=1234, batch_size=128, workers=8)
+    model.fit(iter(stream), steps_per_epoch=320, epochs=30)
+
+An optional replay cache keeps the last K examples and fills part of each
+batch with examples drawn from it, for when synthesis is slower than the
+training step.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .engine import _init_worker, _synthesise_batch, example_rng, new_seed
+from .params import Synthesis_Params
+from .sources import Sources
+
+
+class ReplayCache:
+    """Ring buffer of the last `capacity` examples"""
+
+    def __init__(self, capacity, mel_shape, label_shape, seed=0):
+        self.capacity = capacity
+        self.mels = np.empty((capacity, *mel_shape), dtype=np.float32)
+        self.labels = np.empty((capacity, *label_shape), dtype=np.int16)
+        self.size = 0
+        self._next = 0
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, mel, labels):
+        self.mels[self._next] = mel
+        self.labels[self._next] = labels
+        self._next = (self._next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, n, mel_out, label_out):
+        """Copy `n` random cached examples into the outputs"""
+        picks = self._rng.integers(0, self.size, size=n)
+        np.take(self.mels, picks, axis=0, out=mel_out)
+        np.take(self.labels, picks, axis=0, out=label_out)
+
+
+class SynthesisStream:
+    """Infinite iterable of (X, y) batches synthesised on the fly
+
+    parameters:
+    sources: Sources
+    params: Synthesis_Params, optional
+    seed: int, optional
+            stream seed; example N of the stream is the example N of a
+            synthesise_combined_audio_examples run with the same seed
+    start: int
+            number of the first example (resume a stream)
+    batch_size: int
+    workers: int
+            synthesis processes (in-process when 1)
+    prefetch: int
+            batches synthesised ahead
+    chunk: int
+            examples rendered together by a worker (render.render_batch)
+    replay: int
+            capacity of the replay cache (0 disables it)
+    replay_fraction: float
+            share of every batch drawn from the replay cache once it holds
+            at least one batch of examples
+    """
+
+    def __init__(
+        self,
+        sources: Sources,
+        params: Synthesis_Params = None,
+        seed=None,
+        start=1,
+        batch_size=128,
+        workers=None,
+        prefetch=2,
+        chunk=16,
+        replay=0,
+        replay_fraction=0.5,
+    ):
+        self.sources = sources
+        self.params = params or Synthesis_Params()
+        self.seed = new_seed() if seed is None else seed
+        self.next_number = start
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count()
+        self.prefetch = prefetch
+        self.chunk = chunk
+
+        self.replay = None
+        self.replay_fraction = replay_fraction
+        if replay:
+            self.replay = ReplayCache(
+                replay,
+                (self.params.n_frames, self.params.n_mels),
+                (self.params.n_frames, 2),
+                seed=example_rng(self.seed, 0).integers(1 << 63),
+            )
+
+        self.stats = {"synthesised": 0, "replayed": 0, "batches": 0}
+
+    def _fresh_per_batch(self):
+        if self.replay is None or self.replay.size < self.batch_size:
+            return self.batch_size
+        return self.batch_size - int(round(self.replay_fraction * self.batch_size))
+
+    def _examples(self):
+        """Synthesised (number, mel, labels, kind), in order, forever"""
+        initargs = (self.sources, self.params, self.seed)
+        ahead = max(1, self.prefetch * self.batch_size // self.chunk)
+
+        if self.workers == 1:
+            _init_worker(*initargs)
+            while True:
+                numbers = range(self.next_number, self.next_number + self.chunk)
+                for example in _synthesise_batch(numbers):
+                    yield example
+                    self.next_number += 1
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=initargs
+        ) as executor:
+            pending = deque()
+            submitted = self.next_number
+            while True:
+                while len(pending) < ahead:
+                    numbers = range(submitted, submitted + self.chunk)
+                    pending.append(executor.submit(_synthesise_batch, numbers))
+                    submitted += self.chunk
+
+                for example in pending.popleft().result():
+                    yield example
+                    self.next_number += 1
+
+    def __iter__(self):
+        shape = (self.params.n_frames, self.params.n_mels)
+        examples = self._examples()
+
+        while True:
+            X = np.empty((self.batch_size, *shape), dtype=np.float32)
+            y = np.empty((self.batch_size, self.params.n_frames, 2), dtype=np.int16)
+
+            fresh = self._fresh_per_batch()
+            for i in range(fresh):
+                _, mel, labels, _ = next(examples)
+                X[i], y[i] = mel, labels
+                if self.replay is not None:
+                    self.replay.add(mel, labels)
+
+            if fresh < self.batch_size:
+                self.replay.sample(self.batch_size - fresh, X[fresh:], y[fresh:])
+
+            self.stats["synthesised"] += fresh
+            self.stats["replayed"] += self.batch_size - fresh
+            self.stats["batches"] += 1
+
+            yield X, y
@@ -0,0 +1,247 @@
+"""Random transition plans (data-synthesis.ipynb)
+
+Every function draws from the `rng` (np.random.Generator) it is given
+instead of the global `random` / `np.random` state, so an example only
+depends on its own seed.
+"""
+
+import numpy as np
+
+CURVES = ["linear", "exp-convex", "exp-concave", "s-curve"]
+EXP_CURVES = ["exp-convex", "exp-concave", "s-curve"]
+
+MIXED_TYPES = [
+    "music+speech",
+    "speech_to_music+speech",
+    "music_to_music+speech",
+    "music+speech_to_music",
+    "music+speech_to_speech",
+]
+
+CLASSES = ["music", "speech", "noise"]
+
+
+def choice(rng, options):
+    """rng counterpart of random.choice (keeps python types)"""
+    return options[rng.integers(len(options))]
+
+
+def _fade(transition, rng, key, max_dur):
+    transition[key + "_curve"] = choice(rng, CURVES)
+    transition[key + "_dur"] = rng.uniform(0, max_dur)
+
+    if transition[key + "_curve"] in EXP_CURVES:
+        # shared by fade in and fade out, the last one drawn wins
+        transition["exp_value"] = rng.uniform(1.5, 3.0)
+
+
+def create_mixed_transition(
+    rng,
+    max_f_out_dur=1.0,
+    max_f_in_dur=1.0,
+    audio_clip_length=8.0,
+    min_segment_length=1.0,
+):
+    """Transition of a music+speech example: (transition, time) with time -1.0
+    for "music+speech"
+    """
+    transition = {}
+    transition["type"] = choice(rng, MIXED_TYPES)
+
+    # music gains below 1.0 are dummy values, they are set again according
+    # to the loudness normalization
+    if transition["type"] == "speech_to_music+speech":
+        transition["music_gain"] = rng.uniform(0.3, 0.7)
+        _fade(transition, rng, "f_in", max_f_in_dur)
+
+    elif transition["type"] == "music_to_music+speech":
+        transition["music_gain_1"] = 1.0
+        transition["music_gain_2"] = rng.uniform(0.3, 0.7)
+        _fade(transition, rng, "f_in", max_f_in_dur)
+        _fade(transition, rng, "f_out", max_f_out_dur)
+
+    elif transition["type"] == "music+speech_to_music":
+        transition["music_gain_1"] = rng.uniform(0.3, 0.7)
+        transition["music_gain_2"] = 1.0
+        _fade(transition, rng, "f_out", max_f_out_dur)
+        _fade(transition, rng, "f_in", max_f_in_dur)
+
+    elif transition["type"] == "music+speech_to_speech":
+        transition["music_gain"] = rng.uniform(0.3, 0.7)
+        _fade(transition, rng, "f_out", max_f_out_dur)
+
+    elif transition["type"] == "music+speech":
+        transition["music_gain"] = rng.uniform(0.3, 0.7)
+        return (transition, -1.0)
+
+    point = rng.uniform(
+        min_segment_length + max_f_out_dur,
+        audio_clip_length - min_segment_length - max_f_in_dur,
+    )
+    return (transition, point)
+
+
+def create_mixed_samples_list(rng, music_sounds, speech_sounds):
+    """{"music": file, "speech": file}"""
+    return {
+        "music": choice(rng, music_sounds),
+        "speech": choice(rng, speech_sounds),
+    }
+
+
+def get_mixed_segment_lengths(transition, audio_clip_length=8.0, sr=22050):
+    """Length in samples of the music and speech excerpts"""
+    ac_len_samples = int(audio_clip_length * sr)
+    t_samples = int(transition[1] * sr)  # transition time in samples
+    kind = transition[0]["type"]
+
+    if kind == "music+speech":
+        return {"music": ac_len_samples, "speech": ac_len_samples}
+
+    elif kind == "speech_to_music+speech":
+        return {"speech": ac_len_samples, "music": ac_len_samples - t_samples}
+
+    elif kind == "music_to_music+speech":
+        return {"speech": ac_len_samples - t_samples, "music": ac_len_samples}
+
+    elif kind == "music+speech_to_music":
+        return {"music": ac_len_samples, "speech": t_samples}
+
+    elif kind == "music+speech_to_speech":
+        return {"speech": ac_len_samples, "music": t_samples}
+
+    raise ValueError("unexpected transition type {!r}".format(kind))
+
+
+def check_overlap(transition_points, point, min_segment_length):
+    return any(
+        np.absolute(point - t) <= min_segment_length + 2.0 for t in transition_points
+    )
+
+
+def create_random_transition_points(
+    rng,
+    audio_clip_length,
+    min_segment_length=1.0,
+    max_f_out_dur=0.5,
+    max_f_in_dur=0.0,
+    max_no_transitions=2,
+):
+    """Sorted transition times (at most max_no_transitions - 1 of them)"""
+    low = min_segment_length + max_f_out_dur
+    high = audio_clip_length - min_segment_length - max_f_in_dur
+
+    number_of_transitions = rng.integers(0, max_no_transitions)
+    if number_of_transitions == 0:
+        return []
+    transition_points = [rng.uniform(low, high)]
+
+    num_iters = 100000
+    while len(transition_points) < number_of_transitions:
+        point = rng.uniform(low, high)
+        if not check_overlap(transition_points, point, min_segment_length):
+            transition_points.append(point)
+            num_iters = 100000
+        else:
+            num_iters -= 1
+            if num_iters < 0:
+                # the minimum segment length is too high, start over
+                number_of_transitions = rng.integers(0, max_no_transitions)
+                if number_of_transitions == 0:
+                    return []
+                transition_points = [rng.uniform(low, high)]
+
+    transition_points.sort()
+    return transition_points
+
+
+def create_transition(
+    rng, max_f_out_dur=1.0, max_f_in_dur=1.0, max_c_fade_dur=1.0, max_time_gap=0.2
+):
+    """Parameters of a transition between two segments
+
+    normal: {type, f_out_curve, f_out_dur, time_gap, f_in_curve, f_in_dur}
+    cross-fade: {type, f_out_curve, f_out_dur, f_in_curve, f_in_dur}
+    plus exp_value for exponential and s-curves.
+    """
+    transition = {}
+    transition["type"] = choice(rng, ["normal", "cross-fade"])
+
+    if transition["type"] == "normal":
+        transition["f_out_curve"] = choice(rng, CURVES)
+        transition["f_out_dur"] = rng.uniform(0, max_f_out_dur)
+        transition["time_gap"] = rng.uniform(0.0, max_time_gap)
+        transition["f_in_curve"] = choice(rng, CURVES)
+        transition["f_in_dur"] = rng.uniform(0, max_f_in_dur)
+
+    elif transition["type"] == "cross-fade":
+        transition["f_out_curve"] = choice(rng, CURVES)
+        transition["f_out_dur"] = rng.uniform(0, max_c_fade_dur)
+        transition["f_in_curve"] = choice(rng, CURVES)
+        transition["f_in_dur"] = rng.uniform(0, max_c_fade_dur)
+
+    if transition["f_out_curve"] in EXP_CURVES:
+        transition["exp_value"] = rng.uniform(1.5, 3.0)
+
+    if transition["f_in_curve"] in EXP_CURVES:
+        transition["exp_value"] = rng.uniform(1.5, 3.0)
+
+    return transition
+
+
+def create_transition_list(rng, transition_points):
+    """[(transition, time_stamp), ...]"""
+    transitions_list = []
+
+    for i, point in enumerate(transition_points):
+        if len(transition_points) == 1 or i == len(transition_points) - 1:
+            t = create_transition(rng, max_time_gap=point - 1.0)
+
+        elif i == 0:
+            s_len = point
+            t = create_transition(
+                rng,
+                max_f_out_dur=min(0.2 * s_len, 1.0),
+                max_f_in_dur=min(0.1 * s_len, 1.0),
+                max_c_fade_dur=min(0.1 * s_len, 1.0),
+            )
+
+        else:
+            s_len = point - transition_points[i - 1]
+            t = create_transition(
+                rng,
+                max_f_out_dur=min(0.2 * s_len, 1.0),
+                max_f_in_dur=min(0.1 * s_len, 1.0),
+                max_c_fade_dur=min(0.1 * s_len, 1.0),
+                max_time_gap=point - 1.0,
+            )
+
+        transitions_list.append((t, point))
+
+    return transitions_list
+
+
+def create_class_list(rng, no_of_classes, weights=(0.4, 0.4, 0.2)):
+    """Random list of music/speech/noise classes"""
+    p = np.asarray(weights, dtype=np.float64)
+    indices = rng.choice(len(CLASSES), size=no_of_classes, p=p / p.sum())
+    return [CLASSES[i] for i in indices]
+
+
+def create_samples_list(rng, class_list, music_sounds, speech_sounds, noise_sounds):
+    """One random source file per class"""
+    sounds = {"music": music_sounds, "speech": speech_sounds, "noise": noise_sounds}
+
+    samples_list = []
+    for c in class_list:
+        if c not in sounds:
+            raise ValueError("Encountered unexpected class {!r}".format(c))
+        samples_list.append(choice(rng, sounds[c]))
+
+    return samples_list
+
+
+def get_segment_lengths(transitions_list, audio_clip_length):
+    """Duration in seconds of each segment"""
+    time_stamps = [0] + [j for (_, j) in transitions_list] + [audio_clip_length]
+    return [time_stamps[t + 1] - time_stamps[t] for t in range(len(time_stamps) - 1)]
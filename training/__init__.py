@@ -0,0 +1,3 @@
+"""Training utilities for the CRNN (see train-CRNN.ipynb)"""
+
+from .loader import PrefetchLoader
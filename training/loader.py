@@ -0,0 +1,138 @@
+"""Prefetching batch loader over a sharded dataset (synthesis.shards)
+
+Serves the batches of the DataGenerator of train-CRNN.ipynb (same len(),
+loader[i], on_epoch_end() and batch dtypes), gathered from memory-mapped
+shards by a pool of threads (copies out of the page cache release the
+GIL) and queued ahead of the training loop.
+
+It is not a keras.utils.Sequence, so Keras does not drive its epochs or
+prefetching: iterate over it (one epoch), or give model.fit the endless
+generator of epochs(), which reshuffles between epochs:
+
+    loader = PrefetchLoader(ShardedDataset("dataset"), batch_size=128)
+    model.fit(loader.epochs(), steps_per_epoch=len(loader), epochs=100)
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class PrefetchLoader:
+    """Batches of (X, y) read ahead of time
+
+    parameters:
+    dataset: synthesis.shards.ShardedDataset
+    indices: array-like, optional
+            records of the partition (all records by default)
+    batch_size: int
+    shuffle: bool
+            reshuffle every epoch with a generator seeded from (seed, epoch),
+            so the order of epoch e is reproducible on its own
+    seed: int
+    workers: int
+            reading threads
+    prefetch: int
+            batches read ahead (bounds the memory in flight)
+    drop_last: bool
+            like DataGenerator, ignore the last incomplete batch
+    x_dtype, y_dtype:
+            batch dtypes (DataGenerator: float32, int16). None keeps the
+            storage dtypes (float16, uint8); converting float16 to float32
+            costs more than the read itself, and can be left to the model
+            (e.g. a Cast layer on the accelerator)
+    """
+
+    def __init__(
+        self,
+        dataset,
+        indices=None,
+        batch_size=128,
+        shuffle=True,
+        seed=0,
+        workers=4,
+        prefetch=8,
+        drop_last=True,
+        x_dtype=np.float32,
+        y_dtype=np.int16,
+    ):
+        self.dataset = dataset
+        self.indices = (
+            np.arange(len(dataset)) if indices is None else np.asarray(indices)
+        )
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.workers = workers
+        self.prefetch = max(prefetch, workers)
+        self.drop_last = drop_last
+        self.x_dtype = x_dtype
+        self.y_dtype = y_dtype
+
+        self.epoch = 0
+        self._order = self._epoch_order(self.epoch)
+
+    def _epoch_order(self, epoch):
+        if not self.shuffle:
+            return self.indices
+
+        seed = np.random.SeedSequence(self.seed, spawn_key=(epoch,))
+        return np.random.default_rng(seed).permutation(self.indices)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+        self._order = self._epoch_order(epoch)
+
+    def on_epoch_end(self):
+        self.set_epoch(self.epoch + 1)
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.indices) // self.batch_size
+        return -(-len(self.indices) // self.batch_size)
+
+    def batch_indices(self, index):
+        return self._order[index * self.batch_size : (index + 1) * self.batch_size]
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+
+        records = self.batch_indices(index)
+        shape = self.dataset.index
+
+        # read straight into the batch dtypes, no intermediate copy
+        x_dtype = self.x_dtype or shape["mel_dtype"]
+        y_dtype = self.y_dtype or shape["label_dtype"]
+        X = np.empty((len(records), *shape["mel_shape"]), dtype=x_dtype)
+        y = np.empty((len(records), *shape["label_shape"]), dtype=y_dtype)
+
+        return self.dataset.read(records, mel_out=X, label_out=y)
+
+    def __iter__(self):
+        """Batches of the current epoch, in order, `prefetch` ahead"""
+        n = len(self)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for index in range(min(self.prefetch, n)):
+                pending.append(executor.submit(self.__getitem__, index))
+
+            next_index = len(pending)
+            while pending:
+                batch = pending.popleft().result()
+                if next_index < n:
+                    pending.append(executor.submit(self.__getitem__, next_index))
+                    next_index += 1
+                yield batch
+
+    def epochs(self, count=None):
+        """Endless (or `count` epochs) stream of batches, reshuffled between
+        epochs, e.g. for model.fit(loader.epochs(), steps_per_epoch=len(loader))
+        """
+        done = 0
+        while count is None or done < count:
+            yield from self
+            self.on_epoch_end()
+            done += 1